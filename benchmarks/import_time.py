@@ -0,0 +1,78 @@
+"""
+Import time benchmark of ratatoskr_tools.
+
+Every module is imported in a fresh interpreter, as in a short-lived worker
+process. The script reports the median wall time and the heavy third-party
+modules which were loaded, and exits with status 1 if a light module loads
+one of them or exceeds its time budget.
+
+    python benchmarks/import_time.py [--repeat N]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY = ('matplotlib', 'pandas', 'scipy', 'zmq', 'joblib', 'mpl_toolkits')
+
+# module: (forbidden heavy modules, time budget in seconds)
+LIGHT = {
+    'ratatoskr_tools': (HEAVY, 0.2),
+    'ratatoskr_tools.networkconfig': (HEAVY, 0.4),
+    'ratatoskr_tools.simulation': (HEAVY, 0.4),
+    'ratatoskr_tools.networkplot': (HEAVY, 0.2),
+}
+REPORT_ONLY = ('ratatoskr_tools.datahandle', 'ratatoskr_tools.dataplot')
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+import json
+print(json.dumps([elapsed, [m for m in {heavy!r} if m in sys.modules]]))
+"""
+
+
+def measure(module, repeat):
+    """ Return the median import time and the loaded heavy modules """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        [root] + [p for p in [os.environ.get('PYTHONPATH')] if p]))
+    times = []
+    loaded = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)],
+                             check=True, capture_output=True, text=True, env=env).stdout
+        elapsed, loaded = json.loads(out.splitlines()[-1])
+        times.append(elapsed)
+    return statistics.median(times), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    for module in list(LIGHT) + list(REPORT_ONLY):
+        elapsed, loaded = measure(module, args.repeat)
+        status = ''
+        if module in LIGHT:
+            forbidden, budget = LIGHT[module]
+            bad = [m for m in loaded if m in forbidden]
+            if bad or elapsed > budget:
+                failed = True
+                status = 'FAIL (budget {:.0f} ms{})'.format(
+                    budget * 1000, ', loads ' + ', '.join(bad) if bad else '')
+        print('{:<32} {:8.1f} ms  {:<40} {}'.format(
+            module, elapsed * 1000, ', '.join(loaded) or '-', status))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,17 @@
-from . import datahandle, dataplot, networkconfig, networkplot, simulation
+# The subpackages are imported on first access (PEP 562), so that e.g.
+# `import ratatoskr_tools.networkconfig` does not load matplotlib, pandas or zmq.
+import importlib
+
+__all__ = ['campaign', 'datahandle', 'dataplot', 'networkconfig', 'networkplot', 'simulation']
+
+
+def __getattr__(name):
+    if name in __all__:
+        module = importlib.import_module('.' + name, __name__)
+        globals()[name] = module
+        return module
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
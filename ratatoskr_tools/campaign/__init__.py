@@ -0,0 +1,4 @@
+from .manifest import SweepManifest
+from .pipeline import Campaign, RateResult, load_result, run_campaign, sweep_rates
+from .explore import DesignExplorer, GaussianProcess, explore_design, expected_improvement
+from .screening import MultiFidelityScreen, screen, screen_designs
@@ -0,0 +1,93 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# The ratatoskr-campaign command.
+###############################################################################
+import argparse
+import time as timer
+
+###############################################################################
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='ratatoskr-campaign',
+        description='Run the injection rate sweep of a config.ini file: the '
+                    'configuration, the simulations, the ingestion of the results '
+                    'and the report run as a pipeline.')
+    parser.add_argument('config', help='path of the config.ini file')
+    parser.add_argument('-s', '--simulator', required=True,
+                        help='path of the simulator executable "sim"')
+    parser.add_argument('-o', '--basedir', default='.',
+                        help='directory of the configuration, the simulations and '
+                             'result.pdf (default: %(default)s)')
+    parser.add_argument('--rates', type=float, nargs='+',
+                        help='injection rates, by default the runRateMin/Max/Step sweep')
+    parser.add_argument('--sim-workers', type=int,
+                        help='parallel simulations (default: numCores of config.ini)')
+    parser.add_argument('--ingest-workers', type=int, default=2,
+                        help='threads reading the results (default: %(default)s)')
+    parser.add_argument('--report-workers', type=int, default=1,
+                        help='processes rendering the report (default: %(default)s)')
+    parser.add_argument('--queue-size', type=int,
+                        help='capacity of the queues between the stages '
+                             '(default: 2 * sim-workers)')
+    parser.add_argument('--keep-simdirs', action='store_true',
+                        help='keep the simulation directories after the ingestion')
+    parser.add_argument('--no-report', action='store_true', help='do not render result.pdf')
+    parser.add_argument('--no-check', action='store_true',
+                        help='do not validate the configuration files')
+    parser.add_argument('--fresh', action='store_true',
+                        help='ignore the manifest campaign.json of an earlier run and '
+                             'simulate every injection rate again')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    from .pipeline import Campaign
+
+    campaign = Campaign(args.config, args.simulator, args.basedir, inj_rates=args.rates,
+                        sim_workers=args.sim_workers, ingest_workers=args.ingest_workers,
+                        report_workers=args.report_workers, queue_size=args.queue_size,
+                        keep_simdirs=args.keep_simdirs, report=not args.no_report,
+                        check=not args.no_check, resume=not args.fresh)
+    print("Sweep of {} injection rates x {} restarts with {} simulation workers".format(
+        len(campaign.inj_rates), campaign.config.restarts, campaign.sim_workers))
+
+    start = timer.monotonic()
+    campaign.run()
+    print("Finished {} injection rates in {:.1f} s".format(
+        len(campaign.results), timer.monotonic() - start))
+    print("Simulations: {}, manifest: {}".format(
+        ", ".join("{} {}".format(count, status)
+                  for status, count in campaign.manifest.summary().items() if count),
+        campaign.manifest_file))
+    if campaign.report_workers and campaign.results:
+        print("Report:", campaign.report_file)
+
+    return 1 if campaign.errors else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
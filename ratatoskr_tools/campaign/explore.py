@@ -0,0 +1,515 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# Surrogate-guided design space exploration.
+#
+# The design space is a set of config.ini keys with their candidate values.
+# A Gaussian process is fitted to the objective of the simulated design
+# points, the next batch of points maximizes the expected improvement. The
+# points of a batch are chosen one after the other, each chosen point enters
+# the model with its predicted objective ("kriging believer"), so a batch
+# spreads over the promising regions instead of piling up at one point.
+###############################################################################
+import configparser
+import itertools
+import os
+
+import numpy as np
+
+from ..networkconfig import configure, createedit
+from ..simulation import simulation
+
+###############################################################################
+
+
+class GaussianProcess:
+    """
+    Gaussian process regression with a squared exponential kernel on inputs
+    scaled to [0, 1]. The length scale and the noise are chosen by the
+    marginal likelihood on a grid.
+    """
+
+    LENGTH_SCALES = (0.05, 0.1, 0.2, 0.3, 0.5, 0.8, 1.2, 2.)
+    NOISES = (1e-6, 1e-3, 1e-2, 1e-1)
+
+    def __init__(self, length_scale=None, noise=None):
+        """
+        Parameters
+        ----------
+        length_scale : float, optional
+            The fixed length scale, by default chosen by the likelihood
+        noise : float, optional
+            The fixed noise variance of the standardized objective, by default
+            chosen by the likelihood
+        """
+        self.length_scale = length_scale
+        self.noise = noise
+
+    @staticmethod
+    def _kernel(a, b, length_scale):
+        dist = ((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=-1)
+        return np.exp(-0.5 * dist / length_scale ** 2)
+
+    def _factorize(self, length_scale, noise):
+        gram = self._kernel(self.X, self.X, length_scale)
+        gram[np.diag_indices_from(gram)] += noise
+        chol = np.linalg.cholesky(gram)
+        alpha = np.linalg.solve(chol.T, np.linalg.solve(chol, self.y))
+        # log marginal likelihood up to a constant
+        likelihood = -0.5 * self.y @ alpha - np.log(np.diag(chol)).sum()
+        return chol, alpha, likelihood
+
+    def fit(self, X, y):
+        """
+        Fit the model to the points X, shape (#points, #dims), and their
+        objective values y.
+        """
+        self.X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        self.mean = y.mean()
+        self.scale = y.std() if y.std() > 0 else 1.
+        self.y = (y - self.mean) / self.scale
+
+        length_scales = (self.length_scale,) if self.length_scale else self.LENGTH_SCALES
+        noises = (self.noise,) if self.noise else self.NOISES
+        best = None
+        for length_scale, noise in itertools.product(length_scales, noises):
+            try:
+                factors = self._factorize(length_scale, noise)
+            except np.linalg.LinAlgError:
+                continue
+            if best is None or factors[2] > best[0][2]:
+                best = (factors, length_scale, noise)
+        (self._chol, self._alpha, _), self.fitted_length_scale, self.fitted_noise = best
+        return self
+
+    def predict(self, X):
+        """
+        Returns
+        -------
+        tuple(np.ndarray)
+            The predicted mean and standard deviation of the objective at X.
+        """
+        X = np.asarray(X, dtype=float)
+        cross = self._kernel(X, self.X, self.fitted_length_scale)
+        mean = cross @ self._alpha
+        v = np.linalg.solve(self._chol, cross.T)
+        var = np.clip(1. - (v ** 2).sum(axis=0), 1e-12, None)
+        return self.mean + self.scale * mean, self.scale * np.sqrt(var)
+
+
+def expected_improvement(mean, std, best, xi=0.01):
+    """
+    The expected improvement of minimizing the objective below best.
+
+    Parameters
+    ----------
+    mean, std : np.ndarray
+        The predicted mean and standard deviation of the candidates.
+    best : float
+        The best objective so far.
+    xi : float, optional
+        The exploration margin, relative to the magnitude of best, by default 0.01
+
+    Returns
+    -------
+    np.ndarray
+        The expected improvement of each candidate.
+    """
+    from scipy.stats import norm
+
+    improvement = best - mean - xi * abs(best)
+    z = improvement / std
+    return improvement * norm.cdf(z) + std * norm.pdf(z)
+
+
+def mean_packet_latency(config, latencies):
+    """ The default objective: the mean packet latency of the restarts """
+    packet = np.asarray(latencies[1], dtype=float)
+    packet = packet[packet >= 0]
+    return float(packet.mean()) if len(packet) else np.nan
+
+
+def buffer_cost(config):
+    """ The number of buffer slots of all router ports, a simple area cost """
+    routers = sum(x*y for x, y in zip(config.x, config.y))
+    return routers * config.portNum * config.vcCount * config.bufferDepth
+
+
+def _format(value):
+    """ A config.ini value, lists are written as [a, b] """
+    if isinstance(value, (list, tuple)):
+        return "[{}]".format(", ".join(str(item) for item in value))
+    return str(value)
+
+
+def read_config_ini(config_file):
+    """ The parsed config.ini file, the case of the keys is kept """
+    ini = configparser.ConfigParser()
+    ini.optionxform = str
+    ini.read(config_file)
+    return ini
+
+
+def _section(ini, key):
+    sections = [name for name in ini.sections() if key in ini[name]]
+    assert sections, "'{}' is no key of the config.ini file".format(key)
+    return sections[0]
+
+
+def write_design(ini, design, directory, inj_rate=None):
+    """
+    Write the config.ini, config.xml and network.xml of a design point.
+
+    Parameters
+    ----------
+    ini : configparser.ConfigParser
+        The config.ini file with the fixed values, see read_config_ini.
+    design : dict
+        The config.ini values of the design point.
+    directory : str
+        The directory of the files.
+    inj_rate : float, optional
+        The injection rate of the config.xml, by default runRateMin
+
+    Returns
+    -------
+    tuple
+        The configuration, the config.xml of the injection rate and the
+        network.xml.
+    """
+    os.makedirs(directory, exist_ok=True)
+    point_ini = configparser.ConfigParser()
+    point_ini.optionxform = str
+    point_ini.read_dict(ini)
+    for key, value in design.items():
+        point_ini[_section(ini, key)][key] = _format(value)
+    config_file = os.path.join(directory, 'config.ini')
+    with open(config_file, 'w') as f:
+        point_ini.write(f)
+
+    config_xml = os.path.join(directory, 'config.xml')
+    network_xml = os.path.join(directory, 'network.xml')
+    config = createedit.create_configuration(config_file, config_xml, network_xml)
+    rate_xml = os.path.join(directory, 'config_rate.xml')
+    createedit.edit_config_file(config, config_xml, rate_xml,
+                                config.runRateMin if inj_rate is None else inj_rate)
+    return config, rate_xml, network_xml
+
+
+def simulate_all(simulator, jobs, num_cores):
+    """
+    Run the simulations of several configurations in one parallel pool.
+
+    Parameters
+    ----------
+    simulator : str
+        The path of the simulator executor "./sim"
+    jobs : list(tuple)
+        The config.xml, network.xml, simulation directory and log capture of
+        each simulation.
+    num_cores : int
+        The number of parallel simulations.
+
+    Returns
+    -------
+    list(bool)
+        True for each simulation which finished successfully.
+    """
+    from joblib import Parallel, delayed
+
+    return Parallel(n_jobs=num_cores)(
+        delayed(simulation.run_single_sim)(simulator, config_xml, network_xml, simdir, log)
+        for config_xml, network_xml, simdir, log in jobs)
+
+
+class DesignExplorer:
+    """
+    Explore the design space of a config.ini file with as few simulations as
+    possible.
+
+    A design point sets one candidate value per key of the space. Each point
+    is simulated with the restarts of the config.ini file at one injection
+    rate, its objective is computed from the latencies. Override evaluate to
+    simulate the points differently.
+    """
+
+    def __init__(self, config_file, simulator, space, basedir='.', inj_rate=None,
+                 objective=None, num_cores=None, max_candidates=20000, seed=None,
+                 check=True):
+        """
+        Parameters
+        ----------
+        config_file : str
+            Path of the config.ini file with the fixed values.
+        simulator : str
+            The path of the simulator executor "./sim"
+        space : dict
+            The candidate values of each explored config.ini key, e.g.
+            {'vcCount': [2, 4, 8], 'bufferDepth': [2, 4, 8, 16],
+             'x': [[4], [8]], 'clockDelay': [[1], [2]]}
+        basedir : str, optional
+            The directory of the design points, by default '.'
+        inj_rate : float, optional
+            The injection rate of the simulations, by default runRateMin
+        objective : callable, optional
+            objective(config, latencies) of a simulated point, which is
+            minimized. latencies are the flit, packet and network latencies of
+            the restarts, e.g. mean_packet_latency(config, latencies) +
+            weight * buffer_cost(config). By default mean_packet_latency
+        num_cores : int, optional
+            The number of parallel simulations, by default numCores of config.ini
+        max_candidates : int, optional
+            The number of randomly drawn candidates of each batch if the space
+            is larger, by default 20000
+        seed : int, optional
+            The seed of the initial design and the candidate draws
+        check : bool, optional
+            Validate the configuration of each point, by default True
+        """
+        assert space, "The design space is empty"
+        self.config_file = config_file
+        self.simulator = simulator
+        self.space = {key: list(values) for key, values in space.items()}
+        self.keys = list(self.space)
+        self.sizes = np.array([len(self.space[key]) for key in self.keys])
+        assert np.all(self.sizes > 0), "Every key needs at least one candidate value"
+        self.basedir = basedir
+        self.objective = objective if objective is not None else mean_packet_latency
+        self.max_candidates = max_candidates
+        self.check = check
+        self.rng = np.random.default_rng(seed)
+
+        self._ini = read_config_ini(config_file)
+        for key in self.keys:
+            _section(self._ini, key)
+
+        base = configure.Configuration(config_file)
+        self.inj_rate = inj_rate if inj_rate is not None else base.runRateMin
+        self.num_cores = num_cores if num_cores is not None else base.numCores
+
+        # the simulated points as index tuples and their objectives
+        self.points = []
+        self.values = []
+        self.configs = {}
+
+    @property
+    def num_points(self):
+        """ The number of points of the design space """
+        return int(np.prod(self.sizes))
+
+    def design(self, point):
+        """ The config.ini values of a point, given by its index tuple """
+        return {key: self.space[key][idx] for key, idx in zip(self.keys, point)}
+
+    def _encode(self, points):
+        # candidate index scaled to [0, 1], the values are assumed ordered
+        points = np.asarray(points, dtype=float).reshape(-1, len(self.keys))
+        return points / np.maximum(self.sizes - 1, 1)
+
+    def _candidates(self):
+        done = set(self.points)
+        if self.num_points <= self.max_candidates:
+            candidates = itertools.product(*(range(size) for size in self.sizes))
+        else:
+            candidates = map(tuple, self.rng.integers(0, self.sizes, (self.max_candidates,
+                                                                         len(self.sizes))))
+        return [point for point in dict.fromkeys(candidates) if point not in done]
+
+    def initial_points(self, num):
+        """ A Latin hypercube of num points for the first batch """
+        columns = [self.rng.permutation((np.arange(num) + self.rng.random(num)) / num)
+                   for _ in self.keys]
+        points = [tuple(int(np.floor(u * size)) for u, size in zip(row, self.sizes))
+                  for row in zip(*columns)]
+        return list(dict.fromkeys(points))
+
+    def suggest(self, batch_size, xi=0.01):
+        """
+        Choose the next points by the expected improvement.
+
+        Returns
+        -------
+        tuple
+            The index tuples of the points and the largest expected improvement.
+        """
+        candidates = self._candidates()
+        if not candidates:
+            return [], 0.
+        X_cand = self._encode(candidates)
+        values = np.asarray(self.values, dtype=float)
+        X = self._encode(self.points)
+
+        # failed points get the worst objective, so the model avoids them
+        finite = np.isfinite(values)
+        worst = values[finite].max() if finite.any() else 1.
+        y = np.where(finite, values, worst + abs(worst))
+        best = y[finite].min() if finite.any() else worst
+
+        gp = GaussianProcess().fit(X, y)
+        length_scale, noise = gp.fitted_length_scale, gp.fitted_noise
+        chosen = []
+        max_ei = 0.
+        for _ in range(min(batch_size, len(candidates))):
+            mean, std = gp.predict(X_cand)
+            ei = expected_improvement(mean, std, best, xi)
+            ei[chosen] = -np.inf
+            pick = int(np.argmax(ei))
+            if not chosen:
+                max_ei = float(ei[pick])
+            chosen.append(pick)
+            # the chosen point enters the model with its predicted objective
+            X = np.vstack([X, X_cand[pick]])
+            y = np.append(y, mean[pick])
+            gp = GaussianProcess(length_scale, noise).fit(X, y)
+        return [candidates[pick] for pick in chosen], max_ei
+
+    def point_dir(self, point):
+        return os.path.join(self.basedir, "point_" + "_".join(str(idx) for idx in point))
+
+    def prepare(self, point):
+        """ Write the files of a point, see write_design """
+        return write_design(self._ini, self.design(point), self.point_dir(point), self.inj_rate)
+
+    def evaluate(self, points):
+        """
+        Simulate the points, all restarts of all points run in parallel.
+
+        Returns
+        -------
+        list(float)
+            The objective of each point, NaN for an invalid or failed point.
+        """
+        from .. import datahandle
+        from ..networkconfig import validate
+
+        jobs = []
+        prepared = {}
+        for point in points:
+            try:
+                config, rate_xml, network_xml = self.prepare(point)
+                if self.check:
+                    validate.check_configuration(rate_xml, network_xml, config)
+            except AssertionError as error:
+                print("Invalid design point {}: {}".format(self.design(point), error))
+                continue
+            simdirs = simulation.make_all_simdirs(self.point_dir(point), config.restarts)
+            prepared[point] = (config, simdirs)
+            jobs.extend((rate_xml, network_xml, simdir, config.logMode) for simdir in simdirs)
+        simulate_all(self.simulator, jobs, self.num_cores)
+
+        values = []
+        for point in points:
+            if point not in prepared:
+                values.append(np.nan)
+                continue
+            config, simdirs = prepared[point]
+            self.configs[point] = config
+            values.append(self.objective(config, datahandle.retrieve_diff_latencies(simdirs)))
+        return values
+
+    def record(self, points, values):
+        self.points.extend(points)
+        self.values.extend(float(value) for value in values)
+
+    @property
+    def best(self):
+        """ The config.ini values and the objective of the best simulated point """
+        values = np.asarray(self.values, dtype=float)
+        if not np.isfinite(values).any():
+            return None, np.nan
+        idx = int(np.nanargmin(values))
+        return self.design(self.points[idx]), values[idx]
+
+    def run(self, max_evals=50, batch_size=None, initial=None, tol=1e-3, patience=2,
+            verbose=True):
+        """
+        Explore until the objective converges or max_evals points are simulated.
+
+        Parameters
+        ----------
+        max_evals : int, optional
+            The maximum number of simulated points, by default 50
+        batch_size : int, optional
+            The number of points simulated together, by default the number of
+            parallel simulations divided by the restarts, at least 1
+        initial : int, optional
+            The number of points of the initial design, by default
+            max(2 * batch_size, #keys + 1)
+        tol : float, optional
+            Converged when neither the best objective improved nor the expected
+            improvement exceeded tol times the best objective for patience
+            batches, by default 1e-3
+        patience : int, optional
+            The number of batches of the convergence rule, by default 2
+        verbose : bool, optional
+            Print the progress, by default True
+
+        Returns
+        -------
+        tuple
+            The config.ini values and the objective of the best point.
+        """
+        if batch_size is None:
+            restarts = configure.Configuration(self.config_file).restarts
+            batch_size = max(1, self.num_cores // max(restarts, 1))
+        if initial is None:
+            initial = max(2 * batch_size, len(self.keys) + 1)
+        max_evals = min(max_evals, self.num_points)
+
+        if not self.points:
+            points = self.initial_points(min(initial, max_evals))
+            self.record(points, self.evaluate(points))
+
+        stalled = 0
+        while len(self.points) < max_evals and stalled < patience:
+            _, best_before = self.best
+            points, max_ei = self.suggest(min(batch_size, max_evals - len(self.points)))
+            if not points:
+                break
+            self.record(points, self.evaluate(points))
+            design, best = self.best
+            scale = abs(best) if np.isfinite(best) and best != 0 else 1.
+            improved = np.isfinite(best) and \
+                (not np.isfinite(best_before) or best_before - best > tol * scale)
+            stalled = 0 if improved or max_ei > tol * scale else stalled + 1
+            if verbose:
+                print("{} points, best objective {:.4g}, expected improvement {:.3g}: {}".format(
+                    len(self.points), best, max_ei, design))
+
+        return self.best
+
+
+def explore_design(config_file, simulator, space, max_evals=50, **kwargs):
+    """
+    Run a surrogate-guided exploration of the design space, see DesignExplorer.
+
+    Returns
+    -------
+    DesignExplorer
+        The finished exploration, its best attribute holds the best point.
+    """
+    run_kwargs = {key: kwargs.pop(key) for key in
+                  ('batch_size', 'initial', 'tol', 'patience', 'verbose') if key in kwargs}
+    explorer = DesignExplorer(config_file, simulator, space, **kwargs)
+    explorer.run(max_evals, **run_kwargs)
+    return explorer
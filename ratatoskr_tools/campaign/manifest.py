@@ -0,0 +1,179 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# The on-disk state of a sweep. Every job and every injection rate has an
+# entry with its parameters, its status and the location of its result. The
+# JSON file is replaced atomically on every change, so a killed controller
+# leaves either the previous or the new state behind. The manifest stores a
+# fingerprint of the input files, the entries of a sweep with other inputs
+# are discarded instead of being resumed.
+###############################################################################
+import hashlib
+import json
+import os
+import threading
+import time as timer
+
+###############################################################################
+
+MANIFEST_VERSION = 1
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+STATUSES = (PENDING, RUNNING, DONE, FAILED)
+
+
+def input_fingerprint(paths):
+    """ The SHA-256 of the contents of the given files, in the given order """
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            content = f.read()
+        digest.update(str(len(content)).encode())
+        digest.update(content)
+    return digest.hexdigest()
+
+
+class SweepManifest:
+    """
+    The status of the simulation jobs and the injection rates of a sweep.
+
+    A job which is 'running' when the manifest is loaded was interrupted and
+    is treated like a pending one.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : str
+            Path of the JSON manifest, loaded if it exists.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.jobs = {}
+        self.rates = {}
+        self.fingerprint = None
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            assert data.get('version') == MANIFEST_VERSION, \
+                "Unsupported manifest version {} of {}".format(data.get('version'), path)
+            self.jobs = data['jobs']
+            self.rates = data['rates']
+            self.fingerprint = data.get('fingerprint')
+
+    def _save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': MANIFEST_VERSION, 'fingerprint': self.fingerprint,
+                       'jobs': self.jobs, 'rates': self.rates}, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def check_inputs(self, fingerprint):
+        """
+        Compare the fingerprint of the input files with the one of the manifest.
+        On a mismatch all jobs and rates are discarded, their results belong to
+        other inputs. A manifest without fingerprint is discarded as well.
+
+        Returns
+        -------
+        bool
+            True if the entries were discarded.
+        """
+        with self._lock:
+            stale = self.fingerprint != fingerprint and bool(self.jobs or self.rates)
+            if stale:
+                self.jobs = {}
+                self.rates = {}
+            if stale or self.fingerprint != fingerprint:
+                self.fingerprint = fingerprint
+                self._save()
+            return stale
+
+    def add_job(self, job_id, **params):
+        """
+        Register a job, an already known job keeps its status unless its
+        parameters changed, then it is pending again.
+
+        Returns
+        -------
+        dict
+            The entry of the job.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job['params'] != params:
+                self.jobs[job_id] = {'params': params, 'status': PENDING, 'result': None,
+                                     'attempts': 0, 'updated': timer.time()}
+                self._save()
+            return self.jobs[job_id]
+
+    def set_job(self, job_id, status, result=None):
+        """ Update the status and the result location of a job """
+        assert status in STATUSES, "Unknown status '{}'".format(status)
+        with self._lock:
+            job = self.jobs[job_id]
+            job['status'] = status
+            job['updated'] = timer.time()
+            if status == RUNNING:
+                job['attempts'] += 1
+            if result is not None:
+                job['result'] = result
+            self._save()
+
+    def job_done(self, job_id):
+        """ True if the job finished successfully and its result still exists """
+        job = self.jobs.get(job_id)
+        return job is not None and job['status'] == DONE and \
+            (job['result'] is None or os.path.exists(job['result']))
+
+    def set_rate(self, inj_rate, status, result=None):
+        """ Update the status and the result location of an injection rate """
+        assert status in STATUSES, "Unknown status '{}'".format(status)
+        with self._lock:
+            self.rates[repr(float(inj_rate))] = {'status': status, 'result': result,
+                                                 'updated': timer.time()}
+            self._save()
+
+    def rate_result(self, inj_rate):
+        """ The result location of a finished injection rate, or None """
+        rate = self.rates.get(repr(float(inj_rate)))
+        if rate is None or rate['status'] != DONE or rate['result'] is None \
+                or not os.path.exists(rate['result']):
+            return None
+        return rate['result']
+
+    def unfinished(self):
+        """ The ids of the pending, running and failed jobs """
+        return [job_id for job_id, job in self.jobs.items() if job['status'] != DONE]
+
+    def summary(self):
+        """ The number of jobs per status """
+        counts = dict.fromkeys(STATUSES, 0)
+        for job in self.jobs.values():
+            counts[job['status']] += 1
+        return counts
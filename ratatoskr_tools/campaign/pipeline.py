@@ -0,0 +1,485 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# Staged pipeline of an injection rate sweep.
+#
+#   config generation -> simulation -> ingestion -> report
+#
+# Every stage has its own workers and the stages are connected by bounded
+# queues, so the configuration of the next rates is written and the results
+# of finished rates are read and plotted while the simulations run.
+#
+# The status of every simulation and rate is checkpointed in the manifest
+# campaign.json. A restarted campaign skips the finished rates and
+# simulations and runs only the pending and failed ones.
+###############################################################################
+import multiprocessing
+import os
+import pickle
+import queue
+import shutil
+import threading
+
+import numpy as np
+
+from ..networkconfig import createedit, validate
+from ..simulation import simulation
+from .manifest import DONE, FAILED, RUNNING, SweepManifest, input_fingerprint
+
+###############################################################################
+
+# End of a queue
+_DONE = None
+
+
+def sweep_rates(config):
+    """ The injection rates of the runRateMin/runRateMax/runRateStep sweep """
+    return np.arange(config.runRateMin, config.runRateMax, config.runRateStep).round(4)
+
+
+def rate_dir(basedir, inj_rate):
+    """ The directory of the simulations of one injection rate """
+    return os.path.join(basedir, "rate_{:.4f}".format(inj_rate))
+
+
+def job_id(inj_rate, restart):
+    """ The manifest key of one simulation """
+    return "rate_{:.4f}/sim{}".format(inj_rate, restart)
+
+
+class RateResult:
+    """
+    The ingested results of the restarts of one injection rate.
+
+    Attributes
+    ----------
+    inj_rate : float
+        The injection rate.
+    latencies : tuple(np.ndarray)
+        The flit, packet and network latency of each restart.
+    vc_usages : list(pd.DataFrame)
+        The VC usage of each layer, see retrieve_vc_usages.
+    buff_usages : list(dict)
+        The buffer usage of each layer, see retrieve_buff_usages.
+    router_usages : np.ndarray
+        The mean buffer occupancy of every router.
+    """
+
+    def __init__(self, inj_rate, latencies, vc_usages, buff_usages, router_usages):
+        self.inj_rate = inj_rate
+        self.latencies = latencies
+        self.vc_usages = vc_usages
+        self.buff_usages = buff_usages
+        self.router_usages = router_usages
+
+
+def ingest_rate(inj_rate, simdirs, config, network_xml=None):
+    """
+    Read the results of the restarts of one injection rate, the router layers
+    of the given network.xml file.
+
+    Returns
+    -------
+    RateResult
+        The results.
+    """
+    from .. import datahandle
+
+    router_num = sum(x*y for x, y in zip(config.x, config.y))
+    return RateResult(inj_rate, datahandle.retrieve_diff_latencies(simdirs),
+                      datahandle.retrieve_vc_usages(simdirs, config, network_xml),
+                      datahandle.retrieve_buff_usages(simdirs, config, network_xml),
+                      datahandle.retrieve_router_usages(simdirs, router_num))
+
+
+def save_result(result, path):
+    """ Pickle the RateResult, the file is replaced atomically """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(result, f)
+    os.replace(tmp_path, path)
+
+
+def load_result(path):
+    """ Load a RateResult written by save_result """
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _init_report_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def render_rate_pages(result, page_dir):
+    """ Render the VC and buffer usage pages of one injection rate into page_dir """
+    from .. import dataplot
+
+    pages = list(dataplot.vc_usage_pages([result.vc_usages], [result.inj_rate]))
+    pages.extend(dataplot.buff_usage_pages([result.buff_usages], [result.inj_rate]))
+    dataplot.build_report(pages, page_dir)
+    return [name for _, _, name in pages]
+
+
+class Campaign:
+    """
+    A pipelined injection rate sweep of the config.ini file.
+
+    The stages and their workers:
+        - config generation (1 thread): the config.xml and the simulation
+          directories of each rate
+        - simulation (sim_workers threads): one simulator process per restart
+        - ingestion (ingest_workers threads): reads the results of a rate as
+          soon as all its restarts finished
+        - report (report_workers processes): renders the pages of each rate,
+          the latency page and the merged report are written at the end
+    """
+
+    def __init__(self, config_file, simulator, basedir='.', inj_rates=None,
+                 sim_workers=None, ingest_workers=2, report_workers=1, queue_size=None,
+                 keep_simdirs=False, report=True, check=True, resume=True):
+        """
+        Parameters
+        ----------
+        config_file : str
+            Path of config.ini file
+        simulator : str
+            The path of the simulator executor "./sim"
+        basedir : str, optional
+            The directory of the configuration, the simulations and the report,
+            by default '.'
+        inj_rates : list(float), optional
+            The injection rates, by default the sweep of the config.ini file
+        sim_workers : int, optional
+            The number of parallel simulations, by default numCores of config.ini
+        ingest_workers : int, optional
+            The number of threads reading the results, by default 2
+        report_workers : int, optional
+            The number of processes rendering the report, 0 disables the
+            report, by default 1
+        queue_size : int, optional
+            The capacity of the queues between the stages, by default
+            2 * sim_workers
+        keep_simdirs : bool, optional
+            Keep the simulation directories after the ingestion, by default False
+        report : bool, optional
+            Render the report result.pdf, by default True
+        check : bool, optional
+            Validate the configuration files before the first simulation,
+            by default True
+        resume : bool, optional
+            Continue the sweep of the manifest basedir/campaign.json, finished
+            rates and simulations are not run again. False starts a new
+            manifest. The manifest is discarded if config.ini, config.xml or
+            network.xml changed since. By default True
+        """
+        self.config_file = config_file
+        self.simulator = simulator
+        self.basedir = basedir
+        self.config_xml = os.path.join(basedir, 'config.xml')
+        self.network_xml = os.path.join(basedir, 'network.xml')
+        self.report_file = os.path.join(basedir, 'result.pdf')
+        self.page_dir = self.report_file + '.pages'
+        self.manifest_file = os.path.join(basedir, 'campaign.json')
+
+        os.makedirs(basedir, exist_ok=True)
+        if not resume and os.path.exists(self.manifest_file):
+            os.remove(self.manifest_file)
+        self.manifest = SweepManifest(self.manifest_file)
+        self.config = createedit.create_configuration(config_file, self.config_xml,
+                                                      self.network_xml)
+        if check:
+            validate.check_configuration(self.config_xml, self.network_xml, self.config)
+        if self.manifest.check_inputs(input_fingerprint((config_file, self.config_xml,
+                                                         self.network_xml))):
+            print("The inputs of {} changed, the sweep starts from the beginning".format(
+                self.manifest_file))
+
+        self.inj_rates = list(sweep_rates(self.config) if inj_rates is None else inj_rates)
+        self.sim_workers = sim_workers if sim_workers is not None else self.config.numCores
+        self.ingest_workers = ingest_workers
+        self.report_workers = report_workers if report else 0
+        self.queue_size = queue_size if queue_size is not None else 2 * self.sim_workers
+        self.keep_simdirs = keep_simdirs
+
+        self.results = {}
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def generate(self, inj_rate):
+        """
+        Write the config.xml of the injection rate and create its simulation directories.
+
+        Returns
+        -------
+        tuple
+            The config.xml path and the simulation directories.
+        """
+        directory = rate_dir(self.basedir, inj_rate)
+        os.makedirs(directory, exist_ok=True)
+        config_xml = os.path.join(directory, 'config.xml')
+        createedit.edit_config_file(self.config, self.config_xml, config_xml, inj_rate)
+        simdirs = [os.path.join(directory, "sim{}".format(restart))
+                   for restart in range(self.config.restarts)]
+        for restart, simdir in enumerate(simdirs):
+            os.makedirs(simdir, exist_ok=True)
+            self.manifest.add_job(job_id(inj_rate, restart), inj_rate=float(inj_rate),
+                                  restart=restart, config_xml=config_xml, simdir=simdir)
+        return config_xml, simdirs
+
+    def simulate(self, config_xml, simdir):
+        """
+        Run one simulation.
+
+        Returns
+        -------
+        bool
+            True if the simulator finished successfully.
+        """
+        return simulation.run_single_sim(self.simulator, config_xml, self.network_xml, simdir,
+                                         self.config.logMode)
+
+    def _worker(self, stage, inbox, work):
+        """ Apply work to each item of the inbox until the end mark """
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                inbox.put(_DONE)  # for the other workers of the stage
+                return
+            try:
+                work(item)
+            except Exception as error:  # a failed item must not stall the pipeline
+                with self._lock:
+                    self.errors.append((stage, item, error))
+
+    def run(self):
+        """
+        Run the sweep.
+
+        Returns
+        -------
+        dict
+            The RateResult of each injection rate.
+        """
+        sim_queue = queue.Queue(self.queue_size)
+        ingest_queue = queue.Queue(self.queue_size)
+        report_queue = queue.Queue(self.queue_size)
+        pending = {}
+        failed = set()
+
+        def simulate(job):
+            inj_rate, config_xml, simdirs, simdir, key = job
+            success = False
+            self.manifest.set_job(key, RUNNING)
+            try:
+                success = self.simulate(config_xml, simdir)
+                if not success:
+                    raise RuntimeError("the simulator failed, see {}/log".format(simdir))
+            finally:
+                self.manifest.set_job(key, DONE if success else FAILED, simdir)
+                with self._lock:
+                    if not success:
+                        failed.add(inj_rate)
+                    pending[inj_rate] -= 1
+                    complete = pending[inj_rate] == 0
+                if complete:
+                    ingest_queue.put((inj_rate, simdirs))
+
+        def ingest(job):
+            inj_rate, simdirs = job
+            if inj_rate in failed:
+                # the simulation directories stay for the next run of the campaign
+                self.manifest.set_rate(inj_rate, FAILED)
+                return
+            try:
+                result = ingest_rate(inj_rate, simdirs, self.config, self.network_xml)
+            except Exception:
+                self.manifest.set_rate(inj_rate, FAILED)
+                raise
+            path = os.path.join(rate_dir(self.basedir, inj_rate), 'result.pkl')
+            save_result(result, path)
+            self.manifest.set_rate(inj_rate, DONE, path)
+            with self._lock:
+                self.results[inj_rate] = result
+            # the simulation directories are removed only after the result is saved
+            if not self.keep_simdirs:
+                for simdir in simdirs:
+                    shutil.rmtree(simdir, ignore_errors=True)
+            if self.report_workers:
+                report_queue.put(result)
+
+        stages = []
+
+        def start(stage, inbox, work, count):
+            threads = [threading.Thread(target=self._worker, args=(stage, inbox, work),
+                                        daemon=True) for _ in range(count)]
+            for thread in threads:
+                thread.start()
+            stages.append((threads, inbox))
+
+        pool = None
+        page_names = {}
+        if self.report_workers:
+            os.makedirs(self.page_dir, exist_ok=True)
+            # the pool is forked before any thread of the pipeline is started
+            pool = multiprocessing.Pool(self.report_workers, _init_report_worker)
+
+        def report(result):
+            # the rendering runs in the pool, this thread only hands it over
+            page_names[result.inj_rate] = pool.apply_async(
+                render_rate_pages, (result, self.page_dir))
+
+        start('simulation', sim_queue, simulate, self.sim_workers)
+        start('ingestion', ingest_queue, ingest, self.ingest_workers)
+        if self.report_workers:
+            start('report', report_queue, report, 1)
+
+        try:
+            # config generation, blocks while the simulation queue is full
+            for inj_rate in self.inj_rates:
+                path = self.manifest.rate_result(inj_rate)
+                if path is not None:
+                    # finished by an earlier run of the campaign
+                    result = load_result(path)
+                    with self._lock:
+                        self.results[inj_rate] = result
+                    if self.report_workers:
+                        report_queue.put(result)
+                    continue
+
+                config_xml, simdirs = self.generate(inj_rate)
+                jobs = [(inj_rate, config_xml, simdirs, simdir, job_id(inj_rate, restart))
+                        for restart, simdir in enumerate(simdirs)]
+                jobs = [job for job in jobs if not self.manifest.job_done(job[-1])]
+                with self._lock:
+                    pending[inj_rate] = len(jobs)
+                if not jobs:
+                    ingest_queue.put((inj_rate, simdirs))
+                for job in jobs:
+                    sim_queue.put(job)
+
+            for threads, inbox in stages:
+                inbox.put(_DONE)
+                for thread in threads:
+                    thread.join()
+
+            if pool is not None:
+                self._write_report(page_names)
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        for stage, item, error in self.errors:
+            print("ERROR in {}: {} {}".format(stage, item, error))
+
+        return self.results
+
+    def export_array_job(self, jobdir, scheduler='slurm', **kwargs):
+        """
+        Write the unfinished simulations of the sweep as an array job of a batch
+        scheduler instead of running them, see
+        ratatoskr_tools.simulation.export_array_job for the arguments.
+
+        Returns
+        -------
+        str
+            The path of the submit script, None if there is nothing to run.
+        """
+        from ..simulation.batch import export_array_job
+
+        jobs = []
+        for inj_rate in self.inj_rates:
+            if self.manifest.rate_result(inj_rate) is not None:
+                continue
+            config_xml, simdirs = self.generate(inj_rate)
+            jobs.extend((config_xml, self.network_xml, simdir, inj_rate) for simdir in simdirs)
+        return export_array_job(jobs, self.simulator, jobdir, scheduler, **kwargs)
+
+    def collect_array_job(self, jobdir):
+        """
+        Read the injection rates of an exported array job whose simulations all
+        finished and record them in the manifest.
+
+        Returns
+        -------
+        dict
+            The RateResult of each collected injection rate.
+        """
+        from ..simulation.batch import collect_array_job
+
+        results = collect_array_job(jobdir, self.config)
+        for inj_rate, result in results.items():
+            path = os.path.join(rate_dir(self.basedir, inj_rate), 'result.pkl')
+            save_result(result, path)
+            self.manifest.set_rate(inj_rate, DONE, path)
+            with self._lock:
+                self.results[inj_rate] = result
+        return results
+
+    def latencies(self):
+        """
+        The latencies of all ingested injection rates.
+
+        Returns
+        -------
+        tuple
+            The injection rates and the flit, packet and network latencies,
+            shape (#rates, #restarts).
+        """
+        inj_rates = sorted(self.results)
+        lats = [np.array([self.results[rate].latencies[idx] for rate in inj_rates])
+                for idx in range(3)]
+        return (inj_rates, *lats)
+
+    def _write_report(self, page_names):
+        from .. import dataplot
+
+        inj_rates = sorted(self.results)
+        if not inj_rates:
+            return
+        names = []
+        dataplot.build_report([(dataplot.plot_latencies, self.latencies(), 'latencies')],
+                              self.page_dir)
+        names.append('latencies')
+        for inj_rate in inj_rates:
+            if inj_rate in page_names:
+                names.extend(page_names[inj_rate].get())
+
+        paths = [os.path.join(self.page_dir, name + '.pdf') for name in names]
+        dataplot.merge_pdfs([path for path in paths if os.path.exists(path)],
+                            self.report_file)
+
+
+def run_campaign(config_file, simulator, basedir='.', **kwargs):
+    """
+    Run the pipelined injection rate sweep of the config.ini file.
+    See Campaign for the arguments.
+
+    Returns
+    -------
+    Campaign
+        The finished campaign with its results.
+    """
+    campaign = Campaign(config_file, simulator, basedir, **kwargs)
+    campaign.run()
+    return campaign
@@ -0,0 +1,411 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# Multi-fidelity screening of design points and injection rates.
+#
+# All candidates first run in pilot stages with a shortened runDuration and
+# few restarts. After each pilot stage a candidate is discarded if it is
+# saturated or if the confidence interval of its packet latency lies entirely
+# above the interval of another candidate of the same injection rate which
+# costs no more. Only the survivors run with the full runDuration. The pilot
+# runs are shorter, so their latencies are not pooled with the full runs;
+# their spread estimates the number of full restarts, which grows until the
+# confidence interval is narrow enough.
+###############################################################################
+import math
+import os
+
+import numpy as np
+
+from ..networkconfig import configure, createedit
+from ..networkconfig.analytics import PerformanceModel
+from .explore import read_config_ini, simulate_all, write_design
+from .pipeline import rate_dir, sweep_rates
+
+###############################################################################
+
+SATURATED = 'saturated'
+DOMINATED = 'dominated'
+INVALID = 'invalid'
+FULL = 'full'
+
+
+def fidelity_design(config, fraction, restarts):
+    """
+    The config.ini values of a shortened run.
+
+    Parameters
+    ----------
+    config : ratatoskr_tools.networkconfig.configure.Configuration
+        The configuration of the full run.
+    fraction : float
+        The share of the runDuration.
+    restarts : int
+        The number of restarts.
+
+    Returns
+    -------
+    dict
+        The runDuration, simulationTime and restarts. The simulation time after
+        the run phase is kept, but the simulation is never longer than before.
+    """
+    assert 0 < fraction <= 1, "Invalid runDuration fraction {}".format(fraction)
+    duration = max(1, int(math.ceil(config.runDuration * fraction)))
+    drain = max(config.simulationTime - config.runStart - config.runDuration, 0)
+    return {'runDuration': duration,
+            'simulationTime': min(config.simulationTime, config.runStart + duration + drain),
+            'restarts': restarts}
+
+
+def confidence_interval(samples, confidence=0.9):
+    """
+    The mean and the half width of the Student t confidence interval, the half
+    width is infinite for less than two samples.
+    """
+    from scipy.stats import t
+
+    samples = np.asarray(samples, dtype=float)
+    if len(samples) == 0:
+        return np.nan, np.inf
+    if len(samples) < 2:
+        return float(samples.mean()), np.inf
+    half_width = t.ppf((1 + confidence) / 2, len(samples) - 1) * \
+        samples.std(ddof=1) / np.sqrt(len(samples))
+    return float(samples.mean()), float(half_width)
+
+
+def screen(samples, saturated=None, costs=None, confidence=0.9):
+    """
+    The candidates which are neither saturated nor clearly dominated.
+
+    Candidate j is dominated if some unsaturated candidate i has an upper
+    confidence bound of the latency below the lower bound of j and costs no
+    more than j.
+
+    Parameters
+    ----------
+    samples : list(np.ndarray)
+        The latency of each restart of each candidate, all at the same
+        injection rate.
+    saturated : array_like(bool), optional
+        The candidates which are known to be saturated, by default none
+    costs : array_like(float), optional
+        The cost of each candidate, by default all candidates cost the same
+    confidence : float, optional
+        The confidence level of the intervals, by default 0.9
+
+    Returns
+    -------
+    tuple(np.ndarray)
+        The survivors and the dominated candidates as boolean arrays.
+    """
+    num = len(samples)
+    saturated = np.zeros(num, dtype=bool) if saturated is None else np.asarray(saturated)
+    costs = np.zeros(num) if costs is None else np.asarray(costs, dtype=float)
+    intervals = np.array([confidence_interval(s, confidence) for s in samples]).reshape(-1, 2)
+    means, half_widths = intervals[:, 0], intervals[:, 1]
+    lower = means - half_widths
+    upper = np.where(saturated, np.inf, means + half_widths)
+
+    dominated = np.zeros(num, dtype=bool)
+    for j in np.flatnonzero(~saturated):
+        better = (upper < lower[j]) & (costs <= costs[j])
+        better[j] = False
+        dominated[j] = better.any()
+    return ~saturated & ~dominated, dominated
+
+
+def restarts_needed(samples, precision, confidence=0.9, min_restarts=2, max_restarts=None):
+    """
+    The number of restarts for a confidence interval of the mean latency within
+    precision times the mean, estimated from the spread of the samples.
+    """
+    from scipy.stats import norm
+
+    samples = np.asarray(samples, dtype=float)
+    if len(samples) < 2 or samples.mean() <= 0:
+        needed = min_restarts
+    else:
+        variation = samples.std(ddof=1) / samples.mean()
+        needed = int(math.ceil((norm.ppf((1 + confidence) / 2) * variation / precision) ** 2))
+    needed = max(needed, min_restarts)
+    return needed if max_restarts is None else min(needed, max_restarts)
+
+
+class MultiFidelityScreen:
+    """
+    Screen the combinations of design points and injection rates with short
+    pilot runs, run only the promising ones with the full runDuration.
+    """
+
+    def __init__(self, config_file, simulator, designs=None, inj_rates=None, basedir='.',
+                 stages=((0.1, 3),), confidence=0.9, saturation_factor=10., cost=None,
+                 precision=0.02, min_restarts=2, max_restarts=None, num_cores=None,
+                 check=True):
+        """
+        Parameters
+        ----------
+        config_file : str
+            Path of the config.ini file with the fixed values.
+        simulator : str
+            The path of the simulator executor "./sim"
+        designs : list(dict), optional
+            The config.ini values of each design point, by default only the
+            configuration of the file
+        inj_rates : list(float), optional
+            The injection rates of every design point, by default the
+            runRateMin/runRateMax/runRateStep sweep
+        basedir : str, optional
+            The directory of the simulations, by default '.'
+        stages : tuple, optional
+            The (share of the runDuration, restarts) of each pilot stage, by
+            default ((0.1, 3),)
+        confidence : float, optional
+            The confidence level of the screening and the full runs, by
+            default 0.9
+        saturation_factor : float, optional
+            A candidate whose mean latency exceeds this factor times the
+            zero-load latency of the PerformanceModel is saturated, by default
+            10. A candidate without any finished restart is saturated, too.
+        cost : callable, optional
+            cost(config) of a design point, e.g. explore.buffer_cost. A design
+            is only dominated by designs which cost no more, by default all
+            designs cost the same
+        precision : float, optional
+            The target half width of the confidence interval of the full runs
+            relative to the mean latency, by default 0.02
+        min_restarts : int, optional
+            The minimum number of full restarts, by default 2
+        max_restarts : int, optional
+            The maximum number of full restarts, by default restarts of config.ini
+        num_cores : int, optional
+            The number of parallel simulations, by default numCores of config.ini
+        check : bool, optional
+            Validate the configuration of each design point, by default True
+        """
+        self.config_file = config_file
+        self.simulator = simulator
+        self.designs = [dict(design) for design in designs] if designs else [{}]
+        self.basedir = basedir
+        self.stages = [(float(fraction), int(restarts)) for fraction, restarts in stages]
+        self.confidence = confidence
+        self.saturation_factor = saturation_factor
+        self.cost = cost
+        self.precision = precision
+        self.min_restarts = min_restarts
+        self.check = check
+
+        self._ini = read_config_ini(config_file)
+        base = configure.Configuration(config_file)
+        self.inj_rates = list(inj_rates) if inj_rates is not None else list(sweep_rates(base))
+        self.max_restarts = max_restarts if max_restarts is not None else base.restarts
+        self.num_cores = num_cores if num_cores is not None else base.numCores
+        assert self.min_restarts <= self.max_restarts, \
+            "min_restarts {} exceeds max_restarts {}".format(self.min_restarts, self.max_restarts)
+
+        # one result per design point and injection rate
+        self.results = [{'design': design, 'inj_rate': float(inj_rate), 'status': None,
+                         'stage': None, 'samples': {}}
+                        for design in self.designs for inj_rate in self.inj_rates]
+        self._stage_files = {}
+
+    def design_dir(self, design_idx):
+        return os.path.join(self.basedir, "design_{}".format(design_idx))
+
+    def _files(self, design_idx, stage, fidelity):
+        """ The configuration, config.xml and network.xml of a design and a stage """
+        key = (design_idx, stage)
+        if key not in self._stage_files:
+            directory = os.path.join(self.design_dir(design_idx), stage)
+            design = dict(self.designs[design_idx], **fidelity)
+            config, _, network_xml = write_design(self._ini, design, directory)
+            self._stage_files[key] = (config, os.path.join(directory, 'config.xml'),
+                                      network_xml)
+        return self._stage_files[key]
+
+    def _full_config(self, design_idx):
+        if (design_idx, FULL) not in self._stage_files:
+            self._files(design_idx, FULL, {})
+        return self._stage_files[(design_idx, FULL)][0]
+
+    def _saturation_latency(self, design_idx):
+        try:
+            model = PerformanceModel(self._full_config(design_idx))
+        except AssertionError:
+            return np.inf  # no model of the routing
+        return self.saturation_factor * model.zero_load_latency
+
+    def run_stage(self, stage, results, restarts, fidelities=None):
+        """
+        Simulate further restarts of the given results in one parallel pool.
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage and its subdirectory.
+        results : list(dict)
+            The results to simulate.
+        restarts : list(int)
+            The total number of restarts of each result in this stage, the
+            restarts which already ran are kept.
+        fidelities : list(dict), optional
+            The config.ini values of each result in this stage, see
+            fidelity_design, by default the full run
+        """
+        from .. import datahandle
+        from ..networkconfig import validate
+
+        jobs = []
+        simdirs = {}
+        if fidelities is None:
+            fidelities = [{}] * len(results)
+        for result, total, fidelity in zip(results, restarts, fidelities):
+            design_idx = self.designs.index(result['design'])
+            try:
+                config, config_xml, network_xml = self._files(design_idx, stage, fidelity)
+                directory = rate_dir(os.path.join(self.design_dir(design_idx), stage),
+                                     result['inj_rate'])
+                rate_xml = os.path.join(directory, 'config.xml')
+                if not os.path.exists(rate_xml):
+                    os.makedirs(directory, exist_ok=True)
+                    createedit.edit_config_file(config, config_xml, rate_xml, result['inj_rate'])
+                    if self.check:
+                        validate.check_configuration(rate_xml, network_xml, config)
+            except AssertionError as error:
+                print("Invalid design point {}: {}".format(result['design'], error))
+                result['status'] = INVALID
+                continue
+
+            done = len(result['samples'].get(stage, ()))
+            dirs = [os.path.join(directory, "sim{}".format(restart)) for restart in range(total)]
+            for simdir in dirs[done:]:
+                os.makedirs(simdir, exist_ok=True)
+                jobs.append((rate_xml, network_xml, simdir, config.logMode))
+            simdirs[id(result)] = dirs
+        simulate_all(self.simulator, jobs, self.num_cores)
+
+        for result in results:
+            if id(result) in simdirs:
+                packet = datahandle.retrieve_diff_latencies(simdirs[id(result)])[1]
+                result['samples'][stage] = np.asarray(packet, dtype=float)
+                result['stage'] = stage
+
+    def _valid_samples(self, result, stage):
+        samples = result['samples'].get(stage, np.empty(0))
+        return samples[samples >= 0]
+
+    def screen_stage(self, stage):
+        """ Discard the saturated and the dominated candidates after a stage """
+        saturation = [self._saturation_latency(idx) for idx in range(len(self.designs))]
+        costs = [self.cost(self._full_config(idx)) if self.cost is not None else 0.
+                 for idx in range(len(self.designs))]
+        for inj_rate in self.inj_rates:
+            group = [result for result in self.active if result['inj_rate'] == float(inj_rate)]
+            if not group:
+                continue
+            samples = [self._valid_samples(result, stage) for result in group]
+            design_idx = [self.designs.index(result['design']) for result in group]
+            saturated = [len(s) == 0 or s.mean() > saturation[idx]
+                         for s, idx in zip(samples, design_idx)]
+            survivors, dominated = screen(samples, saturated, [costs[idx] for idx in design_idx],
+                                          self.confidence)
+            for result, sat, dom in zip(group, saturated, dominated):
+                if sat:
+                    result['status'] = SATURATED
+                elif dom:
+                    result['status'] = DOMINATED
+
+    @property
+    def active(self):
+        """ The results which were not discarded """
+        return [result for result in self.results if result['status'] is None]
+
+    def run(self, verbose=True):
+        """
+        Run the pilot stages with screening, then the full runs of the survivors
+        with adaptive restarts.
+
+        Returns
+        -------
+        list(dict)
+            Per design point and injection rate: the 'design', 'inj_rate',
+            'status' (saturated, dominated, invalid or full), the last 'stage',
+            the packet latency 'samples' of each stage and the 'latency' and
+            'half_width' of the confidence interval of the last stage.
+        """
+        # the configurations of the full runs, for the pilot durations and the costs
+        for idx in range(len(self.designs)):
+            self._full_config(idx)
+
+        for num, (fraction, restarts) in enumerate(self.stages):
+            stage = "pilot{}".format(num)
+            active = self.active
+            fidelities = [fidelity_design(self._full_config(self.designs.index(result['design'])),
+                                          fraction, restarts) for result in active]
+            self.run_stage(stage, active, [restarts] * len(active), fidelities)
+            self.screen_stage(stage)
+            if verbose:
+                print("{}: {} of {} candidates left".format(stage, len(self.active),
+                                                            len(self.results)))
+
+        # the pilot spread estimates the restarts of the full runs
+        active = self.active
+        last = "pilot{}".format(len(self.stages) - 1) if self.stages else None
+        restarts = [restarts_needed(self._valid_samples(result, last), self.precision,
+                                    self.confidence, self.min_restarts, self.max_restarts)
+                    if last else self.max_restarts for result in active]
+        while active:
+            self.run_stage(FULL, active, restarts)
+            pending = []
+            for result, total in zip(active, restarts):
+                samples = self._valid_samples(result, FULL)
+                mean, half_width = confidence_interval(samples, self.confidence)
+                if result['status'] is None and total < self.max_restarts and \
+                        not half_width <= self.precision * abs(mean):
+                    needed = restarts_needed(samples, self.precision, self.confidence,
+                                             self.min_restarts, self.max_restarts)
+                    pending.append((result, max(needed, total + 1)))
+            if verbose:
+                print("{}: {} candidates need more restarts".format(FULL, len(pending)))
+            active = [result for result, _ in pending]
+            restarts = [total for _, total in pending]
+
+        for result in self.results:
+            if result['status'] is None:
+                result['status'] = FULL
+            if result['stage'] is not None:
+                result['latency'], result['half_width'] = confidence_interval(
+                    self._valid_samples(result, result['stage']), self.confidence)
+        return self.results
+
+
+def screen_designs(config_file, simulator, designs=None, inj_rates=None, verbose=True, **kwargs):
+    """
+    Run a multi-fidelity screening, see MultiFidelityScreen.
+
+    Returns
+    -------
+    list(dict)
+        The result of each design point and injection rate.
+    """
+    return MultiFidelityScreen(config_file, simulator, designs, inj_rates,
+                               **kwargs).run(verbose)
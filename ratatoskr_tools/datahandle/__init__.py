@@ -1 +1,2 @@
 from .retrieve import *
+from .phases import read_packet_events, retrieve_phase_latencies, split_by_phase
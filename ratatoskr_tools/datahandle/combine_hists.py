@@ -26,51 +26,34 @@ import os
 import numpy as np
 import pandas as pd
 
+from ..networkconfig.topology import load_topology
+
 ###############################################################################
 
 
-def create_layers_range(config):
+def router_layer_map(config, topology=None):
     """
-    Calculate the router id range for each layer of NoC.
+    Calculate the layer id of every router.
 
     Parameters
     ----------
     config : [type]
         Configuration
+    topology : ratatoskr_tools.networkconfig.topology.Topology or str, optional
+        The loaded network or the path of its network.xml file, whose router
+        to layer map is used if given, by default None
 
     Returns
     -------
-    [type]
-        list of router id range
+    np.ndarray
+        layer id indexed by the router id
     """
-
-    layers_range = []
-    router_counter = 0
-    for x, y in zip(config.x, config.y):
-        layers_range.append(range(router_counter, router_counter+x*y))
-        router_counter += x*y
-    return layers_range
-
-
-def find_layer_id(layers_range, router_id):
-    """
-    Find layer id of the router.
-
-    Parameters
-    ----------
-    layers_range : [type]
-        list of router id range
-    router_id : int
-        [description]
-
-    Returns
-    -------
-    int
-        layer id
-    """
-    for itr, layer_range in enumerate(layers_range):
-        if router_id in layer_range:
-            return itr
+    if isinstance(topology, str):
+        topology = load_topology(topology)
+    if topology is not None:
+        return topology.router_layers
+    return np.repeat(np.arange(config.z),
+                     [x*y for x, y in zip(config.x, config.y)])
 
 
 def init_data_structure(config):
@@ -153,7 +136,7 @@ def get_latencies(latencies_results_file):
     return latencies
 
 
-def combine_vc_hists(directory, config):
+def combine_vc_hists(directory, config, topology=None):
     """[summary]
     Combine the VC histograms from csv files.
     Parameters
@@ -162,6 +145,8 @@ def combine_vc_hists(directory, config):
         the path of the directory that contains the files.
     config : [type]
         [description]
+    topology : ratatoskr_tools.networkconfig.topology.Topology, optional
+        The loaded network, by default None
 
     Returns
     -------
@@ -175,10 +160,10 @@ def combine_vc_hists(directory, config):
 
     data = [pd.DataFrame() for itr in range(config.z)]
 
-    layers_range = create_layers_range(config)
+    router_layers = router_layer_map(config, topology)
     for fname in os.listdir(directory):
         router_id = int(fname.split('.')[0])
-        layer_id = find_layer_id(layers_range, router_id)
+        layer_id = router_layers[router_id]
         temp = pd.read_csv(os.path.join(directory, fname),
                            header=None, index_col=0).T
         data[layer_id] = data[layer_id].add(temp, fill_value=0)
@@ -190,12 +175,13 @@ def combine_vc_hists(directory, config):
     return data
 
 
-def combine_buff_hists(directory, config):
+def combine_buff_hists(directory, config, topology=None):
     """
         Combine the Buffer histograms from csv files.
 
         Parameters:
             - directory: the path of the directory that contains the files.
+            - topology: the loaded network, optional.
 
         Return:
             - A dataframe object of the combined csv files,
@@ -205,7 +191,7 @@ def combine_buff_hists(directory, config):
         return None
 
     data = init_data_structure(config)
-    layers_range = create_layers_range(config)
+    router_layers = router_layer_map(config, topology)
 
     for filename in os.listdir(directory):
         router_id = int(filename.split('.')[0].split('_')[0])
@@ -215,7 +201,7 @@ def combine_buff_hists(directory, config):
         if direction not in ['Up', 'Down', 'North', 'South', 'East', 'West']:
             continue
 
-        layer_id = find_layer_id(layers_range, router_id)
+        layer_id = router_layers[router_id]
         data = read_dataframe(data, path, layer_id, direction)
 
     # average the buffer usage over the inner routers (#4)
@@ -224,3 +210,98 @@ def combine_buff_hists(directory, config):
             data[itr][d] = np.ceil(data[itr][d] / 4)
 
     return data
+
+
+def _mean_of_hist(hist):
+    """ The mean index value of a histogram data frame with counts as values """
+    counts = hist.to_numpy(dtype=float)
+    total = counts.sum()
+    if total == 0:
+        return 0.
+    levels = hist.index.to_numpy(dtype=float)
+    return float(levels @ counts.sum(axis=1) / total)
+
+
+def router_vc_usage(directory, num_routers):
+    """
+    Calculate the mean number of used VCs of every router.
+
+    Parameters
+    ----------
+    directory : str
+        the path of the VCUsage directory.
+    num_routers : int
+        The number of routers of the network.
+
+    Returns
+    -------
+    np.ndarray
+        The mean number of used VCs indexed by the router id,
+        or None if the directory doesn't exist.
+    """
+    if not os.path.exists(directory):
+        return None
+
+    usage = np.zeros(num_routers)
+    for fname in os.listdir(directory):
+        router_id = int(fname.split('.')[0])
+        if router_id >= num_routers:
+            continue
+        temp = pd.read_csv(os.path.join(directory, fname),
+                           header=None, index_col=0).T
+        temp.index = temp.index.astype(float)
+        usage[router_id] = _mean_of_hist(temp)
+
+    return usage
+
+
+def _busy_fraction(hist):
+    """ The share of the counts of a histogram data frame at a non-zero index """
+    counts = hist.to_numpy(dtype=float).sum(axis=1)
+    total = counts.sum()
+    if total == 0:
+        return 0.
+    return float(counts[hist.index.to_numpy(dtype=float) > 0].sum() / total)
+
+
+def router_buff_usage(directory, num_routers, statistic='mean'):
+    """
+    Calculate the buffer usage of every router, averaged over its input directions.
+
+    Parameters
+    ----------
+    directory : str
+        the path of the BuffUsage directory.
+    num_routers : int
+        The number of routers of the network.
+    statistic : str, optional
+        'mean' for the mean buffer occupancy in flits or 'busy' for the share
+        of the time a buffer holds at least one flit, by default 'mean'
+
+    Returns
+    -------
+    np.ndarray
+        The buffer usage indexed by the router id,
+        or None if the directory doesn't exist.
+    """
+    assert statistic in ('mean', 'busy'), "Unknown statistic '{}'".format(statistic)
+    if not os.path.exists(directory):
+        return None
+
+    usage = np.zeros(num_routers)
+    ports = np.zeros(num_routers)
+    for filename in os.listdir(directory):
+        router_id, direction = filename.split('.')[0].split('_')[:2]
+        router_id = int(router_id)
+        if direction not in ['Up', 'Down', 'North', 'South', 'East', 'West'] \
+                or router_id >= num_routers:
+            continue
+
+        temp = pd.read_csv(os.path.join(directory, filename), index_col=0)
+        if temp.empty:
+            continue
+        usage[router_id] += _mean_of_hist(temp) if statistic == 'mean' \
+            else _busy_fraction(temp)
+        ports[router_id] += 1
+
+    return np.divide(usage, ports, out=np.zeros(num_routers), where=ports > 0)
@@ -0,0 +1,178 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# Per-phase statistics of the phased runs of
+# ratatoskr_tools.networkconfig.write_phased_config.
+#
+# The report files of the simulator cover the whole run, so the phases are
+# split by the packet events of the log: the head flit sent by the source
+# processing element and the tail flit received by the destination. A packet
+# belongs to the phase whose measurement window contains its send time.
+#
+# write_phased_config enables these events whatever the outputProfile, the
+# simulations need the logMode 'file' since a 'tail' log lacks the early
+# phases. The wording of the event lines depends on the simulator build, so
+# the caller passes the regular expressions matching its log.
+###############################################################################
+import os
+import re
+
+import numpy as np
+
+###############################################################################
+
+
+def _open_log(simdir):
+    path = os.path.join(simdir, "log")
+    assert not os.path.exists(path + ".gz") or os.path.exists(path), \
+        "{} has only the tail of its log, run the phased simulations with " \
+        "the logMode 'file'".format(simdir)
+    assert os.path.exists(path), "{} has no log".format(simdir)
+    return open(path, 'rb')
+
+
+def read_packet_events(simdir, patterns):
+    """
+    Read the send and receive times of the packets from the log of a simulation.
+
+    Parameters
+    ----------
+    simdir : str
+        The simulation directory with the log file.
+    patterns : dict
+        The regular expressions of the 'send' and 'receive' events, each with
+        the named groups 'time' (in the unit of the phase windows) and
+        'packet' (the packet id).
+
+    Returns
+    -------
+    tuple(np.ndarray)
+        The send time and the receive time of each sent packet, the receive
+        time is NaN for a packet which did not arrive.
+
+    Examples
+    --------
+    For a log with lines like "@1100 ns pe_16: send_head_flit packet 7":
+
+    >>> patterns = {kind: '@(?P<time>[0-9.]+).*' + event + '.*packet (?P<packet>[0-9]+)'
+    ...             for kind, event in (('send', 'send_head_flit'),
+    ...                                 ('receive', 'receive_tail_flit'))}
+    >>> re.search(patterns['send'], "@1100 ns pe_16: send_head_flit packet 7").group(
+    ...     'time', 'packet')
+    ('1100', '7')
+    """
+    assert set(patterns) >= {'send', 'receive'}, \
+        "patterns needs the 'send' and 'receive' expressions"
+    patterns = {kind: re.compile(patterns[kind]) for kind in ('send', 'receive')}
+    send = {}
+    receive = {}
+    with _open_log(simdir) as f:
+        for line in f:
+            line = line.decode(errors='replace')
+            for kind, events in (('send', send), ('receive', receive)):
+                match = patterns[kind].search(line)
+                if match is not None:
+                    # the first send and the last receive of a packet id
+                    packet = int(match.group('packet'))
+                    if kind == 'receive' or packet not in events:
+                        events[packet] = float(match.group('time'))
+                    break
+
+    assert send and receive, \
+        "{} has no {} events matching the patterns, check them against the log" \
+        .format(simdir, 'send' if not send else 'receive')
+
+    packets = np.fromiter(send, dtype=np.int64, count=len(send))
+    send_times = np.fromiter(send.values(), dtype=float, count=len(send))
+    receive_times = np.array([receive.get(packet, np.nan) for packet in packets.tolist()],
+                             dtype=float).reshape(-1)
+    return send_times, receive_times
+
+
+def split_by_phase(send_times, receive_times, windows):
+    """
+    The statistics of the packets sent in each measurement window.
+
+    Parameters
+    ----------
+    send_times, receive_times : np.ndarray
+        The packet events of read_packet_events.
+    windows : list(tuple)
+        The (injection rate, start, end) of each phase.
+
+    Returns
+    -------
+    dict
+        Per phase arrays: 'sent', 'received' packets, 'latency' (mean),
+        'latency_p95', 'throughput' (received packets per time unit of the
+        window) and 'lost' (share of the sent packets which did not arrive).
+    """
+    num = len(windows)
+    stats = {key: np.full(num, np.nan) for key in
+             ('sent', 'received', 'latency', 'latency_p95', 'throughput', 'lost')}
+    latencies = receive_times - send_times
+    for idx, (_, start, end) in enumerate(windows):
+        sent = (send_times >= start) & (send_times < end)
+        arrived = sent & ~np.isnan(receive_times)
+        stats['sent'][idx] = np.count_nonzero(sent)
+        stats['received'][idx] = np.count_nonzero(arrived)
+        if np.any(arrived):
+            stats['latency'][idx] = latencies[arrived].mean()
+            stats['latency_p95'][idx] = np.percentile(latencies[arrived], 95)
+        stats['throughput'][idx] = stats['received'][idx] / (end - start)
+        if stats['sent'][idx]:
+            stats['lost'][idx] = 1 - stats['received'][idx] / stats['sent'][idx]
+    return stats
+
+
+def retrieve_phase_latencies(simdirs, windows, patterns):
+    """
+    Retrieve the packet latency of each phase from the logs of the restarts
+    of a phased run.
+
+    Parameters
+    ----------
+    simdirs : list(str)
+        The list of dummy simulation directories.
+    windows : list(tuple)
+        The (injection rate, start, end) of each phase, as returned by
+        ratatoskr_tools.networkconfig.write_phased_config.
+    patterns : dict
+        The regular expressions of the packet events, see read_packet_events
+
+    Returns
+    -------
+    tuple
+        The injection rates and the mean packet latency of each phase and
+        restart, shape (#phases, #restarts), -1 for a phase without packets
+        like retrieve_diff_latencies. Further statistics of split_by_phase as
+        dict of such arrays.
+    """
+    inj_rates = [window[0] for window in windows]
+    stats = {}
+    for restart, simdir in enumerate(simdirs):
+        phase_stats = split_by_phase(*read_packet_events(simdir, patterns), windows)
+        for key, values in phase_stats.items():
+            stats.setdefault(key, -np.ones((len(windows), len(simdirs))))[:, restart] = values
+    for values in stats.values():
+        values[np.isnan(values)] = -1
+    return inj_rates, stats['latency'], stats
@@ -3,10 +3,29 @@ import os
 import numpy as np
 import pandas as pd
 
+from ..networkconfig.topology import load_topology
 from . import combine_hists as ch
 
+# The per-router metrics of retrieve_router_usages and their descriptions
+ROUTER_METRICS = {'buff': 'Mean buffer occupancy [flits]',
+                  'vc': 'Mean number of used VCs',
+                  'util': 'Buffer utilization'}
 
-def retrieve_vc_usages(simdirs, config):
+
+def _simdirs_topology(simdirs, topology):
+    """
+    The Topology of a network.xml path, by default of the network.xml next to
+    the simulation directories. None without such a file.
+    """
+    if topology is None and len(simdirs):
+        path = os.path.join(os.path.dirname(os.path.normpath(simdirs[0])), "network.xml")
+        topology = path if os.path.exists(path) else None
+    if isinstance(topology, str):
+        topology = load_topology(topology)
+    return topology
+
+
+def retrieve_vc_usages(simdirs, config, topology=None):
     """
     Retrieve all the vc usages simulation result from the dummy simulation directories.
 
@@ -14,6 +33,10 @@ def retrieve_vc_usages(simdirs, config):
     ----------
     simdirs : list(str)
         The list of dummy simulation directories.
+    topology : ratatoskr_tools.networkconfig.topology.Topology or str, optional
+        The loaded network or the path of its network.xml file, loaded from
+        the cache of load_topology. By default the network.xml file next to
+        the simulation directories, or the router layers of config without it.
 
     Returns
     -------
@@ -22,10 +45,11 @@ def retrieve_vc_usages(simdirs, config):
     """
 
     vc_usage_inj = [pd.DataFrame() for itr in range(config.z)]
+    topology = _simdirs_topology(simdirs, topology)
 
     for simdir in simdirs:
         vc_usage_run = ch.combine_vc_hists(
-            os.path.join(simdir, "VCUsage"), config)
+            os.path.join(simdir, "VCUsage"), config, topology)
 
         if vc_usage_run is not None:
             for idx, layer_df in enumerate(vc_usage_run):
@@ -40,7 +64,7 @@ def retrieve_vc_usages(simdirs, config):
     return vc_usage_temp
 
 
-def retrieve_buff_usages(simdirs, config):
+def retrieve_buff_usages(simdirs, config, topology=None):
     """
     Retrieve all the buff usages simulation result from the dummy simulation directories.
 
@@ -48,6 +72,10 @@ def retrieve_buff_usages(simdirs, config):
     ----------
     simdirs : list(str)
         The list of dummy simulation directories.
+    topology : ratatoskr_tools.networkconfig.topology.Topology or str, optional
+        The loaded network or the path of its network.xml file, loaded from
+        the cache of load_topology. By default the network.xml file next to
+        the simulation directories, or the router layers of config without it.
 
     Returns
     -------
@@ -56,10 +84,11 @@ def retrieve_buff_usages(simdirs, config):
     """
 
     buff_usage_inj = ch.init_data_structure(config)
+    topology = _simdirs_topology(simdirs, topology)
 
     for simdir in simdirs:
         buff_usage_run = ch.combine_buff_hists(
-            os.path.join(simdir, "BuffUsage"), config)
+            os.path.join(simdir, "BuffUsage"), config, topology)
 
         if buff_usage_run is None:
             continue
@@ -78,6 +107,41 @@ def retrieve_buff_usages(simdirs, config):
     return buff_usage_inj
 
 
+def retrieve_router_usages(simdirs, num_routers, metric='buff'):
+    """
+    Retrieve the usage of every router from the dummy simulation directories.
+
+    Parameters
+    ----------
+    simdirs : list(str)
+        The list of dummy simulation directories.
+    num_routers : int
+        The number of routers of the network.
+    metric : str, optional
+        'buff' for the mean buffer occupancy in flits, 'vc' for the mean
+        number of used VCs or 'util' for the share of the time the buffers
+        hold at least one flit, by default 'buff'
+
+    Returns
+    -------
+    np.ndarray
+        The usage indexed by the router id, averaged over the restarts.
+    """
+    assert metric in ROUTER_METRICS, "Unknown metric '{}'".format(metric)
+    if metric == 'vc':
+        usages = [ch.router_vc_usage(os.path.join(simdir, "VCUsage"), num_routers)
+                  for simdir in simdirs]
+    else:
+        statistic = 'mean' if metric == 'buff' else 'busy'
+        usages = [ch.router_buff_usage(os.path.join(simdir, "BuffUsage"), num_routers,
+                                       statistic) for simdir in simdirs]
+    usages = [usage for usage in usages if usage is not None]
+    if not usages:
+        return np.zeros(num_routers)
+
+    return np.mean(usages, axis=0)
+
+
 def retrieve_diff_latencies(simdirs):
     """
     Retrieve all kinds of latencies (flit, packet, network) simulation result
@@ -104,3 +168,44 @@ def retrieve_diff_latencies(simdirs):
         latency_networks[idx] = lat[2]
 
     return latency_flits, latency_packets, latency_networks
+
+
+def merge_region_results(simdirs, num_packets, num_cycles, num_routers, metric='buff'):
+    """
+    Merge the results of the simulations of the regions of a netrace trace into
+    whole-trace results. The latencies are weighted by the packets, the router
+    usages by the cycles of each region.
+
+    Parameters
+    ----------
+    simdirs : list(str)
+        The simulation directory of each region or group of regions.
+    num_packets : list(int)
+        The packets of each region or group of regions.
+    num_cycles : list(int)
+        The cycles of each region or group of regions.
+    num_routers : int
+        The number of routers of the network.
+    metric : str, optional
+        The router usage of retrieve_router_usages, by default 'buff'
+
+    Returns
+    -------
+    dict
+        The merged 'flit', 'packet' and 'network' latency, -1 if no region
+        has a result, and the merged 'router_usages'.
+    """
+    lats = retrieve_diff_latencies(simdirs)
+    merged = {}
+    for name, values in zip(('flit', 'packet', 'network'), lats):
+        valid = values >= 0
+        weights = np.asarray(num_packets, dtype=float)[valid]
+        merged[name] = float(np.average(values[valid], weights=weights)) \
+            if weights.sum() > 0 else -1.
+
+    usages = np.array([retrieve_router_usages([simdir], num_routers, metric)
+                       for simdir in simdirs])
+    weights = np.asarray(num_cycles, dtype=float)
+    merged['router_usages'] = np.average(usages, axis=0, weights=weights) \
+        if weights.sum() > 0 else usages.mean(axis=0)
+    return merged
@@ -1 +1,2 @@
 from .generate_plots import *
+from .report import ReportWriter, build_report, merge_pdfs
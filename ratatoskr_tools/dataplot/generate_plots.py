@@ -25,6 +25,8 @@ import os
 import matplotlib.pyplot as plt
 import numpy as np
 
+from ..datahandle.retrieve import ROUTER_METRICS
+
 plt.rcParams.update({'figure.max_open_warning': 0})
 ###############################################################################
 
@@ -93,9 +95,56 @@ def plot_latencies(inj_rates, latencies_flit, latencies_packet, latencies_networ
 ###############################################################################
 
 
+def plot_vc_usage_page(df, layer_id, inj_rate):
+    """
+    Plot the VC usage statistics of one layer and injection rate.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        The mean and std of the VC usage of the layer per direction.
+    layer_id : int
+        The layer id.
+    inj_rate : float
+        The injection rate.
+
+    Returns
+    -------
+    matplotlib.pyplot.figure()
+        Plotted figure.
+    """
+    fig = plt.figure()
+    plt.title('Layer ' + str(layer_id) +
+              ', Injection Rate = ' + str(inj_rate))
+    plt.ylabel('Count', fontsize=11)
+    plt.xlabel('VC Usage', fontsize=11)
+    for col in df.columns.levels[0].values:
+        plt.errorbar(df.index.values, df[col, 'mean'].values,
+                     yerr=df[col, 'std'].values)
+    plt.legend(df.columns.levels[0].values)
+    return fig
+
+
+def vc_usage_pages(vc_usages, inj_rates):
+    """
+    Generate the pages of the VC usage statistics, one for each injection rate and layer.
+
+    Returns
+    -------
+    generator
+        The plot function, its arguments and the page name of each page.
+    """
+    for inj_df, inj_rate in zip(vc_usages, inj_rates):
+        for layer_id, df in enumerate(inj_df):
+            yield plot_vc_usage_page, (df, layer_id, inj_rate), \
+                'VC_' + str(layer_id) + '_' + str(inj_rate)
+
+
 def plot_vc_usage_stats(vc_usages, inj_rates, output_dir=None, plt_show=False):
     """
     Plot the VC usage statistics.
+    All figures are kept open, see ratatoskr_tools.dataplot.build_report
+    for large sweeps.
 
     Parameteres:
         - vc_usages: the data frames of an injection rate.
@@ -105,36 +154,96 @@ def plot_vc_usage_stats(vc_usages, inj_rates, output_dir=None, plt_show=False):
         - None.
     """
     figs = []
-    for inj_df, inj_rate in zip(vc_usages, inj_rates):
-        for layer_id, df in enumerate(inj_df):
-            fig = plt.figure()  # plot a figure for each inj_rate and layer
-            plt.title('Layer ' + str(layer_id) +
-                      ', Injection Rate = ' + str(inj_rate))
-            plt.ylabel('Count', fontsize=11)
-            plt.xlabel('VC Usage', fontsize=11)
-            for col in df.columns.levels[0].values:
-                plt.errorbar(df.index.values, df[col, 'mean'].values,
-                             yerr=df[col, 'std'].values)
-            plt.legend(df.columns.levels[0].values)
-
-            if plt_show is True:
-                plt.show()
-
-            if output_dir is not None:
-                assert os.path.isdir(output_dir)
-                output_path = os.path.join(output_dir, 'VC_' + str(layer_id) +
-                                           '_' + str(inj_rate) + '.pdf')
-                fig.savefig(output_path)
-
-            figs.append(fig)
+    for plot_page, args, name in vc_usage_pages(vc_usages, inj_rates):
+        fig = plot_page(*args)  # plot a figure for each inj_rate and layer
+
+        if plt_show is True:
+            plt.show()
+
+        if output_dir is not None:
+            assert os.path.isdir(output_dir)
+            fig.savefig(os.path.join(output_dir, name + '.pdf'))
+
+        figs.append(fig)
 
     return figs
 ###############################################################################
 
 
+def plot_buff_usage_page(layer_dict, layer_id, inj_rate):
+    """
+    Plot the buffer usage statistics of one layer and injection rate.
+
+    Parameters
+    ----------
+    layer_dict : dict
+        The buffer usage data frame of each direction.
+    layer_id : int
+        The layer id.
+    inj_rate : float
+        The injection rate.
+
+    Returns
+    -------
+    matplotlib.pyplot.figure()
+        Plotted figure, None if all directions are empty.
+    """
+    if all(layer_dict[d].empty for d in layer_dict):
+        return None
+
+    fig = plt.figure()
+    for it, d in enumerate(layer_dict):
+        df = layer_dict[d]
+        if not df.empty:
+            ax = fig.add_subplot(3, 2, it+1, projection='3d')
+            lx = df.shape[0]
+            ly = df.shape[1]
+            xpos = np.arange(0, lx, 1)
+            ypos = np.arange(0, ly, 1)
+            xpos, ypos = np.meshgrid(xpos, ypos, indexing='ij')
+
+            xpos = xpos.flatten()
+            ypos = ypos.flatten()
+            zpos = np.zeros(lx*ly)
+
+            dx = 1 * np.ones_like(zpos)
+            dy = dx.copy()
+            dz = df.values.flatten()
+
+            ax.bar3d(xpos, ypos, zpos, dx, dy, dz, color='b')
+
+            ax.set_yticks(ypos)
+            ax.set_xlabel('Buffer Size')
+            ax.set_ylabel('VC Index')
+            ax.set_zlabel('Count')
+            ax.set_title('Direction:'+str(d))
+
+    fig.suptitle('Layer: {}, Injection Rate = {}'.format(
+        layer_id, inj_rate), fontsize=16)
+    return fig
+
+
+def buff_usage_pages(buff_usages, inj_rates):
+    """
+    Generate the pages of the buffer usage statistics, one for each injection
+    rate and layer.
+
+    Returns
+    -------
+    generator
+        The plot function, its arguments and the page name of each page.
+    """
+    for buff_usage, inj_rate in zip(buff_usages, inj_rates):
+        for layer_id, layer_dict in enumerate(buff_usage):
+            yield plot_buff_usage_page, (layer_dict, layer_id, inj_rate), \
+                'Buff_' + str(layer_id) + '_' + str(inj_rate)
+
+
 def plot_buff_usage_stats(buff_usages, inj_rates, output_dir=None, plt_show=False):
     """
     Plot the buffer usage statistics.
+    All figures are kept open, see ratatoskr_tools.dataplot.build_report
+    for large sweeps.
 
     Parameters:
         - buff_usages: the data dictionaries of an injection rate.
@@ -144,56 +253,110 @@ def plot_buff_usage_stats(buff_usages, inj_rates, output_dir=None, plt_show=Fals
         - None.
     """
     figs = []
-    for buff_usage, inj_rate in zip(buff_usages, inj_rates):
-        for layer_id, layer_dict in enumerate(buff_usage):
-            skip = True
-            for it, d in enumerate(layer_dict):
-                df = layer_dict[d]
-                if not df.empty:
-                    skip = False
-                    break
-            if skip is True:
-                continue
-            fig = plt.figure()
-            for it, d in enumerate(layer_dict):
-                df = layer_dict[d]
-                if not df.empty:
-                    ax = fig.add_subplot(3, 2, it+1, projection='3d')
-                    lx = df.shape[0]
-                    ly = df.shape[1]
-                    xpos = np.arange(0, lx, 1)
-                    ypos = np.arange(0, ly, 1)
-                    xpos, ypos = np.meshgrid(xpos, ypos, indexing='ij')
-
-                    xpos = xpos.flatten()
-                    ypos = ypos.flatten()
-                    zpos = np.zeros(lx*ly)
-
-                    dx = 1 * np.ones_like(zpos)
-                    dy = dx.copy()
-                    dz = df.values.flatten()
-
-                    ax.bar3d(xpos, ypos, zpos, dx, dy, dz, color='b')
-
-                    ax.set_yticks(ypos)
-                    ax.set_xlabel('Buffer Size')
-                    ax.set_ylabel('VC Index')
-                    ax.set_zlabel('Count')
-                    ax.set_title('Direction:'+str(d))
-
-            fig.suptitle('Layer: {}, Injection Rate = {}'.format(
-                layer_id, inj_rate), fontsize=16)
-
-            if plt_show is True:
-                plt.show()
-
-            if output_dir is not None:
-                assert os.path.isdir(output_dir)
-                output_path = os.path.join(output_dir, 'Buff_' + str(layer_id) +
-                                           '_' + str(inj_rate) + '.pdf')
-                fig.savefig(output_path)
-
-            figs.append(fig)
+    for plot_page, args, name in buff_usage_pages(buff_usages, inj_rates):
+        fig = plot_page(*args)
+        if fig is None:
+            continue
+
+        if plt_show is True:
+            plt.show()
+
+        if output_dir is not None:
+            assert os.path.isdir(output_dir)
+            fig.savefig(os.path.join(output_dir, name + '.pdf'))
+
+        figs.append(fig)
 
     return figs
 ###############################################################################
+
+
+def layer_rasters(values, config):
+    """
+    Arrange the per-router values as one x*y image per layer.
+
+    Parameters
+    ----------
+    values : array_like
+        The value of each router, indexed by the router id.
+    config : [type]
+        Configuration
+
+    Returns
+    -------
+    list(np.ndarray)
+        The image of each layer, shape (y, x), the router ids increase along x first.
+    """
+    values = np.asarray(values, dtype=float)
+    rasters = []
+    first = 0
+    for x, y in zip(config.x, config.y):
+        rasters.append(values[first:first + x*y].reshape(y, x))
+        first += x*y
+    return rasters
+
+
+def plot_router_heatmaps(usages, inj_rates, config, metric='buff', output_file=None,
+                         plt_show=False, cmap='inferno'):
+    """
+    Plot the usage of every router as one heat map per layer and injection rate.
+    The rows of the figure are the layers, the columns the injection rates,
+    all heat maps share one color scale.
+
+    Parameters
+    ----------
+    usages : list(np.ndarray)
+        The usage of every router for each injection rate, e.g. from
+        ratatoskr_tools.datahandle.retrieve_router_usages.
+    inj_rates : list(float)
+        The injection rates.
+    config : [type]
+        Configuration
+    metric : str, optional
+        The metric of the usages, 'buff', 'vc' or 'util', or any text for the
+        color bar, by default 'buff'
+    output_file : str, optional
+        write the image to the output path, by default None no output file
+    plt_show : bool, optional
+        [description], by default False
+    cmap : str, optional
+        The color map, by default 'inferno'
+
+    Returns
+    -------
+    matplotlib.pyplot.figure()
+        Plotted figure.
+    """
+    label = ROUTER_METRICS.get(metric, metric)
+    rasters = [layer_rasters(usage, config) for usage in usages]
+    assert rasters, "No usages to plot"
+    vmin = min(float(np.nanmin(r)) for layers in rasters for r in layers)
+    vmax = max(float(np.nanmax(r)) for layers in rasters for r in layers)
+
+    num_rows, num_cols = config.z, len(rasters)
+    fig, axes = plt.subplots(num_rows, num_cols, squeeze=False,
+                             figsize=(1 + 2*num_cols, 0.5 + 2*num_rows))
+    for col, (layers, inj_rate) in enumerate(zip(rasters, inj_rates)):
+        for layer_id, raster in enumerate(layers):
+            ax = axes[layer_id, col]
+            image = ax.imshow(raster, origin='lower', cmap=cmap, vmin=vmin, vmax=vmax,
+                              interpolation='nearest')
+            ax.set_xticks([])
+            ax.set_yticks([])
+            if layer_id == 0:
+                ax.set_title('{:.3f}'.format(inj_rate), fontsize=10)
+            if col == 0:
+                ax.set_ylabel('Layer {}'.format(layer_id))
+
+    fig.colorbar(image, ax=axes, label=label, shrink=0.8)
+    fig.suptitle('Router usage per injection rate', fontsize=14)
+
+    if plt_show is True:
+        plt.show()
+
+    if output_file is not None:
+        assert type(output_file) is str
+        fig.savefig(output_file)
+
+    return fig
+###############################################################################
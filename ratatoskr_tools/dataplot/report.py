@@ -0,0 +1,366 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# Streaming report generation.
+#
+# A page is a plot function, its arguments and a page name. Every page is
+# rendered, written to the report and closed before the next one is rendered,
+# so only one figure is open at a time. Pages can be rendered by worker
+# processes into temporary PDF files which are merged in page order.
+#
+# An incremental report keeps every page as its own file together with a
+# manifest of the fingerprints of the page inputs, only pages whose plot
+# function or data changed are rendered again.
+###############################################################################
+import functools
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import types
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_pdf import PdfPages
+
+# Part of every fingerprint, increase it to invalidate all rendered pages
+REPORT_VERSION = 1
+
+###############################################################################
+
+
+class ReportWriter:
+    """
+    Write figures to a multi-page PDF file or as single files to a directory,
+    each figure is closed as soon as it is written.
+    """
+
+    def __init__(self, output, fmt='pdf'):
+        """
+        Parameters
+        ----------
+        output : str
+            A .pdf file for a multi-page report, otherwise a directory which
+            gets one file per page.
+        fmt : str, optional
+            The file format of the pages in a directory, by default 'pdf'
+        """
+        self.output = output
+        self.fmt = fmt
+        self.pages = 0
+        if output.lower().endswith('.pdf'):
+            self._pdf = PdfPages(output)
+        else:
+            os.makedirs(output, exist_ok=True)
+            self._pdf = None
+
+    def add(self, fig, name=None):
+        """
+        Write the figure as next page and close it.
+
+        Parameters
+        ----------
+        fig : matplotlib.figure.Figure
+            The figure, None is skipped.
+        name : str, optional
+            The file name of the page in a directory, by default the page number
+        """
+        if fig is None:
+            return
+        try:
+            if self._pdf is not None:
+                self._pdf.savefig(fig)
+            else:
+                name = name if name is not None else 'page_{:04d}'.format(self.pages)
+                fig.savefig(os.path.join(self.output, name + '.' + self.fmt))
+        finally:
+            plt.close(fig)
+        self.pages += 1
+
+    def add_page(self, plot_page, args=(), name=None):
+        """ Render a page with plot_page(*args) and add it """
+        self.add(plot_page(*args), name)
+
+    def close(self):
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _init_worker():
+    plt.switch_backend('Agg')
+
+
+def _render_chunk(task):
+    output, fmt, pages = task
+    with ReportWriter(output, fmt) as writer:
+        for plot_page, args, name in pages:
+            writer.add_page(plot_page, args, name)
+    return writer.pages
+
+
+def merge_pdfs(paths, output_file):
+    """
+    Merge the PDF files in the given order.
+
+    Parameters
+    ----------
+    paths : list(str)
+        The PDF files.
+    output_file : str
+        Path of the merged PDF file.
+    """
+    import PyPDF2
+
+    merger = PyPDF2.PdfMerger() if hasattr(PyPDF2, 'PdfMerger') else PyPDF2.PdfFileMerger()
+    for path in paths:
+        merger.append(path)
+    with open(output_file, 'wb') as f:
+        merger.write(f)
+    merger.close()
+
+
+def _chunks(pages, chunk_size):
+    pages = iter(pages)
+    while True:
+        chunk = list(itertools.islice(pages, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _digest(sha, obj, _seen=frozenset()):
+    """
+    Feed the content of the object into the hash. Functions are hashed by
+    their name, code, defaults and closure, not by the functions they call.
+    """
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        sha.update(type(obj).__name__.encode())
+        sha.update(repr(obj.shape).encode())
+        if isinstance(obj, pd.DataFrame):
+            sha.update(repr(list(obj.columns)).encode())
+        if len(obj):
+            sha.update(pd.util.hash_pandas_object(obj, index=True).values.tobytes())
+    elif isinstance(obj, np.ndarray):
+        sha.update(repr((obj.dtype.str, obj.shape)).encode())
+        sha.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, dict):
+        sha.update(b'dict')
+        for key in sorted(obj, key=repr):
+            _digest(sha, key, _seen)
+            _digest(sha, obj[key], _seen)
+    elif isinstance(obj, (list, tuple)):
+        sha.update(type(obj).__name__.encode() + str(len(obj)).encode())
+        for item in obj:
+            _digest(sha, item, _seen)
+    elif isinstance(obj, (set, frozenset)):
+        # the iteration order of strings differs between interpreter runs
+        sha.update(type(obj).__name__.encode())
+        for item in sorted(obj, key=repr):
+            _digest(sha, item, _seen)
+    elif isinstance(obj, types.CodeType):
+        # the body: bytecode, constants (with nested code) and referenced names
+        sha.update(obj.co_code)
+        _digest(sha, obj.co_consts, _seen)
+        _digest(sha, (obj.co_names, obj.co_varnames, obj.co_freevars), _seen)
+    elif isinstance(obj, functools.partial):
+        sha.update(b'partial')
+        _digest(sha, (obj.func, obj.args, obj.keywords), _seen)
+    elif isinstance(obj, types.MethodType):
+        _digest(sha, obj.__func__, _seen)
+    elif callable(obj):
+        sha.update('{}.{}'.format(getattr(obj, '__module__', None),
+                                  getattr(obj, '__qualname__', type(obj).__qualname__)).encode())
+        # an edited plot function invalidates its pages
+        code = getattr(obj, '__code__', None)
+        if code is not None and id(obj) not in _seen:
+            _seen = _seen | {id(obj)}  # a recursive closure refers to itself
+            _digest(sha, code, _seen)
+            _digest(sha, (obj.__defaults__, obj.__kwdefaults__), _seen)
+            for cell in obj.__closure__ or ():
+                try:
+                    contents = cell.cell_contents
+                except ValueError:  # an empty cell
+                    continue
+                _digest(sha, contents, _seen)
+    else:
+        sha.update(repr(obj).encode())
+
+
+def fingerprint(plot_page, args, fmt='pdf'):
+    """
+    Fingerprint the plot function, its arguments and the file format of a page.
+    Editing the body of the plot function changes the fingerprint.
+
+    Returns
+    -------
+    str
+        The hex digest.
+    """
+    sha = hashlib.sha1()
+    _digest(sha, (REPORT_VERSION, plot_page, args, fmt))
+    return sha.hexdigest()
+
+
+def _load_manifest(path):
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+        if manifest.get('version') == REPORT_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {'version': REPORT_VERSION, 'pages': {}}
+
+
+def _save_manifest(manifest, path):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _build_incremental(pages, output, num_cores, chunk_size, fmt):
+    to_pdf = output.lower().endswith('.pdf')
+    page_dir = output + '.pages' if to_pdf else output
+    page_fmt = 'pdf' if to_pdf else fmt
+    manifest_path = os.path.join(page_dir, 'manifest.json') if to_pdf \
+        else output.rstrip(os.sep) + '.manifest.json'
+    os.makedirs(page_dir, exist_ok=True)
+
+    names = [name for _, _, name in pages]
+    assert len(set(names)) == len(names), "The page names of the report are not unique"
+
+    manifest = _load_manifest(manifest_path)
+    entries = {}
+    stale = []
+    for plot_page, args, name in pages:
+        fp = fingerprint(plot_page, args, page_fmt)
+        path = os.path.join(page_dir, name + '.' + page_fmt)
+        old = manifest['pages'].get(name)
+        entries[name] = {'fingerprint': fp, 'empty': False}
+        if old is not None and old['fingerprint'] == fp and \
+                (old['empty'] or os.path.exists(path)):
+            entries[name]['empty'] = old['empty']
+            continue
+        if os.path.exists(path):
+            os.remove(path)
+        stale.append((plot_page, args, name))
+
+    if stale:
+        build_report(stale, page_dir, num_cores, chunk_size, page_fmt)
+        for _, _, name in stale:
+            entries[name]['empty'] = not os.path.exists(
+                os.path.join(page_dir, name + '.' + page_fmt))
+    _save_manifest({'version': REPORT_VERSION, 'pages': entries}, manifest_path)
+
+    if to_pdf and (stale or not os.path.exists(output)):
+        merge_pdfs([os.path.join(page_dir, name + '.pdf') for name in names
+                     if not entries[name]['empty']], output)
+
+    return len(stale)
+
+
+def build_report(pages, output, num_cores=1, chunk_size=8, fmt='pdf', incremental=False):
+    """
+    Render the pages one after the other into a report.
+
+    Parameters
+    ----------
+    pages : iterable
+        The (plot function, arguments, page name) of each page, e.g. from
+        vc_usage_pages and buff_usage_pages. A plot function may return None
+        to skip its page.
+    output : str
+        A .pdf file for a multi-page report, otherwise a directory which gets
+        one file per page, named by the page name.
+    num_cores : int, optional
+        The number of rendering processes, by default 1 renders in this process
+    chunk_size : int, optional
+        The number of consecutive pages rendered by one worker task, by default 8
+    fmt : str, optional
+        The file format of the pages in a directory, by default 'pdf'
+    incremental : bool, optional
+        Render only the pages whose fingerprint changed since the last build.
+        The pages of a PDF report are kept in the directory '<output>.pages',
+        the pages of a directory report get the manifest '<output>.manifest.json'.
+        Unnamed pages are named by their position. By default False
+
+    Returns
+    -------
+    int
+        The number of written pages, for an incremental report the number of
+        rendered pages.
+    """
+    pages = ((page + (None,))[:3] for page in pages)
+    if incremental:
+        pages = [(plot_page, args, name if name is not None else 'page_{:04d}'.format(idx))
+                 for idx, (plot_page, args, name) in enumerate(pages)]
+        return _build_incremental(pages, output, num_cores, chunk_size, fmt)
+
+    if num_cores is None:
+        num_cores = multiprocessing.cpu_count()
+    if num_cores == 1:
+        with ReportWriter(output, fmt) as writer:
+            for plot_page, args, name in pages:
+                writer.add_page(plot_page, args, name)
+        return writer.pages
+
+    to_pdf = output.lower().endswith('.pdf')
+    tmp_dir = tempfile.mkdtemp(prefix='ratatoskr_report_') if to_pdf else None
+    if not to_pdf:
+        os.makedirs(output, exist_ok=True)
+
+    paths = []
+
+    def tasks():
+        for idx, chunk in enumerate(_chunks(pages, chunk_size)):
+            if to_pdf:
+                paths.append(os.path.join(tmp_dir, 'chunk_{:06d}.pdf'.format(idx)))
+                yield paths[-1], fmt, chunk
+            else:
+                # unnamed pages keep their global page number
+                yield output, fmt, [(plot_page, args, name if name is not None else
+                                     'page_{:04d}'.format(idx * chunk_size + pos))
+                                    for pos, (plot_page, args, name) in enumerate(chunk)]
+
+    try:
+        with multiprocessing.Pool(num_cores, _init_worker) as pool:
+            written = sum(pool.imap(_render_chunk, tasks()))
+        if to_pdf:
+            # a chunk without any figure leaves no file behind
+            merge_pdfs([path for path in paths if os.path.exists(path)], output)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return written
@@ -1 +1,7 @@
 from .createedit import *
+from .analytics import PerformanceModel, suggest_inj_rates, prune_saturated
+from .validate import validate_configuration, check_configuration
+from .topology import Topology, load_topology
+from .task_graph import TaskGraph, write_data_file, write_map_file, write_task_files
+from .mapping import optimize_mapping, write_optimized_map
+from .netrace import read_netrace_index, group_regions, write_region_configs
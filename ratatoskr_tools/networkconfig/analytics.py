@@ -0,0 +1,372 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# First-order analytical model of the NoC described by a config.ini file.
+# All source/destination pairs are routed at once with numpy, so the model
+# is cheap enough to be evaluated before every simulation sweep.
+###############################################################################
+import numpy as np
+
+###############################################################################
+
+
+def _grid_coordinates(config):
+    """
+    Calculate the grid coordinates of all routers.
+
+    Parameters
+    ----------
+    config : ratatoskr_tools.networkconfig.configure.Configuration
+        configuration object.
+
+    Returns
+    -------
+    tuple
+        The x, y and z coordinate arrays (ordered by router id) and the
+        grid size (X, Y, Z).
+    """
+    if config.topology == "ring":
+        assert config.z == 1 and config.y[0] == 1, \
+            "Ring topology, z and y[0] must be 1"
+    assert len(set(config.x)) == 1 and len(set(config.y)) == 1, \
+        "The analytical model supports only layers of equal size, x={} y={}". \
+        format(config.x, config.y)
+
+    size = (config.x[0], config.y[0], config.z)
+    ids = np.arange(np.prod(size))
+    xs = ids % size[0]
+    ys = (ids // size[0]) % size[1]
+    zs = ids // (size[0] * size[1])
+    return xs, ys, zs, size
+
+
+def _wrapped_dims(config):
+    """
+    Return which of the x, y and z dimensions have wrap-around links, which is
+    the same rule the NetworkWriter uses when writing the connections.
+    """
+    if config.topology == "torus":
+        return (True, True, config.z > 2)
+    if config.topology == "ring":
+        return (True, False, False)
+    return (False, False, False)
+
+
+def _route_dimension(src, dst, length, wrapped):
+    """
+    Calculate the direction and the number of steps of the route in one
+    dimension. Wrapped dimensions take the shorter way around, ties are
+    resolved into the positive direction.
+
+    Returns
+    -------
+    tuple
+        Boolean array of the positive direction and the array of steps.
+    """
+    diff = dst - src
+    if not wrapped:
+        return diff >= 0, np.abs(diff)
+
+    forward = diff % length
+    backward = (-diff) % length
+    positive = forward <= backward
+    return positive, np.where(positive, forward, backward)
+
+
+def _segment_loads(line, start, steps, positive, length, n_lines, weights):
+    """
+    Accumulate the load of the straight route segments of one dimension.
+
+    Each segment starts at `start` on the given `line` and traverses `steps`
+    links. A difference array of twice the line length absorbs the wrap-around
+    so that all segments are accumulated with a single np.add.at call.
+
+    Returns
+    -------
+    tuple
+        Loads of the links in positive and negative direction, both of shape
+        (n_lines, length). A link is indexed by its source router.
+    """
+    loads = []
+    for direction in (True, False):
+        mask = (positive == direction) & (steps > 0)
+        diff = np.zeros((n_lines, 2 * length + 1))
+        if direction:
+            begin = start[mask]
+        else:
+            # mirror the line to reuse the positive direction accumulation
+            begin = length - 1 - start[mask]
+        np.add.at(diff, (line[mask], begin), weights[mask])
+        np.add.at(diff, (line[mask], begin + steps[mask]), -weights[mask])
+        load = np.cumsum(diff, axis=1)
+        load = load[:, :length] + load[:, length:2*length]
+        if not direction:
+            load = load[:, ::-1]
+        loads.append(load)
+    return loads[0], loads[1]
+
+
+class PerformanceModel:
+    """
+    Zero-load latency and channel load model of the XYZ routed network.
+
+    The network is described by the given configuration. Packets are routed in
+    x first, then in y and then in z, wrapped dimensions (torus, ring) take the
+    shorter way around. The injection rate is measured in flits (or packets)
+    per cycle and processing element, every link transfers at most one flit
+    per cycle, the injection link of a processing element included.
+    """
+
+    def __init__(self, config, router_delay=1, rate_in_packets=False):
+        """
+        Route all source/destination pairs and calculate the model figures.
+
+        Parameters
+        ----------
+        config : ratatoskr_tools.networkconfig.configure.Configuration
+            configuration object.
+        router_delay : int, optional
+            The number of clock cycles a head flit spends in each router,
+            by default 1
+        rate_in_packets : bool, optional
+            The injection rates are given in packets instead of flits per cycle,
+            by default False
+        """
+        assert config.routing == "XYZ", \
+            "The analytical model supports only XYZ routing, routing={}". \
+            format(config.routing)
+
+        self.config = config
+        self.router_delay = router_delay
+        self.rate_in_packets = rate_in_packets
+
+        xs, ys, zs, self.size = _grid_coordinates(config)
+        self.router_num = len(xs)
+        wrapped = _wrapped_dims(config)
+
+        # all source/destination pairs, self traffic excluded
+        src, dst = np.nonzero(~np.eye(self.router_num, dtype=bool))
+        self.src = src
+        self.dst = dst
+
+        x_pos, x_steps = _route_dimension(xs[src], xs[dst], self.size[0], wrapped[0])
+        y_pos, y_steps = _route_dimension(ys[src], ys[dst], self.size[1], wrapped[1])
+        z_pos, z_steps = _route_dimension(zs[src], zs[dst], self.size[2], wrapped[2])
+        self.hops = x_steps + y_steps + z_steps
+        self._routes = ((x_pos, x_steps), (y_pos, y_steps), (z_pos, z_steps))
+        self._coords = (xs, ys, zs)
+
+        self.hop_counts = np.zeros((self.router_num, self.router_num), dtype=int)
+        self.hop_counts[src, dst] = self.hops
+
+        self.latencies = self._zero_load_latencies(zs, z_pos, z_steps, wrapped[2])
+
+        uniform = np.full(len(src), 1 / max(self.router_num - 1, 1))
+        self.channel_load = self.link_loads(uniform)
+
+    def _zero_load_latencies(self, zs, z_pos, z_steps, z_wrapped):
+        """
+        Calculate the zero-load latency of every pair in the unit of clockDelay.
+        The head flit passes all routers of the route, the remaining flits of the
+        packet follow with one flit per cycle of the destination layer.
+        """
+        clock_delay = np.array(self.config.clockDelay)
+        src_layer = zs[self.src]
+        dst_layer = zs[self.dst]
+
+        # routers in the source layer (x and y hops plus the source router)
+        latency = (self.hops - z_steps + 1) * clock_delay[src_layer]
+        # one router of each layer passed in z direction
+        direction = np.where(z_pos, 1, -1)
+        for step in range(1, self.size[2]):
+            layer = src_layer + direction * step
+            if z_wrapped:
+                layer = layer % self.size[2]
+            layer = np.clip(layer, 0, self.size[2] - 1)
+            latency = latency + np.where(z_steps >= step, clock_delay[layer], 0)
+
+        latency = latency * self.router_delay
+        serialization = (self.config.flitsPerPacket - 1) * clock_delay[dst_layer]
+        return latency + serialization
+
+    def link_loads(self, weights):
+        """
+        Calculate the load of every directed link for the given traffic.
+
+        Parameters
+        ----------
+        weights : np.ndarray
+            The traffic of each source/destination pair in flits per cycle,
+            either as a (#routers, #routers) matrix or ordered like the
+            `src` and `dst` attributes.
+
+        Returns
+        -------
+        dict
+            The link loads for each of the directions 'East', 'West', 'North',
+            'South', 'Up' and 'Down', each of shape (z, y, x) and indexed by
+            the source router of the link.
+        """
+        weights = np.asarray(weights, dtype=float)
+        if weights.ndim == 2:
+            weights = weights[self.src, self.dst]
+
+        X, Y, Z = self.size
+        xs, ys, zs = self._coords
+        (x_pos, x_steps), (y_pos, y_steps), (z_pos, z_steps) = self._routes
+        xs_src, ys_src, zs_src = xs[self.src], ys[self.src], zs[self.src]
+        xs_dst, ys_dst = xs[self.dst], ys[self.dst]
+
+        # x first: along the row of the source router
+        line = zs_src * Y + ys_src
+        east, west = _segment_loads(line, xs_src, x_steps, x_pos, X, Z*Y, weights)
+        # then y: along the column of the destination, still in the source layer
+        line = zs_src * X + xs_dst
+        north, south = _segment_loads(line, ys_src, y_steps, y_pos, Y, Z*X, weights)
+        # then z: along the pillar of the destination
+        line = ys_dst * X + xs_dst
+        up, down = _segment_loads(line, zs_src, z_steps, z_pos, Z, Y*X, weights)
+
+        return {
+            'East': east.reshape(Z, Y, X), 'West': west.reshape(Z, Y, X),
+            'North': north.reshape(Z, X, Y).transpose(0, 2, 1),
+            'South': south.reshape(Z, X, Y).transpose(0, 2, 1),
+            'Up': up.reshape(Y, X, Z).transpose(2, 0, 1),
+            'Down': down.reshape(Y, X, Z).transpose(2, 0, 1),
+        }
+
+    def hop_histogram(self):
+        """
+        Return the distribution of the hop count under uniform random traffic.
+
+        Returns
+        -------
+        tuple
+            The hop counts and the fraction of the pairs with this hop count.
+        """
+        counts = np.bincount(self.hops)
+        hops = np.nonzero(counts)[0]
+        return hops, counts[hops] / len(self.hops)
+
+    @property
+    def average_hops(self):
+        """ The average hop count under uniform random traffic """
+        return float(np.mean(self.hops))
+
+    @property
+    def zero_load_latency(self):
+        """ The average zero-load packet latency in the unit of clockDelay """
+        return float(np.mean(self.latencies))
+
+    @property
+    def max_channel_load(self):
+        """ The load of the busiest link at an injection rate of one flit per cycle """
+        return max(float(np.max(load)) for load in self.channel_load.values())
+
+    @property
+    def injection_capacity(self):
+        """ The highest injection rate, one flit per cycle on the injection link """
+        if self.rate_in_packets:
+            return 1 / self.config.flitsPerPacket
+        return 1.
+
+    @property
+    def saturation_rate(self):
+        """
+        The injection rate at which the busiest link is fully utilized,
+        at most the injection_capacity
+        """
+        if self.max_channel_load == 0:
+            return self.injection_capacity
+        return min(self.injection_capacity / self.max_channel_load, self.injection_capacity)
+
+
+def suggest_inj_rates(config, low=0.1, high=1.1, num_rates=None, model=None):
+    """
+    Set runRateMin and runRateMax of the configuration around the saturation
+    injection rate predicted by the PerformanceModel.
+
+    The rates are in the unit of the model, flits per cycle and processing
+    element unless it was created with rate_in_packets. The saturation rate
+    never exceeds the capacity of the injection link, one flit per cycle.
+
+    Parameters
+    ----------
+    config : ratatoskr_tools.networkconfig.configure.Configuration
+        configuration object, which is updated in place.
+    low : float, optional
+        runRateMin as a fraction of the saturation rate, by default 0.1
+    high : float, optional
+        runRateMax as a fraction of the saturation rate, at most the
+        injection_capacity of the model, by default 1.1
+    num_rates : int, optional
+        If given, runRateStep is set to sweep this number of injection rates,
+        by default None keeps the configured runRateStep
+    model : PerformanceModel, optional
+        An already evaluated model of the configuration, by default None
+
+    Returns
+    -------
+    tuple
+        The new runRateMin, runRateMax and runRateStep.
+    """
+    assert 0 <= low < high, "Invalid bounds low={} high={}".format(low, high)
+
+    if model is None:
+        model = PerformanceModel(config)
+    saturation = model.saturation_rate
+
+    config.runRateMin = round(low * saturation, 4)
+    config.runRateMax = round(min(high * saturation, model.injection_capacity), 4)
+    if num_rates is not None:
+        config.runRateStep = round(
+            (config.runRateMax - config.runRateMin) / num_rates, 4)
+
+    return config.runRateMin, config.runRateMax, config.runRateStep
+
+
+def prune_saturated(inj_rates, config, margin=1.0, model=None):
+    """
+    Remove the injection rates which are beyond the predicted saturation rate,
+    in the unit of the model.
+
+    Parameters
+    ----------
+    inj_rates : list(float)
+        The injection rates of the sweep.
+    config : ratatoskr_tools.networkconfig.configure.Configuration
+        configuration object.
+    margin : float, optional
+        Keep the injection rates up to margin times the saturation rate,
+        by default 1.0
+    model : PerformanceModel, optional
+        An already evaluated model of the configuration, by default None
+
+    Returns
+    -------
+    np.ndarray
+        The injection rates that are worth simulating.
+    """
+    if model is None:
+        model = PerformanceModel(config)
+    inj_rates = np.asarray(inj_rates)
+    return inj_rates[inj_rates <= margin * model.saturation_rate]
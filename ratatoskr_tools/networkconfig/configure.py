@@ -26,6 +26,9 @@ import os
 
 ###############################################################################
 
+# The captures of the simulator output by ratatoskr_tools.simulation.run_single_sim
+LOG_MODES = ('file', 'tail', 'discard')
+
 
 class Configuration:
     """ The main configuration """
@@ -42,6 +45,9 @@ class Configuration:
         self.bitWidth = int(config['Config']['bitWidth'])
         self.benchmark = config['Config']['benchmark']
         self.libDir = config['Config']['libDir']
+        # optional: the verbosity of the simulator and the capture of its log
+        self.outputProfile = config['Config'].get('outputProfile', 'full')
+        self.logMode = config['Config'].get('logMode', 'file')
 
         self.simDir = config['Synthetic']['simDir']
         self.basedir = os.getcwd()
@@ -1,8 +1,12 @@
+import copy
 import os
 import shutil
 import xml.etree.ElementTree as ET
 
+import numpy as np
+
 from . import configure
+from . import task_graph as tasks
 from . import xml_writers as writers
 
 
@@ -20,9 +24,11 @@ def create_config_ini(dst_path="./config.ini"):
     shutil.copyfile(src_path, dst_path)
 
 
-def create_configuration(config_file='config.ini', config_xml='config.xml', network_xml='network.xml'):
+def create_configuration(config_file='config.ini', config_xml='config.xml', network_xml='network.xml',
+                         task_graph=None, mapping=None, data_xml='data.xml', map_xml='map.xml'):
     """
     Create the config.xml and network.xml files for the simulator from the given config.ini file.
+    For the task benchmark, the data.xml and map.xml files of the given task graph are created too.
 
     Parameters
     ----------
@@ -32,6 +38,17 @@ def create_configuration(config_file='config.ini', config_xml='config.xml', netw
         Output configuration xml file for the simulator, by default 'config.xml'
     network_xml : str, optional
         Output network xml file for the simulator, by default 'network.xml'
+    task_graph : ratatoskr_tools.networkconfig.task_graph.TaskGraph, optional
+        The application of the task benchmark, required if benchmark = task,
+        by default None
+    mapping : array_like, optional
+        The router index of each task, by default the tasks are distributed
+        round-robin over the routers. The tasks are bound to the processing
+        elements of these routers, see write_task_files
+    data_xml : str, optional
+        Output data xml file for the task benchmark, by default 'data.xml'
+    map_xml : str, optional
+        Output map xml file for the task benchmark, by default 'map.xml'
 
     Returns
     -------
@@ -46,6 +63,14 @@ def create_configuration(config_file='config.ini', config_xml='config.xml', netw
     writer = writers.NetworkWriter(config)
     writer.write_network(network_xml)
 
+    if config.benchmark == 'task':
+        assert task_graph is not None, "benchmark = task requires a task_graph"
+        router_num = sum([x*y for x, y in zip(config.x, config.y)])
+        if mapping is None:
+            mapping = np.arange(task_graph.num_tasks) % router_num
+        # the processing element of router r is the node r + router_num
+        tasks.write_task_files(task_graph, mapping, data_xml, map_xml, node_offset=router_num)
+
     return config
 
 
@@ -70,14 +95,20 @@ def edit_config_file(config, src_config_xml, dst_config_xml, inj_rate):
     except Exception:
         raise
 
-    configTree.find('noc/nocFile').text = 'config/' + \
+    configTree.find('noc/nocFile').text = config.libDir + '/' + \
         config.topologyFile + '.xml'
     configTree.find('general/simulationTime').set('value',
                                                   str(config.simulationTime))
     configTree.find('general/outputToFile').set('value', 'true')
     configTree.find('general/outputToFile').text = 'report'
 
-    for elem in list(configTree.find('application/synthetic').iter()):
+    # the task benchmark has no synthetic phases to edit
+    synthetic = configTree.find('application/synthetic')
+    if synthetic is None:
+        configTree.write(dst_config_xml)
+        return
+
+    for elem in list(synthetic.iter()):
         if elem.get('name') == 'warmup':
             elem.find('start').set('min', str(config.warmupStart))
             elem.find('start').set('max', str(config.warmupStart))
@@ -95,3 +126,83 @@ def edit_config_file(config, src_config_xml, dst_config_xml, inj_rate):
                 config.runStart + config.runDuration))
             elem.find('injectionRate').set('value', str(inj_rate))
     configTree.write(dst_config_xml)
+
+
+def write_phased_config(config, src_config_xml, dst_config_xml, inj_rates, window=None,
+                        settle=None):
+    """
+    Write a config.xml which runs several injection rates one after the other
+    in a single simulation: one warmup phase followed by one run phase per
+    injection rate. Each run phase starts with a settle time, the packets
+    injected in the rest of the phase form its measurement window.
+    The packet events of the processing elements are enabled whatever the
+    outputProfile, split the logged packets by the windows with
+    ratatoskr_tools.datahandle.retrieve_phase_latencies. The simulations need
+    the logMode 'file'.
+
+    Parameters
+    ----------
+    config : ratatoskr_tools.networkconfig.configure.Configuration
+        configuration object.
+    src_config_xml : str
+        the source of the configuration file.
+    dst_config_xml : str
+        the destination of the config file.
+    inj_rates : list(float)
+        the injection rates of the run phases, in the order of the simulation.
+    window : int, optional
+        the length of each measurement window, by default runDuration divided
+        by the number of rates
+    settle : int, optional
+        the time between the start of a phase and its measurement window,
+        by default a tenth of the window but at least runStartAfterWarmup
+
+    Returns
+    -------
+    list(tuple)
+        The injection rate, start and end of the measurement window of each phase.
+    """
+    assert len(inj_rates) > 0, "No injection rates"
+    if window is None:
+        window = config.runDuration // len(inj_rates)
+    if settle is None:
+        settle = max(config.runStartAfterWarmup, window // 10)
+    assert window > 0 and settle >= 0, "Invalid window={} or settle={}".format(window, settle)
+
+    # the warmup phase and the run template with the first rate
+    edit_config_file(config, src_config_xml, dst_config_xml, inj_rates[0])
+    configTree = ET.parse(dst_config_xml)
+    synthetic = configTree.find('application/synthetic')
+    assert synthetic is not None, "Phased runs need the synthetic benchmark"
+    template = [phase for phase in synthetic if phase.get('name') == 'run']
+    assert template, "{} has no run phase".format(src_config_xml)
+    template = template[0]
+    position = list(synthetic).index(template)
+    synthetic.remove(template)
+
+    windows = []
+    start = config.runStart
+    for idx, inj_rate in enumerate(inj_rates):
+        end = start + settle + window
+        phase = copy.deepcopy(template)
+        phase.set('name', 'run_{}'.format(idx))
+        phase.find('start').set('min', str(start))
+        phase.find('start').set('max', str(start))
+        # like edit_config_file, the duration holds the end time of the phase
+        phase.find('duration').set('min', str(end))
+        phase.find('duration').set('max', str(end))
+        phase.find('injectionRate').set('value', str(inj_rate))
+        synthetic.insert(position + idx, phase)
+        windows.append((float(inj_rate), start + settle, end))
+        start = end
+
+    # the packet events split the phases, whatever the outputProfile
+    for event in ('send_head_flit', 'receive_tail_flit'):
+        elem = configTree.find('verbose/processingElements/' + event)
+        assert elem is not None, "{} has no {} verbose event".format(src_config_xml, event)
+        elem.set('value', 'true')
+
+    simulation_time = configTree.find('general/simulationTime')
+    simulation_time.set('value', str(max(config.simulationTime, start)))
+    configTree.write(dst_config_xml)
+    return windows
@@ -0,0 +1,327 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# Traffic-aware mapping of the tasks of a TaskGraph to the routers.
+# A simulated annealing engine evaluates a whole batch of task swaps per step
+# with numpy and accepts a conflict-free subset of them.
+###############################################################################
+import numpy as np
+
+from .analytics import PerformanceModel
+from .task_graph import write_map_file
+
+###############################################################################
+
+
+class _Adjacency:
+    """ The undirected, coalesced task communication graph in CSR form """
+
+    def __init__(self, task_graph):
+        num_tasks = task_graph.num_tasks
+        src = np.concatenate([task_graph.src, task_graph.dst])
+        dst = np.concatenate([task_graph.dst, task_graph.src])
+        weights = np.concatenate([task_graph.counts, task_graph.counts]).astype(float)
+        mask = src != dst
+
+        keys, inverse = np.unique(src[mask] * num_tasks + dst[mask], return_inverse=True)
+        self.keys = keys
+        # bincount returns integers for empty weights
+        self.weights = np.bincount(inverse, weights[mask], minlength=len(keys)).astype(float)
+        self.neighbors = keys % num_tasks
+        self.indptr = np.searchsorted(keys // num_tasks, np.arange(num_tasks + 1))
+        self.num_tasks = num_tasks
+
+    def pair_weights(self, a, b):
+        """ The summed weight of the edges between the tasks a and b """
+        keys = a * self.num_tasks + b
+        if not len(self.keys):
+            return np.zeros(len(keys))
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[pos] == keys, self.weights[pos], 0.)
+
+    def place_costs(self, tasks, routers, task_router, hops):
+        """
+        The hop-weighted traffic of each task if it was placed at the given
+        router, while all its neighbors stay at their current router.
+        Dummy tasks (-1) cost nothing.
+        """
+        valid = tasks >= 0
+        starts = np.where(valid, self.indptr[np.maximum(tasks, 0)], 0)
+        lens = np.where(valid, self.indptr[np.maximum(tasks, 0) + 1] - starts, 0)
+        seg = np.repeat(np.arange(len(tasks)), lens)
+        offsets = np.cumsum(lens) - lens
+        pos = np.arange(lens.sum()) - np.repeat(offsets, lens) + np.repeat(starts, lens)
+        values = self.weights[pos] * \
+            hops[np.repeat(routers, lens), task_router[self.neighbors[pos]]]
+        return np.bincount(seg, values, minlength=len(tasks)).astype(float)
+
+
+def hop_cost(task_graph, mapping, hops):
+    """
+    Calculate the hop-weighted traffic volume of a mapping.
+
+    Parameters
+    ----------
+    task_graph : ratatoskr_tools.networkconfig.task_graph.TaskGraph
+        The task graph.
+    mapping : np.ndarray
+        The router index of each task.
+    hops : np.ndarray
+        The hop count between each pair of routers.
+
+    Returns
+    -------
+    float
+        The sum of packets times hops over all edges.
+    """
+    mapping = np.asarray(mapping)
+    return float(np.sum(task_graph.counts *
+                        hops[mapping[task_graph.src], mapping[task_graph.dst]]))
+
+
+def max_link_cost(task_graph, mapping, model):
+    """
+    Calculate the load of the busiest link of a mapping.
+
+    Parameters
+    ----------
+    task_graph : ratatoskr_tools.networkconfig.task_graph.TaskGraph
+        The task graph.
+    mapping : np.ndarray
+        The router index of each task.
+    model : ratatoskr_tools.networkconfig.analytics.PerformanceModel
+        The model of the network.
+
+    Returns
+    -------
+    float
+        The number of packets crossing the busiest link.
+    """
+    mapping = np.asarray(mapping)
+    traffic = np.zeros((model.router_num, model.router_num))
+    np.add.at(traffic, (mapping[task_graph.src], mapping[task_graph.dst]),
+              task_graph.counts)
+    np.fill_diagonal(traffic, 0)
+    return max(float(np.max(load)) for load in model.link_loads(traffic).values())
+
+
+def _anneal_hops(adjacency, slot_task, capacity, hops, iterations, batch_size, rng):
+    """ Minimize the hop-weighted traffic by batched simulated annealing """
+    num_slots = len(slot_task)
+    task_router = np.zeros(adjacency.num_tasks, dtype=int)
+    valid = slot_task >= 0
+    task_router[slot_task[valid]] = np.nonzero(valid)[0] // capacity
+    if not len(adjacency.keys):
+        # no edges between different tasks, every mapping costs nothing
+        return task_router, 0.
+
+    def swap_deltas(s1, s2):
+        a, b = slot_task[s1], slot_task[s2]
+        ra, rb = s1 // capacity, s2 // capacity
+        delta = adjacency.place_costs(a, rb, task_router, hops) - \
+            adjacency.place_costs(a, ra, task_router, hops) + \
+            adjacency.place_costs(b, ra, task_router, hops) - \
+            adjacency.place_costs(b, rb, task_router, hops)
+        # the edges between a and b keep their length
+        both = (a >= 0) & (b >= 0)
+        delta[both] += 2 * adjacency.pair_weights(a[both], b[both]) * hops[ra, rb][both]
+        return delta
+
+    def propose():
+        s1 = rng.integers(num_slots, size=batch_size)
+        s2 = rng.integers(num_slots, size=batch_size)
+        keep = (s1 // capacity != s2 // capacity) & \
+            ((slot_task[s1] >= 0) | (slot_task[s2] >= 0))
+        return s1[keep], s2[keep]
+
+    s1, s2 = propose()
+    deltas = np.abs(swap_deltas(s1, s2))
+    temperature = max(float(np.mean(deltas[deltas > 0])) if np.any(deltas > 0) else 1., 1e-9)
+    cooling = (1e-3) ** (1 / max(iterations, 1))
+
+    cost = 0.5 * float(np.sum(adjacency.place_costs(
+        np.arange(adjacency.num_tasks), task_router, task_router, hops)))
+    best_cost, best_router = cost, task_router.copy()
+
+    for _ in range(iterations):
+        s1, s2 = propose()
+        if not len(s1):
+            continue
+        delta = swap_deltas(s1, s2)
+        accept = (delta <= 0) | (rng.random(len(delta)) < np.exp(-np.maximum(delta, 0) / temperature))
+
+        # accept only swaps whose slots are not used by an earlier swap of the batch
+        s1, s2 = s1[accept], s2[accept]
+        slots = np.stack([s1, s2], axis=1).ravel()
+        _, first = np.unique(slots, return_index=True)
+        used = np.zeros(len(slots), dtype=bool)
+        used[first] = True
+        ok = used.reshape(-1, 2).all(axis=1)
+        s1, s2 = s1[ok], s2[ok]
+
+        slot_task[s1], slot_task[s2] = slot_task[s2], slot_task[s1].copy()
+        valid = slot_task >= 0
+        task_router[slot_task[valid]] = np.nonzero(valid)[0] // capacity
+
+        cost = 0.5 * float(np.sum(adjacency.place_costs(
+            np.arange(adjacency.num_tasks), task_router, task_router, hops)))
+        if cost < best_cost:
+            best_cost, best_router = cost, task_router.copy()
+        temperature *= cooling
+
+    return best_router, best_cost
+
+
+def _anneal_max_link(task_graph, task_router, capacity, model, iterations, rng):
+    """ Minimize the load of the busiest link by single-swap simulated annealing """
+    num_slots = model.router_num * capacity
+    slot_task = np.full(num_slots, -1)
+    fill = np.zeros(model.router_num, dtype=int)
+    for t_id, router in enumerate(task_router):
+        slot_task[router * capacity + fill[router]] = t_id
+        fill[router] += 1
+
+    cost = max_link_cost(task_graph, task_router, model)
+    temperature = max(cost * 0.05, 1e-9)
+    cooling = (1e-3) ** (1 / max(iterations, 1))
+    best_cost, best_router = cost, task_router.copy()
+
+    for _ in range(iterations):
+        s1, s2 = rng.integers(num_slots, size=2)
+        a, b = slot_task[s1], slot_task[s2]
+        if s1 // capacity == s2 // capacity or (a < 0 and b < 0):
+            continue
+        candidate = task_router.copy()
+        if a >= 0:
+            candidate[a] = s2 // capacity
+        if b >= 0:
+            candidate[b] = s1 // capacity
+        new_cost = max_link_cost(task_graph, candidate, model)
+        if new_cost <= cost or rng.random() < np.exp((cost - new_cost) / temperature):
+            slot_task[s1], slot_task[s2] = b, a
+            task_router, cost = candidate, new_cost
+            if cost < best_cost:
+                best_cost, best_router = cost, task_router.copy()
+        temperature *= cooling
+
+    return best_router, best_cost
+
+
+def optimize_mapping(task_graph, config, objective='hops', initial=None,
+                     iterations=2000, batch_size=256, capacity=None, seed=None):
+    """
+    Search a task to router mapping which keeps heavy communication local.
+
+    Parameters
+    ----------
+    task_graph : ratatoskr_tools.networkconfig.task_graph.TaskGraph
+        The task graph.
+    config : ratatoskr_tools.networkconfig.configure.Configuration
+        configuration object of the network.
+    objective : str, optional
+        'hops' minimizes the hop-weighted traffic volume, 'max_link' further
+        minimizes the load of the busiest link, by default 'hops'
+    initial : array_like, optional
+        The router index of each task to start from, by default round-robin
+    iterations : int, optional
+        The number of annealing steps, by default 2000
+    batch_size : int, optional
+        The number of swaps evaluated per step of the 'hops' search,
+        by default 256
+    capacity : int, optional
+        The maximum number of tasks per router, by default the tasks are
+        spread as evenly as possible
+    seed : int, optional
+        Seed of the random number generator, by default None
+
+    Returns
+    -------
+    tuple
+        The router index of each task and the cost of the mapping.
+    """
+    assert objective in ('hops', 'max_link'), \
+        "Unknown objective '{}'".format(objective)
+
+    rng = np.random.default_rng(seed)
+    model = PerformanceModel(config)
+    router_num = model.router_num
+    num_tasks = task_graph.num_tasks
+
+    if capacity is None:
+        capacity = -(-num_tasks // router_num)
+    assert capacity * router_num >= num_tasks, \
+        "{} tasks do not fit on {} routers with capacity {}".format(
+            num_tasks, router_num, capacity)
+
+    if initial is None:
+        initial = np.arange(num_tasks) % router_num
+    initial = np.asarray(initial, dtype=int)
+    assert np.all(np.bincount(initial, minlength=router_num) <= capacity), \
+        "The initial mapping exceeds the capacity of {} tasks per router".format(capacity)
+
+    # every router offers `capacity` slots, unused slots hold the dummy task -1
+    slot_task = np.full(router_num * capacity, -1)
+    fill = np.zeros(router_num, dtype=int)
+    for t_id, router in enumerate(initial):
+        slot_task[router * capacity + fill[router]] = t_id
+        fill[router] += 1
+
+    adjacency = _Adjacency(task_graph)
+    mapping, cost = _anneal_hops(adjacency, slot_task, capacity, model.hop_counts,
+                                 iterations, batch_size, rng)
+
+    if objective == 'max_link':
+        mapping, cost = _anneal_max_link(task_graph, mapping, capacity, model,
+                                         iterations, rng)
+
+    return mapping, cost
+
+
+def write_optimized_map(task_graph, config, map_xml='map.xml', node_offset=None, **kwargs):
+    """
+    Optimize the mapping of the task graph and write it to the map.xml file.
+
+    Parameters
+    ----------
+    task_graph : ratatoskr_tools.networkconfig.task_graph.TaskGraph
+        The task graph.
+    config : ratatoskr_tools.networkconfig.configure.Configuration
+        configuration object of the network.
+    map_xml : str, optional
+        Output map xml file for the simulator, by default 'map.xml'
+    node_offset : int, optional
+        Added to the router indices to get the node ids of map.xml, by default
+        the number of routers binds the tasks to the processing elements, see
+        write_task_files
+    **kwargs
+        Passed to optimize_mapping.
+
+    Returns
+    -------
+    np.ndarray
+        The router index of each task.
+    """
+    mapping, _ = optimize_mapping(task_graph, config, **kwargs)
+    if node_offset is None:
+        node_offset = sum(x*y for x, y in zip(config.x, config.y))
+    write_map_file(np.arange(task_graph.num_tasks), mapping + node_offset, map_xml)
+    return mapping
@@ -0,0 +1,241 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# The regions of a netrace trace file (.tra.bz2) and one config.xml per group
+# of consecutive regions, so the regions of a trace are simulated in parallel.
+#
+# The trace starts with the header of netrace.h (64-bit layout):
+#   magic, version, benchmark name, nodes, cycles, packets,
+#   notes length, number of regions, two pointers, padding
+# followed by the notes and the region table of (seek offset, cycles, packets).
+# Only this beginning of the bz2 stream is decompressed. The index is cached
+# in a .regions.json file next to the trace, keyed by its size and
+# modification time.
+###############################################################################
+import bz2
+import json
+import math
+import os
+import struct
+import xml.etree.ElementTree as ET
+
+from . import createedit
+
+###############################################################################
+
+NETRACE_MAGIC = 0x484A5455
+INDEX_VERSION = 1
+
+_HEADER = struct.Struct('<If30sBxQQII')
+_POINTERS = 16
+# some writers leave out the padding of 8 x uint64 of netrace 1.0
+_PADDINGS = (64, 0)
+_REGION = struct.Struct('<QQQ')
+
+
+def _read_exact(f, size):
+    data = f.read(size)
+    assert len(data) == size, "Unexpected end of the netrace header"
+    return data
+
+
+def _parse_header(path):
+    with bz2.open(path, 'rb') as f:
+        head = _read_exact(f, _HEADER.size + _POINTERS + max(_PADDINGS))
+        magic, version, name, num_nodes, num_cycles, num_packets, notes_length, \
+            num_regions = _HEADER.unpack_from(head)
+        assert magic == NETRACE_MAGIC, \
+            "{} is no netrace file, magic 0x{:08X}".format(path, magic)
+        # enough of the stream for the notes and the region table of both layouts
+        head += _read_exact(f, notes_length + num_regions * _REGION.size)
+
+    for padding in _PADDINGS:
+        offset = _HEADER.size + _POINTERS + padding
+        notes = head[offset:offset + notes_length]
+        offset += notes_length
+        regions = [_REGION.unpack_from(head, offset + idx * _REGION.size)
+                   for idx in range(num_regions)]
+        # the layout whose regions add up to the packets of the header
+        if sum(region[2] for region in regions) == num_packets:
+            break
+    else:
+        raise AssertionError("The region table of {} does not match its header".format(path))
+
+    return {
+        'version': round(float(version), 3),
+        'benchmark': name.split(b'\0', 1)[0].decode(errors='replace'),
+        'num_nodes': num_nodes,
+        'num_cycles': num_cycles,
+        'num_packets': num_packets,
+        'notes': notes.split(b'\0', 1)[0].decode(errors='replace'),
+        'regions': [{'seek_offset': seek, 'num_cycles': cycles, 'num_packets': packets}
+                    for seek, cycles, packets in regions],
+    }
+
+
+def read_netrace_index(trace, use_cache=True):
+    """
+    Read the header and the regions of a netrace trace file.
+
+    Parameters
+    ----------
+    trace : str
+        Path of the .tra.bz2 file.
+    use_cache : bool, optional
+        Read and write the index cache '<trace>.regions.json', by default True
+
+    Returns
+    -------
+    dict
+        The 'benchmark', 'num_nodes', 'num_cycles', 'num_packets', 'notes' and
+        the 'regions' with their 'seek_offset', 'num_cycles' and 'num_packets'.
+    """
+    stat = os.stat(trace)
+    key = {'index_version': INDEX_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    cache_file = trace + '.regions.json'
+    if use_cache:
+        try:
+            with open(cache_file) as f:
+                cache = json.load(f)
+            if cache['key'] == key:
+                return cache['index']
+        except (OSError, KeyError, ValueError):
+            pass
+
+    index = _parse_header(trace)
+    if use_cache:
+        try:
+            tmp_file = cache_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                json.dump({'key': key, 'index': index}, f)
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            pass  # e.g. a read-only trace directory
+    return index
+
+
+def group_regions(regions, num_groups):
+    """
+    Split the regions into consecutive groups with a balanced number of cycles,
+    the longest group is as short as possible.
+
+    Parameters
+    ----------
+    regions : list(dict)
+        The regions of read_netrace_index.
+    num_groups : int
+        The maximum number of groups.
+
+    Returns
+    -------
+    list(list(int))
+        The region indices of each group.
+    """
+    cycles = [max(int(region['num_cycles']), 1) for region in regions]
+    num_groups = max(1, min(num_groups, len(cycles)))
+
+    def split(limit):
+        groups = [[]]
+        load = 0
+        for idx, cycle in enumerate(cycles):
+            if groups[-1] and load + cycle > limit:
+                groups.append([])
+                load = 0
+            groups[-1].append(idx)
+            load += cycle
+        return groups
+
+    # binary search of the smallest feasible load of the longest group
+    low, high = max(cycles), sum(cycles)
+    while low < high:
+        mid = (low + high) // 2
+        if len(split(mid)) <= num_groups:
+            high = mid
+        else:
+            low = mid + 1
+    return split(low)
+
+
+def write_region_configs(config, src_config_xml, trace, dst_dir, num_groups=None,
+                         cycle_time=None, drain=0.1, index=None):
+    """
+    Write one config.xml per group of consecutive regions of a netrace trace.
+    Each simulation starts at the first region of its group with
+    netraceStartRegion and runs for the cycles of the group plus a drain time.
+
+    Parameters
+    ----------
+    config : ratatoskr_tools.networkconfig.configure.Configuration
+        configuration object.
+    src_config_xml : str
+        the source of the configuration file.
+    trace : str
+        Path of the .tra.bz2 file, as seen by the simulator.
+    dst_dir : str
+        The directory of the config files, each group gets the subdirectory
+        'region_<first region>'.
+    num_groups : int, optional
+        The number of parallel simulations, by default numCores of config.ini
+    cycle_time : float, optional
+        The simulation time of one trace cycle, by default clockDelay of the
+        first layer
+    drain : float, optional
+        The additional share of the simulation time to deliver the last
+        packets of a group, by default 0.1
+    index : dict, optional
+        The index of read_netrace_index, by default it is read
+
+    Returns
+    -------
+    list(dict)
+        Per group: the 'config_xml', the 'regions', 'num_cycles' and
+        'num_packets' of the group and its 'directory'.
+    """
+    if index is None:
+        index = read_netrace_index(trace)
+    if num_groups is None:
+        num_groups = config.numCores
+    if cycle_time is None:
+        cycle_time = config.clockDelay[0]
+    regions = index['regions']
+    assert regions, "{} has no regions".format(trace)
+
+    groups = []
+    for members in group_regions(regions, num_groups):
+        num_cycles = sum(regions[idx]['num_cycles'] for idx in members)
+        directory = os.path.join(dst_dir, 'region_{}'.format(members[0]))
+        os.makedirs(directory, exist_ok=True)
+        config_xml = os.path.join(directory, 'config.xml')
+        createedit.edit_config_file(config, src_config_xml, config_xml, config.runRateMin)
+
+        configTree = ET.parse(config_xml)
+        configTree.find('application/benchmark').text = 'netrace'
+        configTree.find('application/netraceFile').text = trace
+        configTree.find('application/netraceStartRegion').set('value', str(members[0]))
+        simulation_time = int(math.ceil(num_cycles * cycle_time * (1 + drain)))
+        configTree.find('general/simulationTime').set('value', str(simulation_time))
+        configTree.write(config_xml)
+
+        groups.append({'config_xml': config_xml, 'directory': directory, 'regions': members,
+                       'num_cycles': num_cycles,
+                       'num_packets': sum(regions[idx]['num_packets'] for idx in members)})
+    return groups
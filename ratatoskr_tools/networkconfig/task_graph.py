@@ -0,0 +1,282 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# Bulk generation of the data.xml and map.xml files of the task benchmark.
+# The task graph is kept in numpy arrays and the files are streamed to disk
+# in the same layout as DataWriter and MapWriter produce, without building
+# an ElementTree of the whole application.
+###############################################################################
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+
+###############################################################################
+
+XML_HEADER = '<?xml version="1.0" ?>\n'
+XSI = 'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+
+
+def _broadcast(value, length, width=None):
+    """ Broadcast a scalar, a (min, max) pair or per-item values to all items """
+    shape = (length,) if width is None else (length, width)
+    return np.broadcast_to(np.asarray(value, dtype=int), shape).copy()
+
+
+class TaskGraph:
+    """
+    A task graph of the task benchmark in array form.
+
+    Every edge sends `counts` packets of the data type `types` from task `src`
+    to task `dst`, one packet each `intervals` clock cycles. The destination
+    task requires the same number of packets from its source.
+    """
+
+    def __init__(self, num_tasks, src, dst, data_types=('data',), types=0,
+                 counts=1, intervals=1, delays=(0, 0), start=(0, 0),
+                 duration=(-1, -1), repeat=(1, 1)):
+        """
+        Parameters
+        ----------
+        num_tasks : int
+            The number of tasks, the task ids are 0 ... num_tasks-1.
+        src : array_like
+            The source task of each edge.
+        dst : array_like
+            The destination task of each edge.
+        data_types : list(str), optional
+            The names of the data types, by default ('data',)
+        types : int or array_like, optional
+            The data type index of each edge, by default 0
+        counts : int or array_like, optional
+            The number of packets of each edge, by default 1
+        intervals : int or array_like, optional
+            The interval in clock cycles between the packets, by default 1
+        delays : tuple or array_like, optional
+            The minimum and maximum delay before the first packet is sent,
+            by default (0, 0)
+        start : tuple or array_like, optional
+            The minimum and maximum start time of each task, by default (0, 0)
+        duration : tuple or array_like, optional
+            The minimum and maximum duration of each task, by default (-1, -1)
+        repeat : tuple or array_like, optional
+            The minimum and maximum repeat of each task, by default (1, 1)
+        """
+        self.num_tasks = int(num_tasks)
+        self.src = np.asarray(src, dtype=int)
+        self.dst = np.asarray(dst, dtype=int)
+        assert self.src.shape == self.dst.shape and self.src.ndim == 1, \
+            "src and dst need to be 1D arrays of the same length"
+        num_edges = len(self.src)
+        if num_edges:
+            assert self.src.min() >= 0 and self.dst.min() >= 0 and \
+                max(self.src.max(), self.dst.max()) < self.num_tasks, \
+                "The edges refer to tasks outside of 0 ... {}".format(
+                    self.num_tasks - 1)
+
+        self.data_types = list(data_types)
+        self.types = _broadcast(types, num_edges)
+        assert np.all(self.types < len(self.data_types)), \
+            "The edges refer to unknown data types"
+        self.counts = _broadcast(counts, num_edges)
+        self.intervals = _broadcast(intervals, num_edges)
+        self.delays = _broadcast(delays, num_edges, 2)
+
+        self.start = _broadcast(start, self.num_tasks, 2)
+        self.duration = _broadcast(duration, self.num_tasks, 2)
+        self.repeat = _broadcast(repeat, self.num_tasks, 2)
+
+    def traffic_matrix(self):
+        """
+        Return the number of packets sent between each pair of tasks.
+
+        Returns
+        -------
+        np.ndarray
+            Packets from task i to task j, shape (num_tasks, num_tasks).
+        """
+        traffic = np.zeros((self.num_tasks, self.num_tasks))
+        np.add.at(traffic, (self.src, self.dst), self.counts)
+        return traffic
+
+
+def _group(keys, num_groups):
+    """ Sort the edges by the key and return the order and the group bounds """
+    order = np.argsort(keys, kind='stable')
+    bounds = np.searchsorted(keys[order], np.arange(num_groups + 1))
+    return order, bounds
+
+
+def write_data_file(task_graph, output_file, chunk_size=1000):
+    """
+    Stream the data.xml file of the task graph to disk.
+
+    Parameters
+    ----------
+    task_graph : TaskGraph
+        The task graph.
+    output_file : str
+        The path of the data.xml file.
+    chunk_size : int, optional
+        The number of tasks written at once, by default 1000
+    """
+    tg = task_graph
+    out_order, out_bounds = _group(tg.src, tg.num_tasks)
+    in_order, in_bounds = _group(tg.dst, tg.num_tasks)
+    out_bounds = out_bounds.tolist()
+    in_bounds = in_bounds.tolist()
+
+    with open(output_file, 'w') as f:
+        f.write(XML_HEADER)
+        f.write('<data {}>\n'.format(XSI))
+        f.write('  <dataTypes>\n')
+        for idx, name in enumerate(tg.data_types):
+            f.write('    <dataType id="{}">\n      <name value={}/>\n'
+                    '    </dataType>\n'.format(idx, quoteattr(str(name))))
+        f.write('  </dataTypes>\n')
+        f.write('  <tasks>\n')
+
+        for first in range(0, tg.num_tasks, chunk_size):
+            last = min(first + chunk_size, tg.num_tasks)
+            # only the edges of the tasks of this chunk are formatted at once
+            out_edges = out_order[out_bounds[first]:out_bounds[last]]
+            in_edges = in_order[in_bounds[first]:in_bounds[last]]
+            destinations = [
+                '            <destination id="{{}}">\n'
+                '              <delay min="{}" max="{}"/>\n'
+                '              <interval min="{}" max="{}"/>\n'
+                '              <count min="{}" max="{}"/>\n'
+                '              <type value="{}"/>\n'
+                '              <task value="{}"/>\n'
+                '            </destination>\n'.format(d0, d1, i, i, c, c, t, dst)
+                for (d0, d1), i, c, t, dst in zip(
+                    tg.delays[out_edges].tolist(), tg.intervals[out_edges].tolist(),
+                    tg.counts[out_edges].tolist(), tg.types[out_edges].tolist(),
+                    tg.dst[out_edges].tolist())]
+            requirements = [
+                '        <requirement id="{{}}">\n'
+                '          <type value="{}"/>\n'
+                '          <source value="{}"/>\n'
+                '          <count min="{}" max="{}"/>\n'
+                '        </requirement>\n'.format(t, src, c, c)
+                for t, src, c in zip(
+                    tg.types[in_edges].tolist(), tg.src[in_edges].tolist(),
+                    tg.counts[in_edges].tolist())]
+
+            lines = []
+            for t_id in range(first, last):
+                lines.append(
+                    '    <task id="{}">\n'
+                    '      <start min="{}" max="{}"/>\n'
+                    '      <duration min="{}" max="{}"/>\n'
+                    '      <repeat min="{}" max="{}"/>\n'.format(
+                        t_id, *tg.start[t_id].tolist(), *tg.duration[t_id].tolist(),
+                        *tg.repeat[t_id].tolist()))
+
+                lo = in_bounds[t_id] - in_bounds[first]
+                hi = in_bounds[t_id + 1] - in_bounds[first]
+                if hi > lo:
+                    lines.append('      <requires>\n')
+                    lines.extend(requirements[e].format(idx)
+                                 for idx, e in enumerate(range(lo, hi)))
+                    lines.append('      </requires>\n')
+
+                lo = out_bounds[t_id] - out_bounds[first]
+                hi = out_bounds[t_id + 1] - out_bounds[first]
+                if hi > lo:
+                    lines.append('      <generates>\n'
+                                 '        <possibility id="0">\n'
+                                 '          <probability value="1"/>\n'
+                                 '          <destinations>\n')
+                    lines.extend(destinations[e].format(idx)
+                                 for idx, e in enumerate(range(lo, hi)))
+                    lines.append('          </destinations>\n'
+                                 '        </possibility>\n'
+                                 '      </generates>\n')
+                lines.append('    </task>\n')
+            f.write(''.join(lines))
+
+        f.write('  </tasks>\n')
+        f.write('</data>\n')
+
+
+def write_map_file(tasks, nodes, output_file, chunk_size=10000):
+    """
+    Stream the map.xml file which binds the tasks to their nodes.
+
+    Parameters
+    ----------
+    tasks : array_like
+        The task ids.
+    nodes : array_like
+        The node id of each task.
+    output_file : str
+        The path of the map.xml file.
+    chunk_size : int, optional
+        The number of bindings written at once, by default 10000
+    """
+    tasks = np.asarray(tasks, dtype=int).tolist()
+    nodes = np.asarray(nodes, dtype=int).tolist()
+    assert len(tasks) == len(nodes), "Every task needs exactly one node"
+
+    with open(output_file, 'w') as f:
+        f.write(XML_HEADER)
+        f.write('<map {}>\n'.format(XSI))
+        for chunk_start in range(0, len(tasks), chunk_size):
+            chunk = zip(tasks[chunk_start:chunk_start + chunk_size],
+                        nodes[chunk_start:chunk_start + chunk_size])
+            f.write(''.join(
+                '  <bind>\n    <task value="{}"/>\n    <node value="{}"/>\n'
+                '  </bind>\n'.format(t_id, n_id) for t_id, n_id in chunk))
+        f.write('</map>\n')
+
+
+def write_task_files(task_graph, mapping, data_xml='data.xml', map_xml='map.xml',
+                     node_offset=0):
+    """
+    Write the data.xml and map.xml files of the task benchmark.
+
+    The map.xml file binds each task to a node id of the network.xml file. Of
+    R routers, the routers are the nodes 0..R-1 and the processing element of
+    router r is the node R + r. The tasks run on the processing elements, so a
+    mapping of router indices needs node_offset=R, as create_configuration
+    and write_optimized_map do.
+
+    Parameters
+    ----------
+    task_graph : TaskGraph
+        The task graph.
+    mapping : array_like
+        The router index of each task, or its node id if node_offset is 0.
+    data_xml : str, optional
+        Output data xml file for the simulator, by default 'data.xml'
+    map_xml : str, optional
+        Output map xml file for the simulator, by default 'map.xml'
+    node_offset : int, optional
+        Added to the mapping to get the node ids, by default 0
+    """
+    mapping = np.asarray(mapping, dtype=int)
+    assert len(mapping) == task_graph.num_tasks, \
+        "The mapping needs one node for each of the {} tasks".format(
+            task_graph.num_tasks)
+
+    write_data_file(task_graph, data_xml)
+    write_map_file(np.arange(task_graph.num_tasks), mapping + node_offset, map_xml)
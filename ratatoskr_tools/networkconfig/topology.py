@@ -0,0 +1,202 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# The network.xml file is parsed once into numpy arrays, which are cached in
+# an .npz file next to it. The cache is keyed by the size, the modification
+# time and the hash of the network.xml file.
+###############################################################################
+import hashlib
+import os
+import tempfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+###############################################################################
+
+CACHE_VERSION = 1
+
+
+def _file_hash(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class Topology:
+    """
+    The nodes and connections of a network.xml file as numpy arrays.
+
+    All node arrays are ordered by the node id.
+
+    Attributes
+    ----------
+    node_ids : np.ndarray
+        The sorted node ids.
+    coords : np.ndarray
+        The (x, y, z) positions of the nodes, shape (#nodes, 3).
+    layers : np.ndarray
+        The layer of each node.
+    node_types : np.ndarray
+        The nodeType id of each node.
+    is_router : np.ndarray
+        True for the routers, False for the processing elements.
+    edges : np.ndarray
+        The node ids of both ports of each connection, shape (#connections, 2).
+    invalid_cons : np.ndarray
+        The indices of the connections which have not exactly two ports.
+    """
+
+    FIELDS = ('node_ids', 'coords', 'layers', 'node_types', 'is_router',
+              'edges', 'invalid_cons')
+
+    def __init__(self, **arrays):
+        for field in self.FIELDS:
+            setattr(self, field, arrays[field])
+
+    @classmethod
+    def from_xml(cls, network_xml):
+        """ Parse the network.xml file """
+        root = ET.parse(network_xml).getroot()
+
+        router_types = set()
+        for nodeType in root.find('nodeTypes').iter('nodeType'):
+            if nodeType.find('model').get('value') != 'ProcessingElement':
+                router_types.add(int(nodeType.get('id')))
+
+        node_ids, coords, layers, node_types = [], [], [], []
+        for node in root.find('nodes').iter('node'):
+            values = {child.tag: child.get('value') for child in node}
+            node_ids.append(int(node.get('id')))
+            coords.append((float(values['xPos']), float(values['yPos']),
+                           float(values['zPos'])))
+            layers.append(int(values['layer']))
+            node_types.append(int(values['nodeType']))
+
+        edges, invalid_cons = [], []
+        for idx, con in enumerate(root.find('connections').iter('con')):
+            ports = [int(port.find('node').get('value')) for port in con.iter('port')]
+            if len(ports) == 2:
+                edges.append(ports)
+            else:
+                invalid_cons.append(idx)
+
+        node_ids = np.array(node_ids, dtype=int)
+        order = np.argsort(node_ids, kind='stable')
+        node_types = np.array(node_types, dtype=int)[order]
+        return cls(node_ids=node_ids[order],
+                   coords=np.array(coords, dtype=float).reshape(-1, 3)[order],
+                   layers=np.array(layers, dtype=int)[order],
+                   node_types=node_types,
+                   is_router=np.isin(node_types, list(router_types)),
+                   edges=np.array(edges, dtype=int).reshape(-1, 2),
+                   invalid_cons=np.array(invalid_cons, dtype=int))
+
+    @property
+    def router_num(self):
+        """ The number of routers """
+        return int(np.sum(self.is_router))
+
+    @property
+    def router_coords(self):
+        """ The positions of the routers """
+        return self.coords[self.is_router]
+
+    @property
+    def router_layers(self):
+        """ The router id to layer map """
+        return self.layers[self.is_router]
+
+    @property
+    def router_edges(self):
+        """ The connections between two routers """
+        mask = self.is_router[self.edges].all(axis=1)
+        return self.edges[mask]
+
+
+def cache_path(network_xml):
+    """ The path of the .npz cache of the network.xml file """
+    return network_xml + '.npz'
+
+
+def load_topology(network_xml, use_cache=True):
+    """
+    Load the network.xml file as Topology, from the .npz cache if it is up to date.
+
+    Parameters
+    ----------
+    network_xml : str
+        Path of network.xml file
+    use_cache : bool, optional
+        Read and write the .npz cache next to the network.xml file,
+        by default True
+
+    Returns
+    -------
+    Topology
+        The arrays of the network.
+    """
+    if not use_cache:
+        return Topology.from_xml(network_xml)
+
+    stat = os.stat(network_xml)
+    cache_file = cache_path(network_xml)
+    file_hash = None
+    topology = None
+
+    try:
+        with np.load(cache_file) as cache:
+            if int(cache['version']) == CACHE_VERSION and \
+                    int(cache['size']) == stat.st_size:
+                if int(cache['mtime_ns']) == stat.st_mtime_ns:
+                    return Topology(**{f: cache[f] for f in Topology.FIELDS})
+                # touched, but the content may be unchanged
+                file_hash = _file_hash(network_xml)
+                if str(cache['hash']) == file_hash:
+                    topology = Topology(**{f: cache[f] for f in Topology.FIELDS})
+    except Exception:
+        # a missing, truncated or corrupt cache (e.g. zipfile.BadZipFile) is rebuilt
+        pass
+
+    if topology is None:
+        topology = Topology.from_xml(network_xml)
+    if file_hash is None:
+        file_hash = _file_hash(network_xml)
+
+    arrays = {f: getattr(topology, f) for f in Topology.FIELDS}
+    tmp_file = None
+    try:
+        # a unique temporary file, parallel workers may write the same cache
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(cache_file) or '.',
+                                         suffix='.tmp', delete=False) as f:
+            tmp_file = f.name
+            np.savez(f, version=CACHE_VERSION, size=stat.st_size,
+                     mtime_ns=stat.st_mtime_ns, hash=file_hash, **arrays)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        # a read-only directory only disables the cache
+        if tmp_file is not None and os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+    return topology
@@ -0,0 +1,295 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# Pre-flight checks of the generated config.xml and network.xml files, so a
+# broken configuration is reported before any simulator process is launched.
+###############################################################################
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from .configure import LOG_MODES
+from .topology import load_topology
+from .xml_writers import OUTPUT_PROFILES
+
+###############################################################################
+
+
+def check_network(topology, port_num=None):
+    """
+    Check the topology graph of the network.
+
+    Parameters
+    ----------
+    topology : ratatoskr_tools.networkconfig.topology.Topology
+        The network arrays as read from the network.xml file.
+    port_num : int, optional
+        The maximum number of ports of a router, by default None does not
+        check the port count.
+
+    Returns
+    -------
+    list(str)
+        The found errors, empty if the network is valid.
+    """
+    errors = []
+    is_router = topology.is_router
+    layers = topology.layers
+    edges = topology.edges
+    node_num = len(topology.node_ids)
+
+    if len(topology.invalid_cons):
+        errors.append("Connections without exactly two ports: {}".format(
+            topology.invalid_cons.tolist()))
+
+    # the simulator addresses the nodes by their index
+    if not np.array_equal(topology.node_ids, np.arange(node_num)):
+        errors.append("Node ids are not unique and contiguous from 0 to {}".format(
+            node_num - 1))
+        return errors
+
+    router_ids = np.nonzero(is_router)[0]
+    pe_ids = np.nonzero(~is_router)[0]
+    router_num = len(router_ids)
+    if len(pe_ids) != router_num:
+        errors.append("#Routers = {} does not match #ProcessingElements = {}".format(
+            router_num, len(pe_ids)))
+    if not np.array_equal(router_ids, np.arange(router_num)):
+        errors.append("Router ids do not precede the processing element ids")
+        return errors
+
+    unknown = (edges < 0) | (edges >= node_num)
+    if np.any(unknown):
+        errors.append("Connections to unknown nodes: {}".format(
+            np.unique(edges[unknown]).tolist()))
+        return errors
+
+    if np.any(edges[:, 0] == edges[:, 1]):
+        errors.append("Connections of a node to itself: {}".format(
+            np.unique(edges[edges[:, 0] == edges[:, 1], 0]).tolist()))
+
+    pairs = np.sort(edges, axis=1)
+    unique_pairs, counts = np.unique(pairs, axis=0, return_counts=True)
+    if np.any(counts > 1):
+        errors.append("Duplicate connections: {}".format(
+            unique_pairs[counts > 1].tolist()))
+
+    # each processing element is bound to the router with the same idType,
+    # that is router id + #routers
+    pe_edges = ~is_router[edges[:, 0]] | ~is_router[edges[:, 1]]
+    pe_pairs = pairs[pe_edges]
+    if np.any(~is_router[pe_pairs[:, 0]]):
+        errors.append("Processing elements connected to each other: {}".format(
+            pe_pairs[~is_router[pe_pairs[:, 0]]].tolist()))
+    pe_degree = np.bincount(pe_pairs[:, 1], minlength=node_num)[pe_ids]
+    if np.any(pe_degree != 1):
+        errors.append("Processing elements not connected to exactly one router: {}".format(
+            pe_ids[pe_degree != 1].tolist()))
+    if np.any(pe_pairs[:, 1] != pe_pairs[:, 0] + router_num):
+        errors.append("Processing elements bound to the wrong router: {}".format(
+            pe_pairs[pe_pairs[:, 1] != pe_pairs[:, 0] + router_num].tolist()))
+
+    if port_num is not None:
+        degree = np.bincount(edges.ravel(), minlength=node_num)[router_ids]
+        if np.any(degree > port_num):
+            errors.append("Routers with more than portNum = {} ports: {}".format(
+                port_num, router_ids[degree > port_num].tolist()))
+
+    # connectivity of the routers, for the whole network and per layer,
+    # scipy is only imported here to keep the import of the package light
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
+
+    router_edges = edges[~pe_edges]
+    graph = coo_matrix((np.ones(len(router_edges)),
+                        (router_edges[:, 0], router_edges[:, 1])),
+                       shape=(router_num, router_num))
+    n_components, _ = connected_components(graph, directed=False)
+    if router_num and n_components != 1:
+        errors.append("The network is split into {} disconnected parts".format(
+            n_components))
+
+    router_layers = layers[router_ids]
+    same_layer = router_layers[router_edges[:, 0]] == router_layers[router_edges[:, 1]]
+    for layer in np.unique(router_layers):
+        members = np.nonzero(router_layers == layer)[0]
+        local = np.full(router_num, -1)
+        local[members] = np.arange(len(members))
+        layer_edges = router_edges[same_layer &
+                                   (router_layers[router_edges[:, 0]] == layer)]
+        graph = coo_matrix((np.ones(len(layer_edges)),
+                            (local[layer_edges[:, 0]], local[layer_edges[:, 1]])),
+                           shape=(len(members), len(members)))
+        n_components, _ = connected_components(graph, directed=False)
+        if n_components != 1:
+            errors.append("Layer {} is split into {} disconnected parts".format(
+                layer, n_components))
+
+    return errors
+
+
+def check_config_xml(config_xml, router_num):
+    """
+    Check the simulation time, the synthetic phases and the reported routers
+    of the config.xml file.
+
+    Parameters
+    ----------
+    config_xml : str
+        Path of the config.xml file.
+    router_num : int
+        The number of routers of the network.
+
+    Returns
+    -------
+    list(str)
+        The found errors, empty if the configuration is valid.
+    """
+    errors = []
+    root = ET.parse(config_xml).getroot()
+
+    simulation_time = int(root.find('general/simulationTime').get('value'))
+    if simulation_time <= 0:
+        errors.append("simulationTime = {} is not positive".format(simulation_time))
+
+    synthetic = root.find('application/synthetic')
+    benchmark = root.find('application/benchmark')
+    if synthetic is not None and (benchmark is None or benchmark.text == 'synthetic'):
+        names = []
+        windows = []
+        for phase in synthetic.iter('phase'):
+            name = phase.get('name')
+            names.append(name)
+            start = [int(phase.find('start').get(b)) for b in ('min', 'max')]
+            end = [int(phase.find('duration').get(b)) for b in ('min', 'max')]
+            rate = float(phase.find('injectionRate').get('value'))
+            windows.append((start[0], end[1]))
+            if start[0] > start[1] or end[0] > end[1]:
+                errors.append("Phase '{}' has min larger than max".format(name))
+            if start[1] >= end[0]:
+                errors.append("Phase '{}' ends at {} before it starts at {}".format(
+                    name, end[0], start[1]))
+            if start[0] >= simulation_time:
+                errors.append("Phase '{}' starts at {} after simulationTime = {}".format(
+                    name, start[0], simulation_time))
+            if not 0 <= rate <= 1:
+                errors.append("Phase '{}' has injectionRate = {}".format(name, rate))
+        windows = np.array(windows, dtype=int).reshape(-1, 2)
+        if np.any(windows[1:, 0] < windows[:-1, 1]):
+            errors.append("Phases {} overlap".format(names))
+
+    report = root.find('report/bufferReportRouters')
+    if report is not None and report.text and report.text.strip():
+        routers = np.array(report.text.split(), dtype=int)
+        outside = (routers < 0) | (routers >= router_num)
+        if np.any(outside):
+            errors.append("bufferReportRouters outside of the network: {}".format(
+                routers[outside].tolist()))
+
+    return errors
+
+
+def check_config_ini(config):
+    """
+    Check the config.ini values which are not covered by the Configuration.
+
+    Parameters
+    ----------
+    config : ratatoskr_tools.networkconfig.configure.Configuration
+        configuration object.
+
+    Returns
+    -------
+    list(str)
+        The found errors, empty if the configuration is valid.
+    """
+    errors = []
+    if config.topology not in ('mesh', 'torus', 'ring'):
+        errors.append("Unknown topology '{}'".format(config.topology))
+
+    if config.topology == 'torus':
+        for itr, (x, y) in enumerate(zip(config.x, config.y)):
+            if x < 2 or y < 2:
+                errors.append("Torus layer {} needs x and y larger than 1, x={} y={}".format(
+                    itr, x, y))
+    elif config.topology == 'ring':
+        if config.z != 1 or config.y[0] != 1 or config.x[0] < 2:
+            errors.append("Ring topology needs z = 1, y = [1] and x > 1")
+
+    if config.runRateMin > config.runRateMax or config.runRateStep <= 0:
+        errors.append("Invalid injection rate sweep {}:{}:{}".format(
+            config.runRateMin, config.runRateMax, config.runRateStep))
+    if config.warmupStart + config.warmupDuration > config.runStart:
+        errors.append("The run phase starts before the warmup phase ends")
+    if config.outputProfile not in OUTPUT_PROFILES:
+        errors.append("Unknown outputProfile '{}', available: {}".format(
+            config.outputProfile, tuple(OUTPUT_PROFILES)))
+    if config.logMode not in LOG_MODES:
+        errors.append("Unknown logMode '{}', available: {}".format(config.logMode, LOG_MODES))
+
+    return errors
+
+
+def validate_configuration(config_xml, network_xml, config=None, port_num=7,
+                           use_cache=True):
+    """
+    Validate the generated config.xml and network.xml files.
+
+    Parameters
+    ----------
+    config_xml : str
+        Path of the config.xml file.
+    network_xml : str
+        Path of the network.xml file.
+    config : ratatoskr_tools.networkconfig.configure.Configuration, optional
+        The configuration the files are generated from. If given, its portNum
+        is used and its values are checked too, by default None
+    port_num : int, optional
+        The maximum number of ports of a router if no config is given,
+        by default 7
+    use_cache : bool, optional
+        Load the network from its .npz cache, by default True
+
+    Returns
+    -------
+    list(str)
+        The found errors, empty if the files are valid.
+    """
+    errors = []
+    if config is not None:
+        port_num = config.portNum
+        errors.extend(check_config_ini(config))
+
+    topology = load_topology(network_xml, use_cache)
+    errors.extend(check_network(topology, port_num))
+    errors.extend(check_config_xml(config_xml, topology.router_num))
+    return errors
+
+
+def check_configuration(config_xml, network_xml, config=None, port_num=7):
+    """
+    Same as validate_configuration, but fails with an AssertionError listing
+    all found errors.
+    """
+    errors = validate_configuration(config_xml, network_xml, config, port_num)
+    assert not errors, "Invalid configuration {}, {}:\n  - {}".format(
+        config_xml, network_xml, "\n  - ".join(errors))
@@ -27,6 +27,40 @@ import numpy as np
 
 ###############################################################################
 
+# The events which the simulator writes to stdout, per verbose group:
+#   full  - the per-flit and per-packet events of the original template
+#   stats - only the packet injection and ejection events, which are enough
+#           for packet latencies and per-phase statistics of the log
+#   lean  - no events, the results are the report files only
+_NODE_EVENTS = ('function_calls', 'send_flit', 'send_head_flit', 'receive_flit',
+                'receive_tail_flit', 'throttle', 'reset')
+_ROUTER_EVENTS = _NODE_EVENTS + ('assign_channel', 'buffer_overflow')
+_NETRACE_EVENTS = ('inject', 'eject', 'router_receive')
+_TASKS_EVENTS = ('function_calls', 'xml_parse', 'data_receive', 'data_send', 'source_execute')
+
+OUTPUT_PROFILES = {
+    'full': {
+        'processingElements': {'send_head_flit', 'receive_tail_flit'},
+        'router': {'send_head_flit', 'receive_tail_flit', 'buffer_overflow'},
+        'netrace': {'inject', 'eject', 'router_receive'},
+        'tasks': {'function_calls', 'data_receive', 'data_send'},
+    },
+    'stats': {
+        'processingElements': {'send_head_flit', 'receive_tail_flit'},
+        'router': set(),
+        'netrace': {'inject', 'eject'},
+        'tasks': {'data_receive', 'data_send'},
+    },
+    'lean': {
+        'processingElements': set(),
+        'router': set(),
+        'netrace': set(),
+        'tasks': set(),
+    },
+}
+
+###############################################################################
+
 
 class Writer:
     """ A base class for DataWriter, MapWriter and NetwrokWriter """
@@ -474,7 +508,7 @@ class NetworkWriter(Writer):
 
     def write_torus_connections(self):
         for itr, (x, y) in enumerate(zip(self.config.x, self.config.y)):
-            assert x and y, \
+            assert x > 1 and y > 1, \
                 "The value of y and x at layer {} should larger than 1 for Torus".format(
                     itr)
 
@@ -601,7 +635,7 @@ class ConfigWriter(Writer):
         noc_node = ET.SubElement(self.root_node, 'noc')
         nocFile_node = ET.SubElement(noc_node, 'nocFile')
         noc_topology = ET.SubElement(noc_node, 'topology')
-        nocFile_node.text = 'config/network.xml'
+        nocFile_node.text = self.config.libDir + '/network.xml'
         noc_topology.text = self.config.topology
         flitsPerPacket_node = ET.SubElement(noc_node, 'flitsPerPacket')
         flitsPerPacket_node.set('value', str(self.config.flitsPerPacket))
@@ -642,10 +676,11 @@ class ConfigWriter(Writer):
         self.write_phase(synthetic_node, 'run', [1100, 1100], [101100, 101100])
 
     def write_task(self, application_node):
+        # data.xml and map.xml are generated by task_graph.write_task_files
         dataFile_node = ET.SubElement(application_node, 'dataFile')
-        dataFile_node.text = 'config/data.xml'
+        dataFile_node.text = self.config.libDir + '/data.xml'
         mapFile_node = ET.SubElement(application_node, 'mapFile')
-        mapFile_node.text = 'config/map.xml'
+        mapFile_node.text = self.config.libDir + '/map.xml'
 
     def write_application(self):
         application_node = ET.SubElement(self.root_node, 'application')
@@ -655,10 +690,6 @@ class ConfigWriter(Writer):
             self.write_synthetic(application_node)
         elif self.config.benchmark == 'task':
             self.write_task(application_node)
-            # data_writer = DataWriter('data')
-            # data_writer.write_file('data.xml')
-            # map_writer = MapWriter('map')
-            # map_writer.write_file('map.xml')
         simulationFile_node = ET.SubElement(application_node, 'simulationFile')
         simulationFile_node.text = 'traffic/pipelinePerformance_2D/PipelineResetTB.xml'
         mappingFile_node = ET.SubElement(application_node, 'mappingFile')
@@ -674,56 +705,28 @@ class ConfigWriter(Writer):
             application_node, 'numberOfTrafficTypes')
         numberOfTrafficTypes_node.set('value', '5')
 
-    def write_node_verbose(self, verbose_node, node_name):
-        node = ET.SubElement(verbose_node, node_name)
-        function_calls_node = ET.SubElement(node, 'function_calls')
-        function_calls_node.set('value', 'false')
-        send_flit_node = ET.SubElement(node, 'send_flit')
-        send_flit_node.set('value', 'false')
-        send_head_flit_node = ET.SubElement(node, 'send_head_flit')
-        receive_flit_node = ET.SubElement(node, 'receive_flit')
-        receive_flit_node.set('value', 'false')
-        receive_tail_flit_node = ET.SubElement(node, 'receive_tail_flit')
-        receive_tail_flit_node.set('value', 'true')
-        throttle_node = ET.SubElement(node, 'throttle')
-        throttle_node.set('value', 'false')
-        reset_node = ET.SubElement(node, 'reset')
-        reset_node.set('value', 'false')
-        if node_name == 'router':
-            assign_channel_node = ET.SubElement(node, 'assign_channel')
-            assign_channel_node.set('value', 'false')
-            buffer_overflow_node = ET.SubElement(node, 'buffer_overflow')
-            buffer_overflow_node.set('value', 'true')
-        send_head_flit_node.set('value', 'true')
-
-    def write_netrace_verbose(self, verbose_node):
-        netrace_node = ET.SubElement(verbose_node, 'netrace')
-        inject_node = ET.SubElement(netrace_node, 'inject')
-        inject_node.set('value', 'true')
-        eject_node = ET.SubElement(netrace_node, 'eject')
-        eject_node.set('value', 'true')
-        router_receive_node = ET.SubElement(netrace_node, 'router_receive')
-        router_receive_node.set('value', 'true')
-
-    def write_tasks_verbose(self, verbose_node):
-        tasks_node = ET.SubElement(verbose_node, 'tasks')
-        function_calls_node = ET.SubElement(tasks_node, 'function_calls')
-        function_calls_node.set('value', 'true')
-        xml_parse_node = ET.SubElement(tasks_node, 'xml_parse')
-        xml_parse_node.set('value', 'false')
-        data_receive_node = ET.SubElement(tasks_node, 'data_receive')
-        data_receive_node.set('value', 'true')
-        data_send_node = ET.SubElement(tasks_node, 'data_send')
-        data_send_node.set('value', 'true')
-        source_execute_node = ET.SubElement(tasks_node, 'source_execute')
-        source_execute_node.set('value', 'false')
-
-    def write_verbose(self):
+    def write_events(self, parent_node, group_name, events, enabled):
+        group_node = ET.SubElement(parent_node, group_name)
+        for event in events:
+            event_node = ET.SubElement(group_node, event)
+            event_node.set('value', 'true' if event in enabled else 'false')
+
+    def write_verbose(self, profile=None):
+        """
+        Write the verbose events of the output profile 'full', 'stats' or 'lean',
+        by default the outputProfile of the config.ini file.
+        """
+        profile = profile if profile is not None else self.config.outputProfile
+        assert profile in OUTPUT_PROFILES, "Unknown output profile '{}', available: {}".format(
+            profile, tuple(OUTPUT_PROFILES))
+        enabled = OUTPUT_PROFILES[profile]
+
         verbose_node = ET.SubElement(self.root_node, 'verbose')
-        self.write_node_verbose(verbose_node, 'processingElements')
-        self.write_node_verbose(verbose_node, 'router')
-        self.write_netrace_verbose(verbose_node)
-        self.write_tasks_verbose(verbose_node)
+        self.write_events(verbose_node, 'processingElements', _NODE_EVENTS,
+                          enabled['processingElements'])
+        self.write_events(verbose_node, 'router', _ROUTER_EVENTS, enabled['router'])
+        self.write_events(verbose_node, 'netrace', _NETRACE_EVENTS, enabled['netrace'])
+        self.write_events(verbose_node, 'tasks', _TASKS_EVENTS, enabled['tasks'])
 
     def write_report(self):
         report_node = ET.SubElement(self.root_node, 'report')
@@ -1 +1,28 @@
-from .plot_network import plot_dynamic, plot_static
+# The plotting modules import matplotlib and zmq, they are loaded on first
+# access of one of their names (PEP 562).
+import importlib
+
+_LAZY = {
+    'NetworkPlot': 'plot_network', 'plot_dynamic': 'plot_network',
+    'plot_static': 'plot_network', 'replay_dynamic': 'plot_network',
+    'ReplayServer': 'recording', 'TelemetryRecorder': 'recording',
+    'TelemetryReplayer': 'recording',
+    'TelemetryReceiver': 'telemetry', 'TelemetryStream': 'telemetry',
+    'decode_data': 'telemetry', 'decode_message': 'telemetry',
+    'HeatScene': 'render', 'render_heat_animation': 'render',
+    'render_inj_rates': 'render', 'render_recording': 'render',
+}
+
+__all__ = sorted(_LAZY)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module('.' + _LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
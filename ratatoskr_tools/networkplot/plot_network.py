@@ -19,277 +19,411 @@
 # CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
-
-import configparser
-import json
-# This script generates simple topology files for mesh, torus and ring
 ###############################################################################
-import xml.etree.ElementTree as ET
+# Plot of the network topology, statically or with the live router heat of a
+# running simulation. A NetworkPlot owns its parsed network and its figure, so
+# any number of networks can be plotted in one process.
+###############################################################################
+import configparser
+import time as timer
 
 import matplotlib.pyplot as plt
 import numpy as np
-import zmq
-from mpl_toolkits.mplot3d import Axes3D
-from mpl_toolkits.mplot3d.art3d import Poly3DCollection
-
-###############################################################################
-# Global variables
-fig = None  # Figure Object
-ax = None  # Axes Object
-points = []  # List of the nodes/points
-excluded_points = []  # Those are processing elemnts
-connections = []  # List of the connection between the points
-num_of_layers = 0  # The number of layers in the mesh
-topology = None
-# Note: a face is not a layer, but the number of faces equals the number of layers.
-# A face consists of the corner points of the layer only.
-# That means each face consists of only four points.
-layers = []  # list of the layers
-faces = []  # List of the faces, for drawing reasons
-###############################################################################
+from mpl_toolkits.mplot3d import Axes3D  # noqa: F401, registers the 3d projection
+from mpl_toolkits.mplot3d.art3d import Line3DCollection, Poly3DCollection
 
+from ..networkconfig.topology import load_topology
+from .recording import ReplayServer, TelemetryRecorder
+from .telemetry import TelemetryReceiver
 
-###############################################################################
-# INIT
-###############################################################################
-def init_script(network_xml, config_file):
-    """
-    Initialize the script by reading the mesh information from the mesh xml file
-    """
-    try:
-        tree = ET.parse(network_xml)
-    except FileNotFoundError:
-        raise FileNotFoundError
-    else:
-        root = tree.getroot()
-
-        config = configparser.ConfigParser()
-        config.read(config_file)
-
-        # network topology for different plot
-        global topology
-        topology = config['Hardware']['topology']
-
-        # Number of layers
-        global num_of_layers
-        num_of_layers = int(config['Hardware']['z'])
-
-        # Find the id of the ProcessingElements
-        proc_elemnt_ids = []
-        for nodeType in root.find('nodeTypes').iter('nodeType'):
-            if nodeType.find('model').attrib['value'] == 'ProcessingElement':
-                proc_elemnt_ids.append(int(nodeType.attrib['id']))
-
-        # Points is a list of tuples
-        global points
-        for node in root.find('nodes').iter('node'):
-            # don't include processing element nodes
-            if int(node.find('nodeType').attrib['value']) not in proc_elemnt_ids:
-                x = float(node.find('xPos').attrib['value'])
-                y = float(node.find('yPos').attrib['value'])
-                z = float(node.find('zPos').attrib['value'])
-                layer = int(node.find('layer').attrib['value'])
-                points.append(([x, y, z], layer))
-            else:
-                global excluded_points
-                excluded_points.append(int(node.attrib['id']))
-
-        global connections
-        for con in root.find('connections').iter('con'):
-            valid_con = True
-            for port in con.find('ports').iter('port'):
-                if (int(port.find('node').attrib['value']) in excluded_points):
-                    valid_con = False
-                    break
-            if valid_con:
-                connection = []
-                connection.append(
-                    int(con.find('ports')[0].find('node').attrib['value']))
-                connection.append(
-                    int(con.find('ports')[1].find('node').attrib['value']))
-                connections.append(connection)
-
-
-def create_fig():
-    """
-    Create the figure object
-    """
-    global fig
-    fig = plt.figure()
-    global ax
-    ax = fig.gca(projection='3d')
-    ax = Axes3D(fig)
-    ax.set_xlabel('X')
-    ax.set_ylabel('Y')
-    ax.set_zlabel('Z')
+# Networks with more routers get only the id range of each layer annotated
+LABEL_LIMIT = 256
 
 
 ###############################################################################
-# PLOT CONNECTIONS
+# GEOMETRY
 ###############################################################################
-def generate_3D_half_ellipse(pt1, pt2, theta=np.pi/2, ratio=0.1, num=20):
+def half_ellipses(pts1, pts2, theta=np.pi/2, ratio=0.1, num=20):
     """
-    Calculate the curvature line of the given 2 points
-    """
-    assert len(pt1) == 3 and len(
-        pt2) == 3, "The given points are not in 3D dimension."
-
-    pt1 = np.array(pt1)
-    pt2 = np.array(pt2)
-
-    pt_mean = (pt1 + pt2) / 2
-    pt_diff = np.abs(pt1 - pt2)
+    Calculate the curvature lines of many pairs of points at once.
 
-    assert sum(pt_diff != 0) == 1, "Diagonal ellipse is not supported"
+    Parameters
+    ----------
+    pts1, pts2 : np.ndarray
+        The end points of the lines, shape (#lines, 3). Each pair may differ
+        in one dimension only.
 
+    Returns
+    -------
+    np.ndarray
+        The points of the lines, shape (#lines, num, 3).
+    """
+    pts1 = np.asarray(pts1, dtype=float).reshape(-1, 3)
+    pts2 = np.asarray(pts2, dtype=float).reshape(-1, 3)
+    pt_diff = np.abs(pts1 - pts2)
+    assert np.all(np.sum(pt_diff != 0, axis=1) == 1), "Diagonal ellipse is not supported"
+
+    axis = np.argmax(pt_diff != 0, axis=1)
+    # the bulge points along x, or along y for the lines in x direction
+    bulge = np.where(axis == 0, 1, 0)
+    half = pt_diff[np.arange(len(axis)), axis][:, None] / 2
     tdata = np.linspace(-theta, theta, num=num)
 
-    x, y, z = pt_mean
-    xlen, ylen, zlen = pt_diff / 2
+    lines = np.repeat(((pts1 + pts2) / 2)[:, None, :], num, axis=1)
+    rows = np.arange(len(axis))
+    lines[rows, :, axis] += half * np.sin(tdata)
+    lines[rows, :, bulge] += half * np.cos(tdata) * ratio
+    return lines
 
-    if (pt_diff[0] != 0):
-        xdata = x + xlen * np.sin(tdata)
-        ydata = y + xlen * np.cos(tdata) * ratio
-        zdata = z + np.zeros(tdata.shape)
-    elif (pt_diff[1] != 0):
-        ydata = y + ylen * np.sin(tdata)
-        xdata = x + ylen * np.cos(tdata) * ratio
-        zdata = z + np.zeros(tdata.shape)
-    elif (pt_diff[2] != 0):
-        zdata = z + zlen * np.sin(tdata)
-        xdata = x + zlen * np.cos(tdata) * ratio
-        ydata = y + np.zeros(tdata.shape)
 
-    return xdata, ydata, zdata
+def opposite_borders(pts1, pts2):
+    """
+    Check which pairs of points, shape (#pairs, 3), are at opposite borders:
+    they differ in one dimension only, and by one.
+    """
+    pt_diff = np.abs(np.asarray(pts1) - np.asarray(pts2))
+    return (np.sum(pt_diff != 0, axis=1) == 1) & np.any(pt_diff == 1, axis=1)
 
 
-def vertical_horizontal_connection(p1, p2):
+def generate_3D_half_ellipse(pt1, pt2, theta=np.pi/2, ratio=0.1, num=20):
     """
-    Draws the vertical and horizontal connection of the points
+    Calculate the curvature line of the given 2 points, see half_ellipses
     """
-    assert len(p1) == 3 and len(p2) == 3
-    line = np.array([p1, p2]).T.tolist()
-    ax.plot(*line, color='black')
+    assert len(pt1) == 3 and len(
+        pt2) == 3, "The given points are not in 3D dimension."
+    line = half_ellipses(pt1, pt2, theta, ratio, num)[0]
+    return line[:, 0], line[:, 1], line[:, 2]
 
 
 def is_opposite_border(p1, p2):
     """
     Check the given 2 points (3D) are at the border of the cube and
-    one of their dimension exist at the same axis
+    one of their dimension exist at the same axis, see opposite_borders
     """
-    p1 = np.array(p1)
-    p2 = np.array(p2)
-    pt_diff = np.abs(p1 - p2)
-    return (np.sum(pt_diff != 0) == 1) and (1 in pt_diff)
+    return bool(opposite_borders([p1], [p2])[0])
 
 
-def plot_connections():
+class BlitManager:
     """
-    Plot the connections between the nodes/points
+    Redraw only the given animated artists on top of a cached background.
+
+    The background (all static artists, e.g. the connections) is captured on
+    every full draw of the canvas, such as after a rotation of the 3D view.
+    Canvases without blitting support fall back to a full idle redraw.
     """
-    for p1_idx, p2_idx in connections:
-        p1 = points[p1_idx][0]
-        p2 = points[p2_idx][0]
 
-        if is_opposite_border(p1, p2) and topology in set(["torus", "ring"]):
-            pts_ellipse = generate_3D_half_ellipse(p1, p2)
-            ax.plot(*pts_ellipse, color='grey')
+    def __init__(self, canvas, animated_artists, blit=True):
+        self.canvas = canvas
+        self.blit = blit and getattr(canvas, 'supports_blit', False)
+        self._bg = None
+        self._artists = list(animated_artists)
+        if self.blit:
+            for artist in self._artists:
+                artist.set_animated(True)
+            self.cid = canvas.mpl_connect('draw_event', self.on_draw)
+
+    def on_draw(self, event):
+        """ Capture the background and draw the animated artists on top """
+        self._bg = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self._artists:
+            self.canvas.figure.draw_artist(artist)
+
+    def update(self):
+        """ Draw the current state of the animated artists """
+        if not self.blit:
+            self.canvas.draw_idle()
+        elif self._bg is None:
+            self.canvas.draw()
         else:
-            vertical_horizontal_connection(p1, p2)
+            self.canvas.restore_region(self._bg)
+            self._draw_animated()
+            self.canvas.blit(self.canvas.figure.bbox)
+        self.canvas.flush_events()
+
 
 ###############################################################################
-# PLOT NODES
+# NETWORK PLOT
 ###############################################################################
-
-
-def plot_nodes():
-    """
-    Plot the nodes in the figure
-    """
-    points_coordinates = np.array(
-        [*np.array(points, dtype=object)[:, 0]]).T.tolist()
-    ax.scatter(*points_coordinates, color='black', alpha=0.4, s=50)
-
-
-def annotate_points():
-    """
-    Annotating the points using their index
+class NetworkPlot:
     """
-    points_coordinates = np.array([*np.array(points, dtype=object)[:, 0]])
-    for idx, (x, y, z) in enumerate(points_coordinates):
-        ax.text(x, y, z, idx, size=10, color='red')
+    The routers and connections of a network and the figure they are drawn in.
 
+    The network is parsed once, the same object can draw the static network,
+    the router heat and the live view of a simulation. Processing elements are
+    not drawn.
 
-def colorize_nodes(color_values):
-    """
-    Annotating the points using their index
+    Attributes
+    ----------
+    coords : np.ndarray
+        The positions of the routers, shape (#routers, 3).
+    layers : np.ndarray
+        The layer of each router.
+    connections : np.ndarray
+        The router ids of the connections between routers, shape (#connections, 2).
+    excluded_points : np.ndarray
+        The node ids of the processing elements.
+    topology : str
+        The topology name of the config.ini file.
+    num_of_layers : int
+        The number of layers in the mesh.
+    fig, ax
+        The figure and the 3D axes, None before create_fig().
     """
-    points_coordinates = []
-    for p in points:
-        points_coordinates.append(p[0])
-    points_coordinates = np.array(points_coordinates)
-    xs = points_coordinates[:, 0]
-    ys = points_coordinates[:, 1]
-    zs = points_coordinates[:, 2]
-    global router_heat
-    router_heat = ax.scatter(xs, ys, zs, c=color_values,
-                             cmap='inferno', s=200)  # , marker=m)
 
+    def __init__(self, network_xml, config_file=None, topology=None):
+        """
+        Parameters
+        ----------
+        network_xml : str
+            Path of network.xml file, the network is loaded from the .npz cache
+            next to it.
+        config_file : str, optional
+            Path of config.ini file, by default None draws a mesh with the
+            layers of the network.xml file
+        topology : ratatoskr_tools.networkconfig.topology.Topology, optional
+            The already loaded network, by default None loads network_xml
+        """
+        topo = topology if topology is not None else load_topology(network_xml)
+
+        self.coords = topo.router_coords
+        self.layers = topo.router_layers
+        self.connections = topo.router_edges
+        self.excluded_points = topo.node_ids[~topo.is_router]
+
+        if config_file is not None:
+            config = configparser.ConfigParser()
+            config.read(config_file)
+            self.topology = config['Hardware']['topology']
+            self.num_of_layers = int(config['Hardware']['z'])
+        else:
+            self.topology = 'mesh'
+            self.num_of_layers = len(np.unique(self.layers))
+
+        self.fig = None
+        self.ax = None
+        self.router_heat = None
+
+    def __getstate__(self):
+        # the figure stays in the process which created it
+        state = self.__dict__.copy()
+        state.update(fig=None, ax=None, router_heat=None)
+        return state
+
+    @property
+    def wrapped(self):
+        """ Connections between opposite borders are drawn as half ellipses """
+        return self.topology in ("torus", "ring")
+
+    def create_fig(self, fig=None):
+        """
+        Create the 3D axes.
+
+        Parameters
+        ----------
+        fig : matplotlib.figure.Figure, optional
+            The figure to draw in, by default a new pyplot figure
+        """
+        self.fig = plt.figure() if fig is None else fig
+        self.ax = self.fig.add_subplot(projection='3d')
+        self.ax.set_xlabel('X')
+        self.ax.set_ylabel('Y')
+        self.ax.set_zlabel('Z')
+        return self.fig
+
+    def plot_connections(self):
+        """
+        Plot the connections between the routers as one line collection.
+        The wrap-around connections of torus and ring are drawn as grey half ellipses.
+        """
+        pts1 = self.coords[self.connections[:, 0]]
+        pts2 = self.coords[self.connections[:, 1]]
+        curved = opposite_borders(pts1, pts2) if self.wrapped \
+            else np.zeros(len(pts1), dtype=bool)
+
+        segments = list(np.stack([pts1[~curved], pts2[~curved]], axis=1))
+        segments.extend(half_ellipses(pts1[curved], pts2[curved]))
+        colors = ['black'] * int(np.sum(~curved)) + ['grey'] * int(np.sum(curved))
+        if not segments:
+            return None
+
+        had_data = self.ax.has_data()
+        lines = Line3DCollection(segments, colors=colors)
+        self.ax.add_collection3d(lines)
+        all_points = np.concatenate(segments)
+        self.ax.auto_scale_xyz(*all_points.T, had_data=had_data)
+        return lines
+
+    def plot_nodes(self):
+        """
+        Plot the routers in the figure
+        """
+        self.ax.scatter(*self.coords.T, color='black', alpha=0.4, s=50)
+
+    def annotate_points(self, max_labels=LABEL_LIMIT):
+        """
+        Annotating the routers using their index.
+        Above max_labels routers only the first and the last router of each
+        layer are labelled, which shows the id range of the layer.
+        """
+        if len(self.coords) <= max_labels:
+            indices = np.arange(len(self.coords))
+        else:
+            indices = np.unique(np.concatenate([
+                np.flatnonzero(self.layers == layer)[[0, -1]]
+                for layer in np.unique(self.layers)]))
+
+        for idx, (x, y, z) in zip(indices.tolist(), self.coords[indices].tolist()):
+            self.ax.text(x, y, z, idx, size=10, color='red')
+
+    def colorize_nodes(self, color_values, **kwargs):
+        """
+        Draw the routers colored by the given values
+        """
+        self.router_heat = self.ax.scatter(*self.coords.T, c=color_values,
+                                           cmap=kwargs.pop('cmap', 'inferno'),
+                                           s=kwargs.pop('s', 200), **kwargs)
+        return self.router_heat
+
+    def update_node_colors(self, color_values, autoscale=True):
+        """
+        Update the colors of the routers drawn by colorize_nodes in place,
+        autoscale=False keeps the range of the color map
+        """
+        self.router_heat.set_array(np.asarray(color_values, dtype=float))
+        if autoscale:
+            self.router_heat.autoscale()
+
+    def create_faces(self):
+        """
+        Create the faces of the mesh, each layer will become a face.
+        A face consists of the corner points of the layer only.
+        """
+        x_min, y_min = self.coords[:, :2].min(axis=0).tolist()
+        x_max, y_max = self.coords[:, :2].max(axis=0).tolist()
+        z_s = []
+        for layer in range(self.num_of_layers):
+            for z in self.coords[self.layers == layer, 2].tolist():
+                if z not in z_s:
+                    z_s.append(z)
+
+        return [[(x_min, y_min, z), (x_max, y_min, z), (x_max, y_max, z), (x_min, y_max, z)]
+                for z in z_s[:self.num_of_layers]]
+
+    def plot_faces(self):
+        """
+        Plot the faces with a random color for each layer
+        """
+        poly = Poly3DCollection(self.create_faces(), linewidths=1, alpha=0.1)
+        faces_colors = []
+        for itr in range(0, self.num_of_layers):
+            color = tuple(np.random.randint(0, 256, 3).tolist())
+            if color not in faces_colors:
+                faces_colors.append('#%02x%02x%02x' % color)
+        poly.set_facecolor(faces_colors)
+        self.ax.add_collection3d(poly)
+
+    def plot_static(self, output_file=None, plt_show=False):
+        """
+        Plot the static network.
+
+        Parameters
+        ----------
+        output_file : str, optional
+            The generated network plot is outputted to the given path, by default None
+        plt_show : bool, optional
+            The generated network plot is showed, by default False
+
+        Returns
+        -------
+        Figure
+            The generated network plot.
+        """
+        self.create_fig()
+        self.plot_nodes()
+        self.plot_connections()
+        self.annotate_points()
+        self.plot_faces()
+
+        if output_file is not None:
+            assert type(output_file) is str
+            self.fig.savefig(output_file)
+
+        if plt_show:
+            plt.show()
+
+        return self.fig
+
+    def plot_dynamic(self, host="localhost", port=5555, max_request=2000000, fps=30,
+                     blit=True, alpha=.01, smoothing='ema', window=100, record=None):
+        """
+        Plot the dynamic network which connect to the GUI server of the ratatoskr
+        simulator. See plot_dynamic() for the parameters.
+
+        Returns
+        -------
+        dict
+            The statistics of the received, rendered and dropped frames.
+        """
+        self.create_fig()
+        self.plot_connections()
+
+        self.colorize_nodes(range(len(self.coords)))
+        fig, ax = self.fig, self.ax
+
+        xlim = ax.get_xlim3d()
+        ylim = ax.get_ylim3d()
+        zlim = ax.get_zlim3d()
+
+        time_stamp = ax.text(xlim[0], ylim[-1], zlim[-1], "", size=12, color='red')
+
+        plt.show(block=False)
+        blit_manager = BlitManager(fig.canvas, [self.router_heat, time_stamp], blit)
+        plt.pause(.1)
+
+        print("Connecting to simulator server")
+        recorder = TelemetryRecorder(record) if record is not None else None
+        receiver = TelemetryReceiver(len(self.coords), host, port, max_request, alpha,
+                                     smoothing=smoothing, window=window, recorder=recorder)
+        receiver.start()
+
+        frame = None
+        try:
+            while receiver.is_alive() and plt.fignum_exists(fig.number):
+                frame_start = timer.monotonic()
+                snapshot = receiver.snapshot()
+                if snapshot is not None:
+                    frame = snapshot
+                    time, avg_router_load = frame
+                    self.update_node_colors(avg_router_load)
+                    time_stamp.set_text("Time: {} ns".format(time/1000))
+                    blit_manager.update()
+                else:
+                    fig.canvas.flush_events()
+                timer.sleep(max(0., 1/fps - (timer.monotonic() - frame_start)))
+        finally:
+            receiver.stop()
+            receiver.join()
+            if recorder is not None:
+                recorder.close()
+
+        stats = receiver.stats()
+        print("Received {received} frames ({receive_rate:.1f}/s), rendered {rendered}, "
+              "dropped {dropped}".format(**stats))
+
+        snapshot = receiver.snapshot()
+        if snapshot is not None:
+            frame = snapshot
+        for artist in (self.router_heat, time_stamp):
+            artist.set_animated(False)
+        if frame is not None:
+            self.update_node_colors(frame[1])
+            time_stamp.set_text("Time: {} ns".format(frame[0]/1000))
+        plt.show()
 
-###############################################################################
-# PLOT SURFACES
-###############################################################################
-def create_faces():
-    """
-    Create the faces of the mesh, each layer will become a face
-    """
-    # Make layers
-
-    # Seperate lists of x, y and z coordinates
-    x_s = []
-    y_s = []
-    z_s = []
-
-    for i in range(0, num_of_layers):
-        layer = []
-        for p in points:
-            if p[1] == i:
-                layer.append(p[0])
-                x_s.append(p[0][0])
-                y_s.append(p[0][1])
-                if (p[0][2] not in z_s):
-                    z_s.append(p[0][2])
-        layers.append(layer)
-
-    # Making faces, only out of the corner points of the layer
-    global faces
-    for i in range(0, min(len(z_s), num_of_layers)):
-        x_min = min(x_s)
-        x_max = max(x_s)
-        y_min = min(y_s)
-        y_max = max(y_s)
-        face = list([(x_min, y_min, z_s[i]), (x_max, y_min, z_s[i]),
-                     (x_max, y_max, z_s[i]), (x_min, y_max, z_s[i])])
-        faces.append(face)
-
-
-def plot_faces():
-    """
-    Plot the faces
-    """
-    # Create multiple 3D polygons out of the faces
-    poly = Poly3DCollection(faces, linewidths=1, alpha=0.1)
-    faces_colors = []
-    # Generating random color for each face
-    for itr in range(0, num_of_layers):
-        red = np.random.randint(0, 256)
-        green = np.random.randint(0, 256)
-        blue = np.random.randint(0, 256)
-        color = (red, green, blue)
-        if color not in faces_colors:
-            faces_colors.append('#%02x%02x%02x' % color)
-    poly.set_facecolor(faces_colors)
-    ax.add_collection3d(poly)
+        return stats
 
 
 ###############################################################################
@@ -316,28 +450,16 @@ def plot_static(network_xml, config_file, output_file=None, plt_show=False):
     Figure
         The generated network plot.
     """
+    return NetworkPlot(network_xml, config_file).plot_static(output_file, plt_show)
 
-    init_script(network_xml, config_file)
-    create_fig()
-    plot_nodes()
-    plot_connections()
-    annotate_points()
-    create_faces()
-    plot_faces()
-
-    if output_file is not None:
-        assert type(output_file) is str
-        plt.savefig(output_file)
-
-    if plt_show:
-        plt.show()
-
-    return fig
 
-
-def plot_dynamic(network_xml, config_file, host="localhost", port=5555, max_request=2000000):
+def plot_dynamic(network_xml, config_file, host="localhost", port=5555, max_request=2000000,
+                 fps=30, blit=True, alpha=.01, smoothing='ema', window=100, record=None):
     """
     Plot the dynamic network which connect to the GUI server of the ratatoskr simulator.
+    The messages are received by a background thread as fast as the server sends
+    them. The window only renders the latest state at the display rate, the
+    router heat and the time stamp are updated in place.
 
     Parameters
     ----------
@@ -351,49 +473,76 @@ def plot_dynamic(network_xml, config_file, host="localhost", port=5555, max_requ
         tcp port number, by default 5555
     max_request : int, optional
         maximum request count to the server, by default 2000000
-    """
-
-    init_script(network_xml, config_file)
-    create_fig()
-    plot_connections()
-
-    colorize_nodes(range(len(points)))
-
-    xlim = ax.get_xlim3d()
-    ylim = ax.get_ylim3d()
-    zlim = ax.get_zlim3d()
+    fps : int, optional
+        maximum redraw rate of the window, by default 30
+    blit : bool, optional
+        redraw only the router heat and the time stamp, by default True
+    alpha : float, optional
+        weight of the newest buffer usage in the averaged router load,
+        by default .01
+    smoothing : str, optional
+        The smoothing of the router load, 'ema', 'mean', 'max' or 'raw',
+        by default 'ema'
+    window : int, optional
+        The number of messages of the 'mean' and 'max' smoothing, by default 100
+    record : str, optional
+        Path of a file which records all received messages for a later replay,
+        by default None
 
-    time_stamp = ax.text(2, 2, 2, 0, size=12, color='red')
-    avg_router_load = [0] * len(points)
-
-    context = zmq.Context()
-
-    print("Connecting to simulator server")
-    socket = context.socket(zmq.REQ)
-    socket.connect("tcp://{}:{}".format(host, port))
-
-    for request in range(max_request):
-        socket.send_string("Cient request {}".format(request))
-        message = socket.recv()
-
-        data = json.loads(message)
-        time = float(data["Time"]["time"])
+    Returns
+    -------
+    dict
+        The statistics of the received, rendered and dropped frames.
+    """
 
-        for router_idx in range(len(points)):
-            current_router_val = float(
-                data["Data"][router_idx]["averagebufferusage"])
-            alpha = .01
-            avg_router_load[router_idx] = alpha * current_router_val + \
-                (1-alpha) * avg_router_load[router_idx]
+    return NetworkPlot(network_xml, config_file).plot_dynamic(
+        host, port, max_request, fps, blit, alpha, smoothing, window, record)
 
-        router_heat.remove()
-        colorize_nodes(avg_router_load)
-        time_stamp.remove()
 
-        time_stamp_val = "Time: {} ns".format(time/1000)
-        time_stamp = ax.text(
-            xlim[0], ylim[-1], zlim[-1], time_stamp_val, size=12, color='red')
+def replay_dynamic(network_xml, config_file, recording, port=5556, fps=30, speed=None,
+                   start_time=None, **kwargs):
+    """
+    Plot the dynamic network from a recording of plot_dynamic instead of a
+    running simulation. The recording is served by a local stand-in of the
+    GUI server, the replay ends after its last message. A server which fails
+    to start raises a RuntimeError.
 
-        plt.pause(1/30)
+    Parameters
+    ----------
+    network_xml : str
+        Path of network.xml file
+    config_file : str
+        Path of config.ini file
+    recording : str
+        Path of the recording file
+    port : int, optional
+        tcp port number of the local server, by default 5556
+    fps : int, optional
+        maximum redraw rate of the window, by default 30
+    speed : float, optional
+        The number of recorded messages replayed per second, by default None
+        replays as fast as possible
+    start_time : float, optional
+        Start at the first message at or after this simulation time, by default None
+    kwargs :
+        Further arguments of plot_dynamic.
 
-    plt.show()
+    Returns
+    -------
+    dict
+        The statistics of the received, rendered and dropped frames.
+    """
+    server = ReplayServer(recording, "127.0.0.1", port, start_time, speed)
+    server.start()
+    if not server.wait_bound(5):
+        server.stop()
+        server.join()
+        raise RuntimeError("The replay server failed to serve {} on port {}: {}".format(
+            recording, port, server.error or "timeout"))
+    # the client stops after the last frame instead of waiting for more
+    kwargs.setdefault('max_request', server.frames)
+    try:
+        return plot_dynamic(network_xml, config_file, "127.0.0.1", port, fps=fps, **kwargs)
+    finally:
+        server.stop()
+        server.join()
@@ -0,0 +1,360 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# Record and replay of the GUI server telemetry.
+#
+# A recording is a sequence of .npy arrays in one file: a JSON header with the
+# router fields, followed by chunks of a time array (#frames,) and a value
+# array (#frames, #routers, #fields) in float32.
+###############################################################################
+import json
+import threading
+import time as timer
+
+import numpy as np
+
+###############################################################################
+
+RECORDING_VERSION = 1
+
+
+def _numeric_fields(router):
+    """ The names of the numeric values of a router entry """
+    fields = []
+    for key, value in router.items():
+        try:
+            float(value)
+        except (TypeError, ValueError):
+            continue
+        fields.append(key)
+    return fields
+
+
+class TelemetryRecorder:
+    """
+    Write the messages of the GUI server into a chunked binary file.
+
+    The fields of the routers are taken from the first message, fields that
+    are missing in later messages are recorded as NaN.
+    """
+
+    def __init__(self, path, chunk_size=1000):
+        """
+        Parameters
+        ----------
+        path : str
+            Path of the recording file.
+        chunk_size : int, optional
+            The number of frames written at once, by default 1000
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.fields = None
+        self.num_routers = None
+        self.frames = 0
+        self._file = open(path, 'wb')
+        self._times = []
+        self._values = []
+
+    def record(self, data):
+        """
+        Add a decoded message of the GUI server.
+
+        Parameters
+        ----------
+        data : dict
+            The decoded message with the "Time" and "Data" entries.
+        """
+        routers = data["Data"]
+        if self.fields is None:
+            self.fields = _numeric_fields(routers[0]) if routers else []
+            self.num_routers = len(routers)
+            header = json.dumps({'version': RECORDING_VERSION, 'fields': self.fields,
+                                 'num_routers': self.num_routers})
+            np.save(self._file, np.frombuffer(header.encode(), dtype=np.uint8))
+
+        nan = float('nan')
+        self._times.append(float(data["Time"]["time"]))
+        self._values.append([[router.get(field, nan) for field in self.fields]
+                             for router in routers[:self.num_routers]])
+        self.frames += 1
+        if len(self._times) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """ Write the buffered frames to the file """
+        if not self._times:
+            return
+        np.save(self._file, np.array(self._times, dtype=np.float64))
+        np.save(self._file, np.array(self._values, dtype=np.float32).reshape(
+            len(self._times), self.num_routers, len(self.fields)))
+        self._file.flush()
+        self._times = []
+        self._values = []
+
+    def close(self):
+        """ Write the remaining frames and close the file """
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _read_array_header(f):
+    """ Read the header of the next .npy array and return its shape and dtype """
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+    return shape, dtype
+
+
+class TelemetryReplayer:
+    """
+    Read a recording of the TelemetryRecorder.
+
+    Opening a recording reads only the time arrays, the values of a chunk are
+    loaded when a frame of the chunk is requested.
+    """
+
+    def __init__(self, path):
+        """
+        Parameters
+        ----------
+        path : str
+            Path of the recording file.
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        header = json.loads(np.load(self._file).tobytes().decode())
+        assert header['version'] == RECORDING_VERSION, \
+            "Unsupported recording version {}".format(header['version'])
+        self.fields = header['fields']
+        self.num_routers = header['num_routers']
+
+        # index the chunks: their first frame and the offset of the values
+        times = []
+        self._chunk_start = []
+        self._chunk_offset = []
+        frames = 0
+        while True:
+            try:
+                chunk_times = np.load(self._file)
+            except (EOFError, ValueError):
+                break
+            shape, dtype = _read_array_header(self._file)
+            self._chunk_start.append(frames)
+            self._chunk_offset.append((self._file.tell(), shape, dtype))
+            self._file.seek(int(np.prod(shape)) * dtype.itemsize, 1)
+            times.append(chunk_times)
+            frames += len(chunk_times)
+
+        self.times = np.concatenate(times) if times else np.zeros(0)
+        self._chunk_start = np.array(self._chunk_start + [frames], dtype=int)
+        self._cache = (None, None)
+
+    def __len__(self):
+        return len(self.times)
+
+    def close(self):
+        self._file.close()
+
+    def _chunk(self, chunk_idx):
+        if self._cache[0] != chunk_idx:
+            offset, shape, dtype = self._chunk_offset[chunk_idx]
+            self._file.seek(offset)
+            values = np.fromfile(self._file, dtype=dtype, count=int(np.prod(shape)))
+            self._cache = (chunk_idx, values.reshape(shape))
+        return self._cache[1]
+
+    def frame_index(self, time):
+        """ The index of the first frame at or after the given simulation time """
+        return int(np.searchsorted(self.times, time))
+
+    def frame(self, idx, field=None):
+        """
+        Return the values of a frame.
+
+        Parameters
+        ----------
+        idx : int
+            The frame index.
+        field : str, optional
+            The router field, by default None returns all fields with shape
+            (#routers, #fields)
+
+        Returns
+        -------
+        tuple
+            The simulation time and the router values.
+        """
+        chunk_idx = int(np.searchsorted(self._chunk_start, idx, side='right')) - 1
+        values = self._chunk(chunk_idx)[idx - self._chunk_start[chunk_idx]]
+        if field is not None:
+            values = values[:, self.fields.index(field)]
+        return self.times[idx], values
+
+    def series(self, field="averagebufferusage", start=0, stop=None, step=1):
+        """
+        Return the time series of one router field.
+
+        Returns
+        -------
+        tuple
+            The times (#frames,) and the values (#frames, #routers).
+        """
+        indices = np.arange(len(self))[start:stop:step]
+        values = np.empty((len(indices), self.num_routers), dtype=np.float32)
+        for pos, idx in enumerate(indices):
+            values[pos] = self.frame(idx, field)[1]
+        return self.times[indices], values
+
+    def play(self, callback, field="averagebufferusage", start_time=None, stop_time=None,
+             fps=None, step=1):
+        """
+        Feed the recorded frames to a callback.
+
+        Parameters
+        ----------
+        callback : callable
+            Called with the simulation time and the router values of each frame.
+            Returning False stops the playback.
+        field : str, optional
+            The router field, None passes all fields, by default "averagebufferusage"
+        start_time : float, optional
+            Start at the first frame at or after this simulation time, by default None
+        stop_time : float, optional
+            Stop before the first frame after this simulation time, by default None
+        fps : float, optional
+            The number of frames per second, by default None plays as fast as possible
+        step : int, optional
+            Play every step-th frame, by default 1
+        """
+        start = 0 if start_time is None else self.frame_index(start_time)
+        stop = len(self) if stop_time is None else \
+            int(np.searchsorted(self.times, stop_time, side='right'))
+
+        for idx in range(start, stop, step):
+            frame_start = timer.monotonic()
+            if callback(*self.frame(idx, field)) is False:
+                return
+            if fps:
+                timer.sleep(max(0., 1/fps - (timer.monotonic() - frame_start)))
+
+    def message(self, idx):
+        """ Rebuild the GUI server message of a frame """
+        time, values = self.frame(idx)
+        data = [dict(zip(self.fields, router)) for router in values.tolist()]
+        return json.dumps({"Time": {"time": time}, "Data": data})
+
+
+class ReplayServer(threading.Thread):
+    """
+    A stand-in for the GUI server of the simulator which answers the requests
+    with the frames of a recording.
+    """
+
+    def __init__(self, path, host="*", port=5555, start_time=None, fps=None, loop=False):
+        """
+        Parameters
+        ----------
+        path : str
+            Path of the recording file.
+        host : str, optional
+            tcp interface to bind, by default "*"
+        port : int, optional
+            tcp port number, by default 5555
+        start_time : float, optional
+            Start at the first frame at or after this simulation time, by default None
+        fps : float, optional
+            The maximum number of frames per second, by default None
+        loop : bool, optional
+            Restart at the first frame after the last one, by default False
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.path = path
+        self.address = "tcp://{}:{}".format(host, port)
+        self.start_time = start_time
+        self.fps = fps
+        self.loop = loop
+        self._stop_event = threading.Event()
+        self._bound = threading.Event()
+        self.served = 0
+        self.frames = None
+        self.error = None
+
+    def run(self):
+        import zmq
+
+        try:
+            replayer = TelemetryReplayer(self.path)
+        except Exception as error:
+            self.error = error
+            self._bound.set()
+            return
+        context = zmq.Context.instance()
+        socket = context.socket(zmq.REP)
+        socket.setsockopt(zmq.LINGER, 0)
+        try:
+            socket.bind(self.address)
+        except zmq.ZMQError as error:
+            self.error = error
+            socket.close()
+            replayer.close()
+            self._bound.set()
+            return
+
+        idx = 0 if self.start_time is None else replayer.frame_index(self.start_time)
+        # the number of frames until the end of the recording
+        self.frames = len(replayer) - idx
+        self._bound.set()
+        try:
+            while not self._stop_event.is_set() and idx < len(replayer):
+                if not socket.poll(100):
+                    continue
+                frame_start = timer.monotonic()
+                socket.recv()
+                socket.send_string(replayer.message(idx))
+                self.served += 1
+                idx += 1
+                if self.loop and idx == len(replayer):
+                    idx = 0
+                if self.fps:
+                    timer.sleep(max(0., 1/self.fps - (timer.monotonic() - frame_start)))
+        finally:
+            socket.close()
+            replayer.close()
+
+    def wait_bound(self, timeout=None):
+        """ Wait until the server accepts requests, False if it failed to start """
+        return self._bound.wait(timeout) and self.error is None
+
+    def stop(self):
+        """ Stop serving requests """
+        self._stop_event.set()
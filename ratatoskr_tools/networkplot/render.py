@@ -0,0 +1,303 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# Offline rendering of router heat animations.
+#
+# The frames are rendered headless with the Agg canvas by a pool of worker
+# processes. Every worker draws the static scene (connections, axes) once and
+# blits only the router heat and the label of each frame on top of it.
+###############################################################################
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from mpl_toolkits.mplot3d import Axes3D  # noqa: F401, registers the 3d projection
+from PIL import Image
+
+from .plot_network import NetworkPlot
+from .recording import TelemetryReplayer
+
+###############################################################################
+
+# The scene of the worker process, built once by _init_worker
+_scene = None
+
+
+class HeatScene:
+    """
+    The static 3D network scene with the router heat drawn on top of it.
+    """
+
+    def __init__(self, network_plot, vmin, vmax, figsize=(6.4, 4.8), dpi=100,
+                 cmap='inferno', view=None):
+        """
+        Parameters
+        ----------
+        network_plot : NetworkPlot
+            The network, its figure is created on the Agg canvas.
+        vmin, vmax : float
+            The range of the color map, fixed for all frames.
+        figsize : tuple, optional
+            The figure size in inches, by default (6.4, 4.8)
+        dpi : int, optional
+            The resolution of the frames, by default 100
+        cmap : str, optional
+            The color map of the router heat, by default 'inferno'
+        view : tuple, optional
+            The elevation and azimuth of the camera, by default None
+        """
+        self.network_plot = network_plot
+        self.fig = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.fig)
+        network_plot.create_fig(self.fig)
+        self.ax = network_plot.ax
+        if view is not None:
+            self.ax.view_init(*view)
+
+        network_plot.plot_connections()
+        self.heat = network_plot.colorize_nodes(np.zeros(len(network_plot.coords)),
+                                                cmap=cmap, vmin=vmin, vmax=vmax)
+        self.fig.colorbar(self.heat, ax=self.ax, shrink=0.6)
+        xlim, ylim, zlim = self.ax.get_xlim3d(), self.ax.get_ylim3d(), self.ax.get_zlim3d()
+        self.label = self.ax.text(xlim[0], ylim[-1], zlim[-1], "", size=12, color='red')
+
+        # draw the static scene once, the animated artists are drawn per frame
+        self.heat.set_animated(True)
+        self.label.set_animated(True)
+        self.canvas.draw()
+        self._bg = self.canvas.copy_from_bbox(self.fig.bbox)
+
+    def render(self, values, label=""):
+        """
+        Render one frame.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            The value of each router.
+        label : str, optional
+            The text of the frame, e.g. the simulation time, by default ""
+
+        Returns
+        -------
+        PIL.Image.Image
+            The rendered frame.
+        """
+        self.canvas.restore_region(self._bg)
+        self.network_plot.update_node_colors(values, autoscale=False)
+        self.label.set_text(label)
+        self.fig.draw_artist(self.heat)
+        self.fig.draw_artist(self.label)
+        return Image.fromarray(np.asarray(self.canvas.buffer_rgba())).convert('RGB')
+
+
+def _init_worker(scene_args, scene_kwargs, frames, labels, frame_dir):
+    global _scene
+    _scene = (HeatScene(*scene_args, **scene_kwargs), frames, labels, frame_dir)
+
+
+def _render_chunk(bounds):
+    scene, frames, labels, frame_dir = _scene
+    for idx in range(*bounds):
+        scene.render(frames[idx], labels[idx]).save(
+            os.path.join(frame_dir, "frame_{:06d}.png".format(idx)))
+    return bounds[1] - bounds[0]
+
+
+def _assemble(frame_dir, num_frames, output_file, fps):
+    """ Assemble the rendered frames to a GIF or, with ffmpeg, to a video """
+    paths = [os.path.join(frame_dir, "frame_{:06d}.png".format(idx))
+             for idx in range(num_frames)]
+    if output_file.lower().endswith('.gif'):
+        first = Image.open(paths[0])
+        # the remaining frames are read lazily while the GIF is written
+        first.save(output_file, save_all=True, loop=0, duration=int(1000 / fps),
+                   append_images=(Image.open(path) for path in paths[1:]))
+        return
+
+    ffmpeg = shutil.which('ffmpeg')
+    assert ffmpeg is not None, "ffmpeg is required to write {}".format(output_file)
+    subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-framerate', str(fps),
+                    '-i', os.path.join(frame_dir, 'frame_%06d.png'),
+                    '-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                    output_file], check=True)
+
+
+def render_heat_animation(network_xml, config_file, frames, output_file, labels=None,
+                          fps=10, num_cores=None, chunk_size=50, vmin=None, vmax=None,
+                          frame_dir=None, network_plot=None, **scene_kwargs):
+    """
+    Render the router heat of every frame and assemble the frames to an animation.
+
+    Parameters
+    ----------
+    network_xml : str
+        Path of network.xml file
+    config_file : str
+        Path of config.ini file
+    frames : array_like
+        The router values of each frame, shape (#frames, #routers).
+    output_file : str
+        Path of the animation, a .gif file or any video format of ffmpeg.
+    labels : list(str), optional
+        The text of each frame, by default the frame index
+    fps : int, optional
+        The frames per second of the animation, by default 10
+    num_cores : int, optional
+        The number of rendering processes, by default the number of cores
+    chunk_size : int, optional
+        The number of consecutive frames rendered by one task, by default 50
+    vmin, vmax : float, optional
+        The range of the color map, by default the range of all frames
+    frame_dir : str, optional
+        Keep the rendered PNG frames in this directory, by default they are
+        written to a temporary directory and removed
+    network_plot : NetworkPlot, optional
+        The already parsed network, by default None parses network_xml
+    scene_kwargs :
+        figsize, dpi, cmap and view of the HeatScene.
+
+    Returns
+    -------
+    str
+        The path of the animation.
+    """
+    if network_plot is None:
+        network_plot = NetworkPlot(network_xml, config_file)
+
+    frames = np.asarray(frames, dtype=np.float32)
+    num_routers = len(network_plot.coords)
+    assert frames.ndim == 2 and frames.shape[1] == num_routers, \
+        "frames need the shape (#frames, {})".format(num_routers)
+    num_frames = len(frames)
+    assert num_frames > 0, "No frames to render"
+    if labels is None:
+        labels = [str(idx) for idx in range(num_frames)]
+    assert len(labels) == num_frames, "Every frame needs one label"
+
+    vmin = float(np.nanmin(frames)) if vmin is None else vmin
+    vmax = float(np.nanmax(frames)) if vmax is None else vmax
+    if vmax <= vmin:
+        vmax = vmin + 1
+
+    if num_cores is None:
+        num_cores = multiprocessing.cpu_count()
+    num_cores = max(1, min(num_cores, -(-num_frames // chunk_size)))
+    chunks = [(first, min(first + chunk_size, num_frames))
+              for first in range(0, num_frames, chunk_size)]
+
+    tmp_dir = None
+    if frame_dir is None:
+        frame_dir = tmp_dir = tempfile.mkdtemp(prefix='ratatoskr_frames_')
+    else:
+        os.makedirs(frame_dir, exist_ok=True)
+
+    initargs = ((network_plot, vmin, vmax), scene_kwargs,
+                frames, list(labels), frame_dir)
+    try:
+        if num_cores == 1:
+            _init_worker(*initargs)
+            for bounds in chunks:
+                _render_chunk(bounds)
+        else:
+            with multiprocessing.Pool(num_cores, _init_worker, initargs) as pool:
+                for _ in pool.imap_unordered(_render_chunk, chunks):
+                    pass
+        _assemble(frame_dir, num_frames, output_file, fps)
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return output_file
+
+
+def render_recording(network_xml, config_file, recording, output_file,
+                     field="averagebufferusage", step=1, **kwargs):
+    """
+    Render a recording of plot_dynamic to an animation.
+
+    Parameters
+    ----------
+    network_xml : str
+        Path of network.xml file
+    config_file : str
+        Path of config.ini file
+    recording : str
+        Path of the recording file
+    output_file : str
+        Path of the animation, a .gif file or any video format of ffmpeg.
+    field : str, optional
+        The router value to render, by default "averagebufferusage"
+    step : int, optional
+        Render every step-th recorded message, by default 1
+    kwargs :
+        Further arguments of render_heat_animation.
+
+    Returns
+    -------
+    str
+        The path of the animation.
+    """
+    replayer = TelemetryReplayer(recording)
+    try:
+        times, frames = replayer.series(field, step=step)
+    finally:
+        replayer.close()
+    labels = ["Time: {} ns".format(time/1000) for time in times]
+    return render_heat_animation(network_xml, config_file, frames, output_file,
+                                 labels=labels, **kwargs)
+
+
+def render_inj_rates(network_xml, config_file, usages, inj_rates, output_file, **kwargs):
+    """
+    Render the router usages across the injection rates to an animation,
+    one frame per injection rate.
+
+    Parameters
+    ----------
+    network_xml : str
+        Path of network.xml file
+    config_file : str
+        Path of config.ini file
+    usages : list(np.ndarray)
+        The usage of every router for each injection rate, e.g. from
+        ratatoskr_tools.datahandle.retrieve_router_usages.
+    inj_rates : list(float)
+        The injection rates.
+    output_file : str
+        Path of the animation, a .gif file or any video format of ffmpeg.
+    kwargs :
+        Further arguments of render_heat_animation.
+
+    Returns
+    -------
+    str
+        The path of the animation.
+    """
+    labels = ["Injection rate: {:.3f}".format(rate) for rate in inj_rates]
+    return render_heat_animation(network_xml, config_file, np.stack(usages), output_file,
+                                 labels=labels, **kwargs)
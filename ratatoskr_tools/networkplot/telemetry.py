@@ -0,0 +1,290 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# Client side of the GUI server of the ratatoskr simulator.
+# The messages are received in a background thread as fast as the server
+# produces them, the renderer only picks up the latest state.
+###############################################################################
+import json
+import threading
+import time as timer
+
+import numpy as np
+
+###############################################################################
+
+
+def decode_message(message, field="averagebufferusage"):
+    """
+    Decode a message of the GUI server.
+
+    Parameters
+    ----------
+    message : bytes or str
+        The JSON message with the "Time" and "Data" entries.
+    field : str, optional
+        The router value to extract, by default "averagebufferusage"
+
+    Returns
+    -------
+    tuple
+        The simulation time and the array of the router values.
+    """
+    return decode_data(json.loads(message), field)
+
+
+def decode_data(data, field="averagebufferusage"):
+    """
+    Extract the router values of an already parsed message of the GUI server.
+
+    Parameters
+    ----------
+    data : dict
+        The parsed message with the "Time" and "Data" entries.
+    field : str, optional
+        The router value to extract, by default "averagebufferusage"
+
+    Returns
+    -------
+    tuple
+        The simulation time and the array of the router values.
+    """
+    time = float(data["Time"]["time"])
+    values = np.array([router[field] for router in data["Data"]], dtype=float)
+    return time, values
+
+
+class TelemetryStream:
+    """
+    Smoothed per-router values of a stream of GUI server messages.
+
+    Available smoothing windows:
+        - 'ema': exponential moving average with weight alpha of the newest value
+        - 'mean': mean of the last `window` values
+        - 'max': maximum of the last `window` values (max-hold)
+        - 'raw': the newest value
+    """
+
+    SMOOTHINGS = ('ema', 'mean', 'max', 'raw')
+
+    def __init__(self, num_routers, smoothing='ema', alpha=.01, window=100):
+        """
+        Parameters
+        ----------
+        num_routers : int
+            The number of routers of the network.
+        smoothing : str, optional
+            The smoothing window, by default 'ema'
+        alpha : float, optional
+            weight of the newest value of the 'ema' smoothing, by default .01
+        window : int, optional
+            The number of values of the 'mean' and 'max' smoothing, by default 100
+        """
+        assert smoothing in self.SMOOTHINGS, \
+            "Unknown smoothing '{}', available: {}".format(smoothing, self.SMOOTHINGS)
+        assert 0 < alpha <= 1, "alpha={} is not in (0, 1]".format(alpha)
+
+        self.num_routers = num_routers
+        self.smoothing = smoothing
+        self.alpha = alpha
+        self.window = window
+        self.time = 0.
+        self.count = 0
+        self.value = np.zeros(num_routers)
+        if smoothing in ('mean', 'max'):
+            self._history = np.zeros((window, num_routers))
+            self._sum = np.zeros(num_routers)
+
+    def push(self, time, values):
+        """
+        Add the router values of a message.
+
+        Parameters
+        ----------
+        time : float
+            The simulation time of the message.
+        values : np.ndarray
+            The value of each router.
+
+        Returns
+        -------
+        np.ndarray
+            The smoothed router values.
+        """
+        values = np.asarray(values, dtype=float)[:self.num_routers]
+        if self.smoothing == 'ema':
+            self.value += self.alpha * (values - self.value)
+        elif self.smoothing == 'raw':
+            self.value = values.copy()
+        else:
+            slot = self.count % self.window
+            filled = min(self.count + 1, self.window)
+            if self.smoothing == 'mean':
+                self._sum += values - self._history[slot]
+                self._history[slot] = values
+                self.value = self._sum / filled
+            else:
+                self._history[slot] = values
+                self.value = self._history[:filled].max(axis=0)
+        self.time = time
+        self.count += 1
+        return self.value
+
+
+class TelemetryReceiver(threading.Thread):
+    """
+    Background thread which requests the router states from the GUI server.
+
+    Every message updates the smoothed router values. The renderer fetches the
+    latest state with snapshot(), all states received in between are counted
+    as dropped frames.
+    """
+
+    def __init__(self, num_routers, host="localhost", port=5555, max_request=2000000,
+                 alpha=.01, timeout=100, smoothing='ema', window=100, field="averagebufferusage",
+                 recorder=None):
+        """
+        Parameters
+        ----------
+        num_routers : int
+            The number of routers of the network.
+        host : str, optional
+            tcp server host ip, by default "localhost"
+        port : int, optional
+            tcp port number, by default 5555
+        max_request : int, optional
+            maximum request count to the server, by default 2000000
+        alpha : float, optional
+            weight of the newest buffer usage in the averaged router load,
+            by default .01
+        timeout : int, optional
+            time in ms to wait for a reply before checking for stop(),
+            by default 100
+        smoothing : str, optional
+            The smoothing window of the TelemetryStream, by default 'ema'
+        window : int, optional
+            The number of values of the 'mean' and 'max' smoothing, by default 100
+        field : str, optional
+            The router value to extract, by default "averagebufferusage"
+        recorder : TelemetryRecorder, optional
+            Records every received message, by default None
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.num_routers = num_routers
+        self.address = "tcp://{}:{}".format(host, port)
+        self.max_request = max_request
+        self.timeout = timeout
+        self.field = field
+        self.recorder = recorder
+        self.stream = TelemetryStream(num_routers, smoothing, alpha, window)
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._router_load = self.stream.value.copy()
+        self._time = 0.
+        self._seq = 0
+        self._seen = 0
+
+        self.received = 0
+        self.rendered = 0
+        self.dropped = 0
+        self.started_at = None
+
+    def run(self):
+        import zmq
+
+        # zmq sockets must be used by the thread which created them
+        context = zmq.Context.instance()
+        socket = context.socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.address)
+        self.started_at = timer.monotonic()
+
+        try:
+            for request in range(self.max_request):
+                socket.send_string("Cient request {}".format(request))
+                while not socket.poll(self.timeout):
+                    if self._stop_event.is_set():
+                        return
+                data = json.loads(socket.recv())
+                if self.recorder is not None:
+                    self.recorder.record(data)
+                self.update(*decode_data(data, self.field))
+                if self._stop_event.is_set():
+                    return
+        finally:
+            socket.close()
+
+    def update(self, time, values):
+        """
+        Apply the decoded router values of a message to the router state.
+
+        Parameters
+        ----------
+        time : float
+            The simulation time of the message.
+        values : np.ndarray
+            The value of each router.
+        """
+        router_load = self.stream.push(time, values).copy()
+
+        with self._lock:
+            self._router_load = router_load
+            self._time = time
+            self._seq += 1
+            self.received += 1
+
+    def snapshot(self):
+        """
+        Return the latest state if it was not fetched before.
+
+        Returns
+        -------
+        tuple or None
+            The simulation time and the smoothed router values, or None if no
+            new message arrived since the last call.
+        """
+        with self._lock:
+            if self._seq == self._seen:
+                return None
+            self.dropped += self._seq - self._seen - 1
+            self._seen = self._seq
+            self.rendered += 1
+            return self._time, self._router_load
+
+    def stop(self):
+        """ Stop requesting messages from the server """
+        self._stop_event.set()
+
+    def stats(self):
+        """
+        Return the statistics of the received and rendered messages.
+
+        Returns
+        -------
+        dict
+            Received, rendered and dropped frames and the receive rate per second.
+        """
+        elapsed = timer.monotonic() - self.started_at if self.started_at else 0.
+        return {'received': self.received, 'rendered': self.rendered,
+                'dropped': self.dropped,
+                'receive_rate': self.received / elapsed if elapsed > 0 else 0.}
@@ -1 +1,3 @@
 from .simulation import *
+from .distributed import SimulationBroker, run_distributed_sims, run_worker
+from .batch import array_job_status, collect_array_job, export_array_job, read_index
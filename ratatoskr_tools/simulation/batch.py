@@ -0,0 +1,325 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# Export of simulations as an array job of a batch scheduler.
+#
+# The job directory gets
+#   index.tsv     one line per simulation: task, label, config, network, simdir
+#   run_task.sh   runs the simulations of one task, several per allocation
+#   submit.sh     the array job of the scheduler, one array task per task
+#   run_local.sh  runs all tasks on this machine
+# A finished simulation leaves the marker .done in its directory, a failed one
+# the marker .failed with the exit status of the simulator.
+###############################################################################
+import math
+import os
+import shlex
+import stat
+
+###############################################################################
+
+SCHEDULERS = ('slurm', 'pbs', 'sge')
+
+DONE_MARKER = '.done'
+FAILED_MARKER = '.failed'
+
+_RUN_TASK = """#!/bin/bash
+# Runs the simulations of one task of the array job: run_task.sh TASK_ID
+TASK=${{1:?usage: run_task.sh TASK_ID}}
+SIM={simulator}
+INDEX={index}
+CORES=${{RATATOSKR_CORES:-{cores}}}
+
+run() {{
+    local config=$1 network=$2 simdir=$3
+    mkdir -p "$simdir"
+    rm -f "$simdir/{done}" "$simdir/{failed}"
+    if "$SIM" --configPath="$config" --networkPath="$network" --outputDir="$simdir" \\
+            > "$simdir/log" 2>&1 < /dev/null; then
+        touch "$simdir/{done}"
+    else
+        echo $? > "$simdir/{failed}"
+    fi
+}}
+
+while IFS=$'\\t' read -r task label config network simdir; do
+    [ "$task" = "$TASK" ] || continue
+    [ -e "$simdir/{done}" ] && continue
+    while [ "$(jobs -rp | wc -l)" -ge "$CORES" ]; do wait -n; done
+    run "$config" "$network" "$simdir" &
+done < "$INDEX"
+wait
+"""
+
+_HEADERS = {
+    'slurm': """#SBATCH --job-name={name}
+#SBATCH --array=0-{last}
+#SBATCH --cpus-per-task={cores}
+#SBATCH --time={walltime}
+#SBATCH --output={logs}/task_%a.out
+{extra}
+exec bash {run_task} "$SLURM_ARRAY_TASK_ID"
+""",
+    'pbs': """#PBS -N {name}
+#PBS -J 0-{last}
+#PBS -l select=1:ncpus={cores}
+#PBS -l walltime={walltime}
+#PBS -j oe
+#PBS -o {logs}/
+{extra}
+exec bash {run_task} "$PBS_ARRAY_INDEX"
+""",
+    'sge': """#$ -N {name}
+#$ -t 1-{count}
+#$ -pe smp {cores}
+#$ -l h_rt={walltime}
+#$ -j y
+#$ -o {logs}/
+{extra}
+exec bash {run_task} "$((SGE_TASK_ID - 1))"
+""",
+}
+
+_RUN_LOCAL = """#!/bin/bash
+# Runs all tasks of the array job on this machine, PARALLEL tasks at a time:
+# run_local.sh [PARALLEL]
+PARALLEL=${{1:-1}}
+for task in $(seq 0 {last}); do
+    while [ "$(jobs -rp | wc -l)" -ge "$PARALLEL" ]; do wait -n; done
+    bash {run_task} "$task" &
+done
+wait
+"""
+
+
+def _write_script(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR | stat.S_IXGRP)
+
+
+def _walltime(minutes):
+    minutes = int(math.ceil(minutes))
+    return "{:02d}:{:02d}:00".format(minutes // 60, minutes % 60)
+
+
+def sims_per_task(num_jobs, cores=1, sim_minutes=None, task_minutes=60, max_tasks=1000):
+    """
+    The number of simulations packed into one array task.
+
+    Parameters
+    ----------
+    num_jobs : int
+        The number of simulations.
+    cores : int, optional
+        The number of parallel simulations of a task, by default 1
+    sim_minutes : float, optional
+        The estimated run time of one simulation, by default None packs one
+        simulation per core
+    task_minutes : float, optional
+        The targeted run time of a task, by default 60
+    max_tasks : int, optional
+        The maximum size of the array, by default 1000
+
+    Returns
+    -------
+    int
+        The number of simulations of each task.
+    """
+    per_task = cores
+    if sim_minutes:
+        per_task = cores * max(1, int(task_minutes // sim_minutes))
+    return max(per_task, -(-num_jobs // max_tasks), 1)
+
+
+def export_array_job(jobs, simulator, jobdir, scheduler='slurm', cores=1, sim_minutes=None,
+                     task_minutes=60, max_tasks=1000, name='ratatoskr', extra_directives=(),
+                     pending_only=True):
+    """
+    Write the array job of the simulations.
+
+    Parameters
+    ----------
+    jobs : list(tuple)
+        The (config_path, network_path, simdir) or (config_path, network_path,
+        simdir, label) of each simulation, the label groups the simulations
+        for collect_array_job, e.g. the injection rate.
+    simulator : str
+        The path of the simulator executor "./sim" on the cluster nodes
+    jobdir : str
+        The directory of the index and the scripts.
+    scheduler : str, optional
+        'slurm', 'pbs' or 'sge', by default 'slurm'
+    cores : int, optional
+        The number of cores of a task and of its parallel simulations, by default 1
+    sim_minutes : float, optional
+        The estimated run time of one simulation, used for the packing and the
+        wall time, by default None
+    task_minutes : float, optional
+        The targeted run time of a task, by default 60
+    max_tasks : int, optional
+        The maximum size of the array, by default 1000
+    name : str, optional
+        The name of the job, by default 'ratatoskr'
+    extra_directives : list(str), optional
+        Further lines of the submit script, e.g. "#SBATCH --partition=short"
+    pending_only : bool, optional
+        Skip the simulations whose directory has the .done marker, by default True
+
+    Returns
+    -------
+    str
+        The path of submit.sh, None if there is nothing to run.
+    """
+    assert scheduler in SCHEDULERS, \
+        "Unknown scheduler '{}', available: {}".format(scheduler, SCHEDULERS)
+
+    rows = []
+    num_pending = 0
+    for job in jobs:
+        config_path, network_path, simdir = (os.path.abspath(path) for path in job[:3])
+        label = job[3] if len(job) > 3 else ''
+        fields = [str(label), config_path, network_path, simdir]
+        assert not any(c in field for field in fields for c in '\t\n'), \
+            "Tabs and newlines are not supported in the paths and labels: {}".format(fields)
+        # finished simulations stay in the index for the collector, without a task
+        pending = not (pending_only and os.path.exists(os.path.join(simdir, DONE_MARKER)))
+        num_pending += pending
+        rows.append((pending, fields))
+    if not num_pending:
+        return None
+
+    per_task = sims_per_task(num_pending, cores, sim_minutes, task_minutes, max_tasks)
+    num_tasks = -(-num_pending // per_task)
+    if sim_minutes:
+        # 50 % margin for slower nodes
+        task_minutes = 1.5 * sim_minutes * -(-per_task // cores)
+
+    jobdir = os.path.abspath(jobdir)
+    logs = os.path.join(jobdir, 'logs')
+    os.makedirs(logs, exist_ok=True)
+    index = os.path.join(jobdir, 'index.tsv')
+    with open(index, 'w') as f:
+        f.write("# task\tlabel\tconfig\tnetwork\tsimdir\n")
+        idx = 0
+        for pending, fields in rows:
+            f.write("\t".join([str(idx // per_task if pending else -1)] + fields) + "\n")
+            idx += pending
+
+    run_task = os.path.join(jobdir, 'run_task.sh')
+    _write_script(run_task, _RUN_TASK.format(
+        simulator=shlex.quote(os.path.abspath(simulator)), index=shlex.quote(index),
+        cores=cores, done=DONE_MARKER, failed=FAILED_MARKER))
+    _write_script(os.path.join(jobdir, 'run_local.sh'), _RUN_LOCAL.format(
+        last=num_tasks - 1, run_task=shlex.quote(run_task)))
+
+    submit = os.path.join(jobdir, 'submit.sh')
+    _write_script(submit, "#!/bin/bash\n" + _HEADERS[scheduler].format(
+        name=name, last=num_tasks - 1, count=num_tasks, cores=cores,
+        walltime=_walltime(task_minutes), logs=logs, extra="\n".join(extra_directives),
+        run_task=shlex.quote(run_task)))
+    return submit
+
+
+def read_index(jobdir):
+    """
+    Read the index of an exported array job.
+
+    Returns
+    -------
+    list(dict)
+        The task, label, config, network and simdir of each simulation, the
+        task of an already finished simulation is -1.
+    """
+    keys = ('task', 'label', 'config', 'network', 'simdir')
+    with open(os.path.join(jobdir, 'index.tsv')) as f:
+        rows = [dict(zip(keys, line.rstrip('\n').split('\t')))
+                for line in f if not line.startswith('#')]
+    for row in rows:
+        row['task'] = int(row['task'])
+    return rows
+
+
+def array_job_status(jobdir):
+    """
+    The status of the simulations of an exported array job.
+
+    Returns
+    -------
+    dict
+        The simulation directories of the 'done', 'failed' and 'pending'
+        simulations.
+    """
+    status = {'done': [], 'failed': [], 'pending': []}
+    for row in read_index(jobdir):
+        simdir = row['simdir']
+        if os.path.exists(os.path.join(simdir, DONE_MARKER)):
+            status['done'].append(simdir)
+        elif os.path.exists(os.path.join(simdir, FAILED_MARKER)):
+            status['failed'].append(simdir)
+        else:
+            status['pending'].append(simdir)
+    return status
+
+
+def collect_array_job(jobdir, config, require_all=True):
+    """
+    Read the results of the finished simulations of an array job, grouped by
+    their label.
+
+    Parameters
+    ----------
+    jobdir : str
+        The directory of the exported array job.
+    config : ratatoskr_tools.networkconfig.configure.Configuration
+        The configuration of the simulations.
+    require_all : bool, optional
+        Read only the labels whose simulations all finished, by default True
+
+    Returns
+    -------
+    dict
+        The ratatoskr_tools.campaign.RateResult of each label, an injection
+        rate label is converted to float.
+    """
+    from ..campaign.pipeline import ingest_rate
+
+    groups = {}
+    networks = {}
+    for row in read_index(jobdir):
+        groups.setdefault(row['label'], []).append(row['simdir'])
+        networks.setdefault(row['label'], row['network'])
+
+    results = {}
+    for label, simdirs in groups.items():
+        done = [simdir for simdir in simdirs
+                if os.path.exists(os.path.join(simdir, DONE_MARKER))]
+        if not done or (require_all and len(done) < len(simdirs)):
+            continue
+        # the router layers of the network, if it is still at its path
+        network_xml = networks[label] if os.path.exists(networks[label]) else None
+        try:
+            label = float(label)
+        except ValueError:
+            pass
+        results[label] = ingest_rate(label, done, config, network_xml)
+    return results
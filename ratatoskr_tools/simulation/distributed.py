@@ -0,0 +1,472 @@
+#!/bin/python
+
+# Copyright 2018 Jan Moritz Joseph
+
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included
+# in all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+###############################################################################
+# Distributed simulations over ZeroMQ.
+#
+# The broker (ROUTER socket) hands out one simulation at a time to each idle
+# worker (DEALER socket) on any node. A job carries the config.xml and
+# network.xml, either their content or paths on a shared file system. The
+# worker runs the simulator in a temporary directory and sends the output
+# directory back as tar.gz. Both sides send heartbeats, the job of a worker
+# which stays silent is handed to another worker. The heartbeat of a worker
+# carries its running job id, empty when idle, so a worker which outlives a
+# broker is put to work by the next broker it reconnects to.
+#
+# Messages, after the identity frame of the ROUTER socket:
+#   worker -> broker: READY | HEARTBEAT job_id | RESULT job_id status tar.gz
+#   broker -> worker: JOB job_id spec config network | HEARTBEAT | STOP
+###############################################################################
+import argparse
+import collections
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import socket as sockets
+import tarfile
+import tempfile
+import threading
+import time as timer
+import uuid
+
+from .simulation import run_single_sim
+
+###############################################################################
+
+READY = b'READY'
+HEARTBEAT = b'HEARTBEAT'
+RESULT = b'RESULT'
+JOB = b'JOB'
+STOP = b'STOP'
+
+
+def pack_directory(directory):
+    """ The content of the directory as tar.gz bytes """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        tar.add(directory, arcname='.')
+    return buffer.getvalue()
+
+
+def unpack_directory(data, directory):
+    """ Extract tar.gz bytes of pack_directory into the directory """
+    os.makedirs(directory, exist_ok=True)
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r:gz') as tar:
+        if hasattr(tarfile, 'data_filter'):
+            tar.extractall(directory, filter='data')
+        else:
+            tar.extractall(directory)
+
+
+class SimulationBroker:
+    """
+    Hands out simulations to the connected workers and collects their results.
+    """
+
+    def __init__(self, bind="tcp://*:5570", heartbeat=1., liveness=5, max_attempts=3,
+                 ship_files=True, log='file'):
+        """
+        Parameters
+        ----------
+        bind : str, optional
+            The endpoint of the broker, by default "tcp://*:5570"
+        heartbeat : float, optional
+            The interval of the heartbeats in seconds, by default 1.
+        liveness : int, optional
+            The number of missed heartbeats after which a worker is dead and
+            its job is handed to another worker, by default 5
+        max_attempts : int, optional
+            The number of workers a job is handed to before it fails,
+            by default 3
+        ship_files : bool, optional
+            Send the content of the config.xml and network.xml files with
+            each job, False sends their paths for workers on a shared file
+            system, by default True
+        log : str, optional
+            The log capture of the workers, see run_single_sim, by default 'file'
+        """
+        import zmq
+
+        self.heartbeat = heartbeat
+        self.liveness = liveness
+        self.max_attempts = max_attempts
+        self.ship_files = ship_files
+        self.log = log
+
+        self.context = zmq.Context.instance()
+        self.socket = self.context.socket(zmq.ROUTER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        self.socket.bind(bind)
+        self.endpoint = self.socket.getsockopt_string(zmq.LAST_ENDPOINT)
+
+        # identity: last message time, job id or None, idle
+        self.workers = {}
+        self._files = {}
+
+    def _file(self, path):
+        if not self.ship_files:
+            return b''
+        if path not in self._files:
+            with open(path, 'rb') as f:
+                self._files[path] = f.read()
+        return self._files[path]
+
+    def _send_job(self, identity, job_id, job):
+        spec = {'config_path': job['config_path'], 'network_path': job['network_path'],
+                'shipped': self.ship_files, 'log': self.log}
+        self.socket.send_multipart([identity, JOB, job_id.encode(), json.dumps(spec).encode(),
+                                    self._file(job['config_path']),
+                                    self._file(job['network_path'])])
+
+    def run(self, jobs, timeout=None, verbose=False):
+        """
+        Run the simulations on the connected workers.
+
+        Parameters
+        ----------
+        jobs : list(dict)
+            The 'config_path', 'network_path' and the output 'simdir' of each
+            simulation.
+        timeout : float, optional
+            Give up the unfinished simulations after this many seconds,
+            by default None waits until all finished
+        verbose : bool, optional
+            Print the reassigned and failed jobs, by default False
+
+        Returns
+        -------
+        list(bool)
+            True for each simulation which finished successfully.
+        """
+        import zmq
+
+        # unique over runs, a worker may still finish the job of an earlier run
+        run_id = uuid.uuid4().hex[:8]
+        jobs = {"{}-{}".format(run_id, idx): job for idx, job in enumerate(jobs)}
+        todo = collections.deque(jobs)
+        attempts = dict.fromkeys(jobs, 0)
+        success = {}
+
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+        start = last_beat = timer.monotonic()
+        expiry = self.heartbeat * self.liveness
+
+        while len(success) < len(jobs):
+            now = timer.monotonic()
+            if timeout is not None and now - start > timeout:
+                break
+
+            if poller.poll(self.heartbeat * 1000):
+                identity, command, *args = self.socket.recv_multipart()
+                worker = self.workers.setdefault(identity, {'job': None, 'idle': False})
+                worker['last'] = timer.monotonic()
+                if command == READY:
+                    if worker['job'] is not None:
+                        # the worker restarted and lost its job
+                        todo.appendleft(worker['job'])
+                    worker['job'], worker['idle'] = None, True
+                elif command == HEARTBEAT:
+                    # an idle worker without a job of this broker, e.g. one
+                    # which reconnected after the last broker ended
+                    running = args[0] if args else b''
+                    if not running and worker['job'] is None:
+                        worker['idle'] = True
+                elif command == RESULT:
+                    job_id, status, data = args[0].decode(), json.loads(args[1]), args[2]
+                    # the first result wins, a reassigned job may finish twice
+                    if job_id in jobs and job_id not in success:
+                        if status['success']:
+                            unpack_directory(data, jobs[job_id]['simdir'])
+                        success[job_id] = status['success']
+                        if job_id in todo:
+                            todo.remove(job_id)
+                    worker['job'], worker['idle'] = None, True
+
+            now = timer.monotonic()
+            for identity, worker in list(self.workers.items()):
+                if now - worker['last'] > expiry:
+                    del self.workers[identity]
+                    job_id = worker['job']
+                    if job_id is not None and job_id not in success:
+                        if attempts[job_id] < self.max_attempts:
+                            todo.appendleft(job_id)
+                        else:
+                            success[job_id] = False
+                        if verbose:
+                            print("Worker {} is dead, job {} {}".format(
+                                identity.decode(errors='replace'), job_id,
+                                'failed' if job_id in success else 'is reassigned'))
+
+            for identity, worker in self.workers.items():
+                if not todo:
+                    break
+                if worker['idle']:
+                    job_id = todo.popleft()
+                    attempts[job_id] += 1
+                    worker['job'], worker['idle'] = job_id, False
+                    self._send_job(identity, job_id, jobs[job_id])
+
+            if now - last_beat >= self.heartbeat:
+                for identity in self.workers:
+                    self.socket.send_multipart([identity, HEARTBEAT])
+                last_beat = now
+
+        if verbose:
+            for job_id in jobs:
+                if not success.get(job_id, False):
+                    print("ERROR:", jobs[job_id])
+        return [success.get(job_id, False) for job_id in jobs]
+
+    def stop_workers(self):
+        """ Tell all connected workers to exit """
+        for identity in self.workers:
+            self.socket.send_multipart([identity, STOP])
+        self.workers.clear()
+
+    def close(self):
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _simulate(simulator, spec, config, network, workdir):
+    """ Run one job of the broker, returns the status and the packed output """
+    tmp_dir = tempfile.mkdtemp(prefix='ratatoskr_job_', dir=workdir)
+    try:
+        config_path, network_path = spec['config_path'], spec['network_path']
+        if spec['shipped']:
+            config_path = os.path.join(tmp_dir, 'config.xml')
+            network_path = os.path.join(tmp_dir, 'network.xml')
+            with open(config_path, 'wb') as f:
+                f.write(config)
+            with open(network_path, 'wb') as f:
+                f.write(network)
+        output_dir = os.path.join(tmp_dir, 'output')
+        os.makedirs(output_dir)
+        start = timer.monotonic()
+        try:
+            success = run_single_sim(simulator, config_path, network_path, output_dir,
+                                     spec.get('log', 'file'))
+        except OSError as error:
+            print("ERROR:", error)
+            success = False
+        status = {'success': success, 'elapsed': timer.monotonic() - start,
+                  'host': sockets.gethostname()}
+        return status, pack_directory(output_dir) if success else b''
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def run_worker(broker, simulator, heartbeat=1., liveness=5, workdir=None, max_jobs=None):
+    """
+    Run the simulations of a broker until it sends STOP.
+
+    Parameters
+    ----------
+    broker : str
+        The endpoint of the broker, e.g. "tcp://head-node:5570"
+    simulator : str
+        The path of the simulator executor "./sim" on this node
+    heartbeat : float, optional
+        The interval of the heartbeats in seconds, by default 1.
+    liveness : int, optional
+        The number of missed heartbeats of the broker after which the worker
+        reconnects, by default 5
+    workdir : str, optional
+        The directory of the temporary job directories, by default the
+        system temporary directory
+    max_jobs : int, optional
+        Exit after this many jobs, by default None
+
+    Returns
+    -------
+    int
+        The number of finished jobs.
+    """
+    import zmq
+
+    context = zmq.Context.instance()
+    poller = zmq.Poller()
+    socket = None
+
+    running = None  # the job id, the thread and its outcome
+    done = 0
+    while max_jobs is None or done < max_jobs:
+        if socket is None:
+            socket = context.socket(zmq.DEALER)
+            socket.setsockopt(zmq.LINGER, 0)
+            # a new identity, the broker may still hold the one of the last socket
+            socket.setsockopt_string(zmq.IDENTITY, "{}-{}-{}".format(
+                sockets.gethostname(), os.getpid(), uuid.uuid4().hex[:6]))
+            socket.connect(broker)
+            poller.register(socket, zmq.POLLIN)
+            # a busy worker announces itself by its heartbeats and result
+            if running is not None:
+                socket.send_multipart([HEARTBEAT, running[0]])
+            else:
+                socket.send(READY)
+            last_seen = last_beat = timer.monotonic()
+
+        if poller.poll(min(heartbeat, .1) * 1000 if running else heartbeat * 1000):
+            command, *args = socket.recv_multipart()
+            last_seen = timer.monotonic()
+            if command == STOP:
+                break
+            if command == JOB and running is None:
+                outcome = []
+                thread = threading.Thread(
+                    target=lambda *a: outcome.append(_simulate(*a)),
+                    args=(simulator, json.loads(args[1]), args[2], args[3], workdir),
+                    daemon=True)
+                thread.start()
+                running = (args[0], thread, outcome)
+
+        if running is not None and not running[1].is_alive():
+            job_id, _, outcome = running
+            status, data = outcome[0] if outcome else ({'success': False}, b'')
+            socket.send_multipart([RESULT, job_id, json.dumps(status).encode(), data])
+            running = None
+            done += 1
+
+        now = timer.monotonic()
+        if now - last_beat >= heartbeat:
+            socket.send_multipart([HEARTBEAT, running[0] if running is not None else b''])
+            last_beat = now
+        if now - last_seen > heartbeat * liveness:
+            # the broker is gone, connect again with a fresh socket
+            poller.unregister(socket)
+            socket.close()
+            socket = None
+
+    if socket is not None:
+        socket.close()
+    return done
+
+
+def run_distributed_sims(simdirs, config_path, network_path, bind=None, local_workers=0,
+                         simulator=None, timeout=None, stop_workers=False, **kwargs):
+    """
+    Run the simulations on the workers of a broker, the distributed
+    counterpart of run_parallel_multiple_sims.
+
+    Parameters
+    ----------
+    simdirs : list(str)
+        The list of dummy simulation directories, they receive the output of
+        the simulations.
+    config_path : str
+        The path of input "config.xml" file for the simulator.
+    network_path : str
+        The path of input "network.xml" file for the simulator.
+    bind : str, optional
+        The endpoint of the broker, by default "tcp://*:5570", or a random
+        local port if only local workers are used
+    local_workers : int, optional
+        The number of worker processes started on this machine, by default 0
+        waits for remote workers
+    simulator : str, optional
+        The path of the simulator executor "./sim" of the local workers
+    timeout : float, optional
+        Give up the unfinished simulations after this many seconds,
+        by default None
+    stop_workers : bool, optional
+        Tell the remote workers to exit afterwards, the local workers always
+        exit, by default False
+    kwargs :
+        heartbeat, liveness, max_attempts, ship_files and log of the SimulationBroker.
+
+    Returns
+    -------
+    list(bool)
+        True for each simulation which finished successfully.
+    """
+    assert not local_workers or simulator is not None, \
+        "The local workers need the path of the simulator"
+    if bind is None:
+        bind = "tcp://127.0.0.1:*" if local_workers else "tcp://*:5570"
+
+    jobs = [{'config_path': os.path.abspath(config_path),
+             'network_path': os.path.abspath(network_path), 'simdir': simdir}
+            for simdir in simdirs]
+
+    with SimulationBroker(bind, **kwargs) as broker:
+        endpoint = broker.endpoint.replace('0.0.0.0', '127.0.0.1')
+        worker_kwargs = {key: kwargs[key] for key in ('heartbeat', 'liveness') if key in kwargs}
+        workers = [multiprocessing.Process(target=run_worker, args=(endpoint, simulator),
+                                           kwargs=worker_kwargs, daemon=True)
+                   for _ in range(local_workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            success = broker.run(jobs, timeout=timeout, verbose=True)
+        finally:
+            if workers or stop_workers:
+                broker.stop_workers()
+            for worker in workers:
+                worker.join(5)
+                if worker.is_alive():
+                    worker.terminate()
+    return success
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='ratatoskr-worker',
+        description='Run the simulations handed out by a ratatoskr broker, see '
+                    'ratatoskr_tools.simulation.run_distributed_sims.')
+    parser.add_argument('broker', help='endpoint of the broker, e.g. tcp://head-node:5570')
+    parser.add_argument('-s', '--simulator', required=True,
+                        help='path of the simulator executable "sim" on this node')
+    parser.add_argument('-n', '--workers', type=int, default=1,
+                        help='parallel simulations on this node (default: %(default)s)')
+    parser.add_argument('--heartbeat', type=float, default=1.,
+                        help='heartbeat interval in seconds (default: %(default)s)')
+    parser.add_argument('--liveness', type=int, default=5,
+                        help='missed heartbeats of the broker before reconnecting '
+                             '(default: %(default)s)')
+    parser.add_argument('--workdir', help='directory of the temporary job directories')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    kwargs = dict(heartbeat=args.heartbeat, liveness=args.liveness, workdir=args.workdir)
+    if args.workers == 1:
+        run_worker(args.broker, args.simulator, **kwargs)
+        return 0
+    workers = [multiprocessing.Process(target=run_worker, args=(args.broker, args.simulator),
+                                       kwargs=kwargs) for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,8 +1,11 @@
+import collections
+import gzip
 import multiprocessing
 import os
 import subprocess
 
-from joblib import Parallel, delayed
+from ..networkconfig import netrace, validate
+from ..networkconfig.configure import LOG_MODES
 
 
 def make_all_simdirs(basedir, restarts):
@@ -50,7 +53,21 @@ def remove_all_simdirs(basedir, restarts):
         os.system(cmd)
 
 
-def run_single_sim(simulator, config_path, network_path, output_dir="."):
+def _capture_tail(process, log_path, tail_bytes):
+    """ Keep the last tail_bytes of the process output and write them gzip compressed """
+    chunks = collections.deque()
+    size = 0
+    for chunk in iter(lambda: process.stdout.read(1 << 16), b''):
+        chunks.append(chunk)
+        size += len(chunk)
+        while size - len(chunks[0]) >= tail_bytes:
+            size -= len(chunks.popleft())
+    with gzip.open(log_path + ".gz", "wb") as f:
+        f.write(b''.join(chunks)[-tail_bytes:])
+
+
+def run_single_sim(simulator, config_path, network_path, output_dir=".", log='file',
+                   tail_bytes=1 << 20):
     """
     Run the simulation once according to the given config_path and network_path.
     Then, the result of the simulation is outputted to the output_dir.
@@ -65,25 +82,49 @@ def run_single_sim(simulator, config_path, network_path, output_dir="."):
         The path of input "network.xml" file for the simulator.
     output_dir : str, optional
         The directory of the simulation result which is stored, by default "."
+    log : str, optional
+        The capture of the simulator output: 'file' writes all of it to
+        output_dir/log, 'tail' only its last tail_bytes to output_dir/log.gz,
+        'discard' drops it, by default 'file'
+    tail_bytes : int, optional
+        The size of the kept output of the 'tail' capture, by default 1 MiB
+
+    Returns
+    -------
+    bool
+        True if the simulator finished successfully.
     """
+    assert log in LOG_MODES, "Unknown log mode '{}', available: {}".format(log, LOG_MODES)
 
-    outfile = open(output_dir + "/log", "w")
+    log_path = output_dir + "/log"
 
     config_path = "--configPath=" + config_path
     network_path = "--networkPath=" + network_path
     output_dir = "--outputDir=" + output_dir
 
     args = (simulator, config_path, network_path, output_dir)
-    try:
-        subprocess.run(args, stdout=outfile, check=True)
-    except subprocess.CalledProcessError:
+    if log == 'file':
+        with open(log_path, "w") as outfile:
+            returncode = subprocess.run(args, stdout=outfile).returncode
+    elif log == 'discard':
+        returncode = subprocess.run(args, stdout=subprocess.DEVNULL).returncode
+    else:
+        with subprocess.Popen(args, stdout=subprocess.PIPE) as process:
+            _capture_tail(process, log_path, tail_bytes)
+        returncode = process.returncode
+
+    if returncode != 0:
         print("ERROR:", args)
+        return False
+    return True
 
 
 def run_parallel_multiple_sims(simdirs, simulator, config_path, network_path,
-                               num_cores=multiprocessing.cpu_count()):
+                               num_cores=None, config=None, check=True, log=None):
     """
     Run the simulation parallely.
+    The config_path and network_path files are validated before any simulation
+    is started, an invalid configuration raises an AssertionError.
 
     Parameters
     ----------
@@ -97,8 +138,88 @@ def run_parallel_multiple_sims(simdirs, simulator, config_path, network_path,
         The path of input "network.xml" file for the simulator.
     num_cores : int, optional
         The number of parallel threads to parallel the simulation process,
-        by default multiprocessing.cpu_count()
+        by default None uses multiprocessing.cpu_count()
+    config : ratatoskr_tools.networkconfig.configure.Configuration, optional
+        The configuration of the files, which enables the checks of portNum and
+        the config.ini values, by default None
+    check : bool, optional
+        Validate the configuration files before the launch, by default True
+    log : str, optional
+        The log capture of run_single_sim, by default the logMode of config
+        or 'file'
+
+    Returns
+    -------
+    list(bool)
+        True for each simulation which finished successfully.
     """
 
-    Parallel(n_jobs=num_cores)(delayed(run_single_sim)
-                               (simulator, config_path, network_path, simdir) for simdir in simdirs)
+    from joblib import Parallel, delayed
+
+    if num_cores is None:
+        num_cores = multiprocessing.cpu_count()
+
+    if check:
+        validate.check_configuration(config_path, network_path, config)
+
+    if log is None:
+        log = config.logMode if config is not None else 'file'
+
+    return Parallel(n_jobs=num_cores)(delayed(run_single_sim)
+                                      (simulator, config_path, network_path, simdir, log)
+                                      for simdir in simdirs)
+
+
+def run_netrace_regions(simulator, config, config_xml, network_xml, trace, basedir,
+                        num_groups=None, num_cores=None, log=None, **kwargs):
+    """
+    Simulate the regions of a netrace trace in parallel, one simulation per
+    group of consecutive regions, see networkconfig.write_region_configs.
+    Merge the results with datahandle.merge_region_results.
+
+    Parameters
+    ----------
+    simulator : str
+        The path of the simulator executor "./sim"
+    config : ratatoskr_tools.networkconfig.configure.Configuration
+        configuration object.
+    config_xml : str
+        The config.xml file which the region configs are derived from.
+    network_xml : str
+        The path of input "network.xml" file for the simulator.
+    trace : str
+        Path of the .tra.bz2 file.
+    basedir : str
+        The directory of the region simulations.
+    num_groups : int, optional
+        The number of region groups, by default num_cores
+    num_cores : int, optional
+        The number of parallel simulations, by default numCores of config.ini
+    log : str, optional
+        The log capture of run_single_sim, by default the logMode of config
+    kwargs :
+        cycle_time, drain and index of write_region_configs.
+
+    Returns
+    -------
+    list(dict)
+        The groups of write_region_configs, with the result 'success' of each.
+    """
+    from joblib import Parallel, delayed
+
+    if num_cores is None:
+        num_cores = config.numCores
+    if log is None:
+        log = config.logMode
+
+    groups = netrace.write_region_configs(config, config_xml, trace, basedir,
+                                          num_groups if num_groups is not None else num_cores,
+                                          **kwargs)
+    # the longest groups first, the others fill the gaps
+    order = sorted(range(len(groups)), key=lambda idx: -groups[idx]['num_cycles'])
+    success = Parallel(n_jobs=num_cores)(delayed(run_single_sim)
+                                         (simulator, groups[idx]['config_xml'], network_xml,
+                                          groups[idx]['directory'], log) for idx in order)
+    for idx, ok in zip(order, success):
+        groups[idx]['success'] = ok
+    return groups
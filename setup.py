@@ -14,7 +14,8 @@ setup(
         'ratatoskr_tools.networkconfig': ['*.ini']
     },
     entry_points={
-        'console_scripts': ['']
+        'console_scripts': ['ratatoskr-campaign = ratatoskr_tools.campaign.cli:main',
+                            'ratatoskr-worker = ratatoskr_tools.simulation.distributed:main']
     },
 
 )
@@ -5,7 +5,6 @@ Tutorial 1 python file
 import os
 
 import numpy as np
-from matplotlib.backends.backend_pdf import PdfPages
 
 import ratatoskr_tools.datahandle as rtdat
 import ratatoskr_tools.dataplot as rtdplt
@@ -17,6 +16,10 @@ SIM_PATH = "../ratatoskr/simulator/sim"
 rtcfg.create_config_ini("./example/config.ini")
 config = rtcfg.create_configuration("./example/config.ini", "./example/config.xml", "./example/network.xml")
 
+# concentrate the sweep of 4 injection rates below the predicted saturation rate
+model = rtcfg.PerformanceModel(config)
+rtcfg.suggest_inj_rates(config, num_rates=4, model=model)
+
 # initialization of variables
 vc_usages = []
 buff_usages = []
@@ -33,7 +36,7 @@ for idx, inj_rate in enumerate(inj_rates):
 
     rtcfg.edit_config_file(config, "./example/config.xml", "./example/config_tmp.xml", inj_rate)
 
-    rtsim.run_parallel_multiple_sims(simdirs, SIM_PATH, "./example/config.xml", "./example/network.xml")
+    rtsim.run_parallel_multiple_sims(simdirs, SIM_PATH, "./example/config_tmp.xml", "./example/network.xml")
 
     vc_usages.append(rtdat.retrieve_vc_usages(simdirs, config))
     buff_usages.append(rtdat.retrieve_buff_usages(simdirs, config))
@@ -41,14 +44,8 @@ for idx, inj_rate in enumerate(inj_rates):
 
     rtsim.remove_all_simdirs("./example/", config.restarts)
 
-fig_latencies = rtdplt.plot_latencies(inj_rates, lats_flit, lats_packet, lats_network, plt_show=False)
-figs_vc = rtdplt.plot_vc_usage_stats(vc_usages, inj_rates)
-figs_buff = rtdplt.plot_buff_usage_stats(buff_usages, inj_rates)
-figs = [fig_latencies]
-figs.extend(figs_vc)
-figs.extend(figs_buff)
-
-pdf = PdfPages(os.path.join("./example/", "result.pdf"))
-for fig in figs:
-    pdf.savefig(fig)
-pdf.close()
+# every page is rendered, written and closed before the next one
+pages = [(rtdplt.plot_latencies, (inj_rates, lats_flit, lats_packet, lats_network))]
+pages.extend(rtdplt.vc_usage_pages(vc_usages, inj_rates))
+pages.extend(rtdplt.buff_usage_pages(buff_usages, inj_rates))
+rtdplt.build_report(pages, os.path.join("./example/", "result.pdf"), num_cores=config.numCores)